@@ -2,11 +2,19 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
-import pandas as pd
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 import re, unicodedata
 
+# openpyxl đọc streaming (read_only) — nhẹ hơn nhiều so với pandas
+try:
+    from openpyxl import load_workbook
+except Exception:
+    load_workbook = None
+
 # ---------- Chuẩn hoá chuỗi ----------
 def _strip_accents(s: str) -> str:
     if not s:
@@ -34,40 +42,121 @@ def _norm_code_variants(s: str) -> set[str]:
     }
 
 # ---------- Đọc Excel ----------
-def _read_one_excel(p: Path) -> pd.DataFrame:
+Row = Tuple[str, str, str]  # (A, B, C)
+
+def _cell_str(v) -> str:
+    """Giá trị ô -> chuỗi đã strip (None -> "", 12.0 -> "12")."""
+    if v is None:
+        return ""
+    if isinstance(v, float):
+        if v != v:  # NaN
+            return ""
+        if v.is_integer():
+            return str(int(v))
+    return str(v).strip()
+
+def _iter_xlsx_rows(p: Path):
+    """Duyệt 3 cột đầu của sheet đầu tiên, KHÔNG dựng DataFrame."""
+    if load_workbook is None:
+        raise RuntimeError("Missing 'openpyxl'")
+    wb = load_workbook(p, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        for vals in ws.iter_rows(max_col=3, values_only=True):
+            a, b, c = (tuple(vals) + (None, None, None))[:3]
+            yield _cell_str(a), _cell_str(b), _cell_str(c)
+    finally:
+        wb.close()
+
+def _iter_xls_rows(p: Path):
+    """.xls cũ: openpyxl không đọc được -> dùng pandas (import muộn, tuỳ chọn)."""
+    import pandas as pd
     df = pd.read_excel(p, sheet_name=0, header=None, dtype=str)
-    while df.shape[1] < 3:
-        df[df.shape[1]] = ""
-    df = df.iloc[:, :3]
-    df.columns = ["A", "B", "C"]
-    for c in ["A", "B", "C"]:
-        df[c] = df[c].fillna("").astype(str).str.strip()
-
-    # các cột chuẩn hoá để tra cứu
-    df["A_WS_UP"] = df["A"].apply(_norm_ws_upper)
-    df["A_ALNUM_UP"] = df["A"].apply(_norm_alnum_upper)
-    df["A_NODOT"] = df["A"].str.replace(".", "", regex=False)
-    df["A_NODOT_ALNUM_UP"] = df["A_NODOT"].apply(_norm_alnum_upper)
-    return df
-
-def load_mapping_dir(dir_path: str) -> pd.DataFrame:
+    for vals in df.itertuples(index=False, name=None):
+        a, b, c = (tuple(vals) + (None, None, None))[:3]
+        yield _cell_str(a), _cell_str(b), _cell_str(c)
+
+def _read_one_excel(p: Path) -> List[Row]:
+    reader = _iter_xls_rows if p.suffix.lower() == ".xls" else _iter_xlsx_rows
+    return list(reader(p))
+
+
+class MappingIndex:
+    """
+    Bảng mapping (A, B, C) đã nạp sẵn để tra cứu nhanh:
+      - rows: các dòng theo đúng thứ tự xuất hiện trong các file
+      - tra exact theo A bằng dict, tra "A bắt đầu bằng base" bằng bisect trên A đã sắp xếp
+    """
+
+    def __init__(self, rows: Optional[List[Row]] = None):
+        self.rows: List[Row] = list(rows or [])
+        self._by_a: Dict[str, List[int]] = {}
+        for i, (a, _, _) in enumerate(self.rows):
+            self._by_a.setdefault(a, []).append(i)
+        self._sorted: List[Tuple[str, int]] = sorted((a, i) for i, (a, _, _) in enumerate(self.rows))
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @property
+    def empty(self) -> bool:
+        return not self.rows
+
+    def exact(self, a: str) -> List[int]:
+        return self._by_a.get(a, [])
+
+    def startswith(self, prefix: str) -> List[int]:
+        """Chỉ số các dòng có A bắt đầu bằng prefix (giữ thứ tự xuất hiện)."""
+        out = []
+        j = bisect_left(self._sorted, (prefix, -1))
+        while j < len(self._sorted) and self._sorted[j][0].startswith(prefix):
+            out.append(self._sorted[j][1])
+            j += 1
+        out.sort()
+        return out
+
+# ---------- Cache trong process (app chạy lâu: web app / worker job) ----------
+# key theo (tên, kích thước, mtime) của từng file, KHÔNG theo đường dẫn → bản chép giữ mtime
+# (shutil.copy2) sang thư mục tạm của job vẫn trúng; sửa file Excel → mtime đổi → đọc lại.
+_CACHE_SIZE = 16
+_index_cache: "OrderedDict[tuple, MappingIndex]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+def mapping_files(d: Path) -> List[Path]:
+    """Các file mapping load_mapping_dir đọc (*.xlsx rồi *.xls, bỏ file tạm ~$)."""
+    return [
+        p for pat in ("*.xlsx", "*.xls") for p in sorted(d.glob(pat))
+        if not p.name.startswith("~$")
+    ]
+
+def load_mapping_dir(dir_path: str) -> MappingIndex:
+    """MappingIndex của mọi file Excel trong thư mục (dùng lại bản đã nạp nếu các file không đổi)."""
     d = Path(dir_path)
     if not d.exists():
         raise FileNotFoundError(f"Không thấy thư mục mapping: {dir_path}")
-    frames = []
-    for pat in ("*.xlsx", "*.xls"):
-        for p in sorted(d.glob(pat)):
-            try:
-                frames.append(_read_one_excel(p))
-            except Exception:
-                # bỏ qua file lỗi/không phải excel chuẩn
-                continue
-    if not frames:
-        return pd.DataFrame(columns=[
-            "A", "B", "C", "A_WS_UP", "A_ALNUM_UP",
-            "A_NODOT", "A_NODOT_ALNUM_UP"
-        ])
-    return pd.concat(frames, ignore_index=True)
+    return load_mapping_files(mapping_files(d))
+
+def load_mapping_files(files: List[Path]) -> MappingIndex:
+    """Như load_mapping_dir cho danh sách file cụ thể (VD nạp sẵn từng file ID/*.xlsx)."""
+    key = tuple((p.name, s.st_size, s.st_mtime_ns) for p, s in ((p, p.stat()) for p in files))
+    with _cache_lock:
+        index = _index_cache.get(key)
+        if index is not None:
+            _index_cache.move_to_end(key)
+            return index
+    rows: List[Row] = []
+    for p in files:
+        try:
+            rows.extend(_read_one_excel(p))
+        except Exception:
+            # bỏ qua file lỗi/không phải excel chuẩn
+            continue
+    index = MappingIndex(rows)
+    with _cache_lock:
+        _index_cache[key] = index
+        while len(_index_cache) > _CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    return index
 
 # ---------- Tách base code ----------
 def _base_code_from_qid(qid: str) -> str:
@@ -169,7 +258,7 @@ def _base_code_from_qid(qid: str) -> str:
 #     qcat  = f"{col_c}/{qname}".strip() if col_c else qname
 #     return qname, qcat
 
-def lookup_name_category(question_id: str, df: "pd.DataFrame") -> Tuple[Optional[str], Optional[str]]:
+def lookup_name_category(question_id: str, index: Optional[MappingIndex]) -> Tuple[Optional[str], Optional[str]]:
     """
     Tìm theo mã:
       - base = question_id bỏ hậu tố chữ (VD: TO12.04.1.F02.a -> TO12.04.1.F02)
@@ -177,7 +266,7 @@ def lookup_name_category(question_id: str, df: "pd.DataFrame") -> Tuple[Optional
       - Ưu tiên chọn dòng có C không rỗng/không "0"
     Trả về (question_name, question_category) hoặc (None, None).
     """
-    if df is None or df.empty:
+    if index is None or index.empty:
         return None, None
 
     qid = (question_id or "").strip()
@@ -187,20 +276,15 @@ def lookup_name_category(question_id: str, df: "pd.DataFrame") -> Tuple[Optional
     base = _base_code_from_qid(qid)
 
     # Tập ứng viên: exact + startswith (giữ nguyên thứ tự xuất hiện trong các file)
-    exact = df[df["A"] == base]
-    starts = df[df["A"].str.startswith(base)]
-    if exact.empty and starts.empty:
+    candidates = index.exact(base) + index.startswith(base)
+    if not candidates:
         return None, None
-    candidates = pd.concat([exact, starts], ignore_index=True)
 
     # Ưu tiên C có giá trị (không rỗng, không "0")
-    c_series = candidates["C"].astype(str).str.strip()
-    non_empty_c = candidates[(c_series != "") & (c_series != "0")]
-
-    row = (non_empty_c.iloc[0] if not non_empty_c.empty else candidates.iloc[0])
+    rows = index.rows
+    row = next((rows[i] for i in candidates if rows[i][2] not in ("", "0")), rows[candidates[0]])
 
-    col_b = str(row.get("B") or "").strip()
-    col_c = str(row.get("C") or "").strip()
+    _, col_b, col_c = row
     if col_c == "0":
         col_c = ""  # xem như trống
 
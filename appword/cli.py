@@ -1,3 +1,4 @@
+import multiprocessing
 import typer
 from pathlib import Path
 from appword.core.parser import parse_docx_to_json
@@ -6,20 +7,41 @@ from appword.core.exporter import build_quiz_from_json
 
 app = typer.Typer(add_completion=False, no_args_is_help=True)
 
+_FMT_HELP = "json | json-compact | msgpack (mặc định theo APPWORD_JSON_FORMAT)"
+
 @app.command()
-def parse(docx_file: Path, outdir: Path = Path("output_questions")):
+def parse(
+    docx_file: Path,
+    outdir: Path = Path("output_questions"),
+    fmt: str = typer.Option(None, help=_FMT_HELP),
+):
     outdir.mkdir(parents=True, exist_ok=True)
-    jp = parse_docx_to_json(str(docx_file), output_dir=str(outdir))
+    jp = parse_docx_to_json(str(docx_file), output_dir=str(outdir), fmt=fmt)
     typer.echo(f"JSON: {jp}")
 
 @app.command()
-def enrich(json_file: Path, mapping_dir: Path):
-    out = enrich_json_with_mapping(str(json_file), str(mapping_dir), json_out=None, overwrite=True)
+def enrich(json_file: Path, mapping_dir: Path, fmt: str = typer.Option(None, help=_FMT_HELP)):
+    out = enrich_json_with_mapping(str(json_file), str(mapping_dir), json_out=None, overwrite=True, fmt=fmt)
     typer.echo(f"Enriched JSON: {out}")
 
 @app.command()
-def build(json_file: Path, xml_out: Path = Path("output_questions/moodle.xml")):
-    xp = build_quiz_from_json(str(json_file), xml_out=str(xml_out))
+def build(
+    json_file: Path,
+    xml_out: Path = Path("output_questions/moodle.xml"),
+    max_shard_kb: int = typer.Option(0, help="Chia XML thành nhiều shard, mỗi shard tối đa N KB (0 = tắt)"),
+    max_shard_questions: int = typer.Option(0, help="Chia XML thành nhiều shard, mỗi shard tối đa N câu (0 = tắt)"),
+    image_mode: str = typer.Option("upload", help="upload | embed | hybrid (nhúng ảnh @@PLUGINFILE@@ vào XML)"),
+    embed_max_kb: int = typer.Option(150, help="hybrid: ảnh <= N KB được nhúng, lớn hơn thì upload"),
+    fragment_cache: bool = typer.Option(False, help="Giữ cache XML từng câu để xuất lại nhanh sau khi sửa vài câu"),
+):
+    xp = build_quiz_from_json(
+        str(json_file), xml_out=str(xml_out),
+        max_shard_bytes=(max_shard_kb * 1024) or None,
+        max_shard_questions=max_shard_questions or None,
+        image_mode=image_mode,
+        embed_max_bytes=embed_max_kb * 1024,
+        fragment_cache=fragment_cache,
+    )
     typer.echo(f"XML: {xp}")
 
 @app.command("one-shot")
@@ -31,5 +53,17 @@ def one_shot(docx_file: Path, outdir: Path = Path("output_questions"), mapping_d
     xp = build_quiz_from_json(str(jp), xml_out=str(outdir / "moodle.xml"))
     typer.echo(f"Done  {xp}")
 
+@app.command()
+def serve(
+    host: str = typer.Option("127.0.0.1", help="Địa chỉ lắng nghe (0.0.0.0 để mở ra mạng LAN — cần APPWORD_API_TOKEN)"),
+    port: int = typer.Option(8765, help="Cổng HTTP"),
+    mapping_dir: Path = typer.Option(None, help="Thư mục mapping cho field mapping_name (mặc định ./ID)"),
+):
+    """API HTTP chuyển đổi theo lô (xem appword/services/http_api.py)."""
+    from appword.services.http_api import serve as serve_api
+    serve_api(host, port, str(mapping_dir) if mapping_dir else None)
+
 if __name__ == "__main__":
+    # exe đóng gói: process con của pool nén ảnh / pool job dừng ở đây, không chạy lại lệnh CLI
+    multiprocessing.freeze_support()
     app()
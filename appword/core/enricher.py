@@ -1,10 +1,15 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
-import json, csv
+import csv
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 
-from appword.adapters.excel_mapping import load_mapping_dir, lookup_name_category, _base_code_from_qid
+from appword.adapters.excel_mapping import MappingIndex, load_mapping_dir, lookup_name_category, _base_code_from_qid
+from appword.core.models import Question, QuestionList, dump_questions, load_questions
+
+ENRICH_LOG_HEADER = ["index", "qid", "base", "matched",
+                     "colB_used_in_name", "colC_used_in_category",
+                     "old_name", "old_category", "new_name", "new_category"]
 
 def enrich_json_with_mapping(
     json_path: str,
@@ -12,41 +17,58 @@ def enrich_json_with_mapping(
     json_out: Optional[str] = None,
     overwrite: bool = True,
     log: bool = True,
+    index: Optional[MappingIndex] = None,
+    fmt: Optional[str] = None,
 ) -> str:
     """
     - Đọc JSON câu hỏi.
     - Tìm tên & category từ Excel theo question_id.
     - Ghi lại JSON (đè hoặc ra file mới).
     - Nếu log=True, ghi file CSV 'enrich_log.csv' cạnh JSON để dễ debug.
+    - index: mapping đã nạp sẵn (bỏ qua đọc lại Excel trong mapping_dir).
+    - fmt: định dạng JSON ghi ra ("json" | "json-compact" | "msgpack"); đọc thì tự nhận diện.
     """
     p = Path(json_path)
-    data = json.loads(p.read_text(encoding="utf-8"))
+    data = load_questions(p)
+
+    if index is None:
+        index = load_mapping_dir(mapping_dir)
+    log_rows = enrich_questions(data, index, overwrite=overwrite)
+
+    # xuất JSON
+    out = Path(json_out) if json_out else p
+    dump_questions(out, data, fmt)
+
+    # xuất log CSV
+    if log:
+        write_enrich_log(out.with_name("enrich_log.csv"), log_rows)
+
+    return str(out)
 
-    df = load_mapping_dir(mapping_dir)
 
-    # file log
+def enrich_questions(data: QuestionList, index: MappingIndex, overwrite: bool = True) -> List[list]:
+    """
+    Bản trong bộ nhớ: cập nhật question_name / question_category NGAY trên list Question
+    (bỏ qua dict chú thích).
+    Trả về các dòng log (theo ENRICH_LOG_HEADER).
+    """
     log_rows = []
-    log_header = ["index", "qid", "base", "matched",
-                  "colB_used_in_name", "colC_used_in_category",
-                  "old_name", "old_category", "new_name", "new_category"]
 
     for idx, item in enumerate(data):
-        if not isinstance(item, dict):
-            continue
-        if "question_type" not in item:
+        if not isinstance(item, Question):
             continue
 
-        qid  = str(item.get("question_id", "")).strip()
+        qid  = item.question_id.strip()
         base = _base_code_from_qid(qid)
 
-        old_name = item.get("question_name", "") or ""
-        old_cat  = item.get("question_category", "") or ""
+        old_name = item.question_name or ""
+        old_cat  = item.question_category or ""
 
         new_name, new_cat = None, None
         col_b, col_c = "", ""
 
         # lookup
-        hit_name, hit_cat = lookup_name_category(qid, df)
+        hit_name, hit_cat = lookup_name_category(qid, index)
         if hit_name:
             new_name = hit_name
             # rút cột B/C thực sự để log
@@ -64,39 +86,33 @@ def enrich_json_with_mapping(
 
         # cập nhật item
         if new_name and (overwrite or not old_name):
-            item["question_name"] = new_name
+            item.question_name = new_name
         else:
-            new_name = item.get("question_name", old_name)
+            new_name = item.question_name
 
         # chỉ set category nếu tìm được C khác rỗng
         if new_cat and ("/" in new_cat):
             if overwrite or not old_cat:
-                item["question_category"] = new_cat
+                item.question_category = new_cat
         else:
             # không động vào category nếu Excel không có C
-            if not item.get("question_category"):
+            if not item.question_category:
                 # giữ nguyên (để rỗng); KHÔNG đặt = name để tránh sai
-                item["question_category"] = ""
+                item.question_category = ""
 
         # ghi log
-        if log:
-            log_rows.append([
-                idx+1, qid, base,
-                "YES" if (hit_name or hit_cat) else "NO",
-                col_b, col_c, old_name, old_cat,
-                item.get("question_name",""), item.get("question_category","")
-            ])
+        log_rows.append([
+            idx+1, qid, base,
+            "YES" if (hit_name or hit_cat) else "NO",
+            col_b, col_c, old_name, old_cat,
+            item.question_name, item.question_category
+        ])
 
-    # xuất JSON
-    out = Path(json_out) if json_out else p
-    out.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+    return log_rows
 
-    # xuất log CSV
-    if log:
-        log_file = out.with_name("enrich_log.csv")
-        with log_file.open("w", encoding="utf-8", newline="") as f:
-            w = csv.writer(f)
-            w.writerow(log_header)
-            w.writerows(log_rows)
 
-    return str(out)
+def write_enrich_log(log_file: Path, log_rows: List[list]) -> None:
+    with Path(log_file).open("w", encoding="utf-8", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(ENRICH_LOG_HEADER)
+        w.writerows(log_rows)
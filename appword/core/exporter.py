@@ -1,29 +1,27 @@
 # -*- coding: utf-8 -*-
-import json
+from __future__ import annotations
 import os
 import re as _re
 from pathlib import Path
 import html  # <-- đã có
 
-from appword.moodle_questions.MoodleQuiz import MoodleQuiz
+from appword.moodle_questions.MoodleQuiz import MoodleQuizWriter, MoodleQuizShardWriter
 from appword.moodle_questions.MultiChoiceQuestion import MultiChoiceQuestion
 from appword.moodle_questions.ShortAnswerQuestion import ShortAnswerQuestion
 from appword.moodle_questions.ChoiceTFQuestion import ChoiceTFQuestion
+from appword.moodle_questions.utils import EmbeddedFile
+from appword.core.fragment_cache import CachedFragment, FragmentCache
+from appword.core.models import Question, as_question, load_questions
+from appword.services.checkpoints import hash_file
 
 # NEW: dùng uploader để lấy URL ảnh (ImgBB / fallback file://)
 from appword.services.uploader import ImageUploader
 
+# Tăng khi đổi cách render HTML/XML -> vô hiệu toàn bộ fragment cache cũ
+EXPORTER_VERSION = "2"
 
-# ========= Helpers chung =========
-def _get_opt_text(opt) -> str:
-    return (
-        (opt or {}).get("option_text")
-        or (opt or {}).get("text")
-        or (opt or {}).get("answer")
-        or (opt or {}).get("value")
-        or str(opt)
-    )
 
+# ========= Helpers chung =========
 def _norm_category(s):
     if s is None:
         return None
@@ -138,196 +136,393 @@ def _extract_shortanswer_key_and_clean_text(qtext: str, explanation_text: str):
 
 
 # ========= NEW: gắn link URL vào JSON (không xóa local) =========
-def _upload_one(uploader: ImageUploader, p: str) -> str:
+def _upload_one(uploader: ImageUploader, p: str, results=None) -> str:
     """Trả về URL (http/https/file://). Nếu p đã là URL → trả nguyên, nếu là path local → upload."""
     if not p:
         return ""
     if _is_url(p):
         return p
-    res = uploader.upload_url_or_path(p)
+    res = (results or {}).get(p) or uploader.upload_url_or_path(p)
     return res.url or p
 
-def _attach_links_in_question(q: dict, uploader: ImageUploader) -> dict:
+_IMG_SRC_RE = _re.compile(r'<img\b[^>]*?\bsrc="([^"]*)"')
+
+def _remote_images_only(xml: str) -> bool:
+    """Mọi ảnh trong XML đã là http(s) / @@PLUGINFILE@@ (upload lỗi → file:// hoặc path local: chưa xong)."""
+    return all(src.startswith(("http://", "https://", "@@PLUGINFILE@@")) for src in _IMG_SRC_RE.findall(xml))
+
+def _needs_upload(local, url, skip) -> bool:
+    """Có ảnh local, chưa có *_url (pipeline đã gắn trước đó) và không thuộc diện nhúng."""
+    return isinstance(local, str) and bool(local.strip()) and not _is_url(url or "") and not skip(local)
+
+def _image_paths(q: Question) -> list:
+    return [q.question_image, q.explanation.image] + [opt.option_image for opt in q.options]
+
+def _pending_uploads(q: Question, skip) -> list:
+    """Ảnh local của câu còn phải upload (cùng điều kiện với _attach_links_in_question)."""
+    pairs = [(q.question_image, q.question_image_url), (q.explanation.image, q.explanation.image_url)]
+    pairs += [(opt.option_image, opt.option_image_url) for opt in q.options]
+    return [p for p, url in pairs if _needs_upload(p, url, skip) and not _is_url(p)]
+
+def _attach_links_in_question(q: Question, uploader: ImageUploader, skip=None, results=None) -> Question:
+    """
+    skip(path) -> True: ảnh sẽ được nhúng vào XML, KHÔNG upload.
+    results: {path: UploadResult} đã upload sẵn theo lô (uploader.upload_many).
+    """
+    skip = skip or (lambda _p: False)
+
     # question_image → question_image_url
-    qi = q.get("question_image")
-    if isinstance(qi, str) and qi.strip():
-        q["question_image_url"] = _upload_one(uploader, qi)
+    if _needs_upload(q.question_image, q.question_image_url, skip):
+        q.question_image_url = _upload_one(uploader, q.question_image, results)
 
     # options[*].option_image → option_image_url
-    for opt in (q.get("options") or []):
-        if isinstance(opt, dict):
-            oi = opt.get("option_image")
-            if isinstance(oi, str) and oi.strip():
-                opt["option_image_url"] = _upload_one(uploader, oi)
+    for opt in q.options:
+        if _needs_upload(opt.option_image, opt.option_image_url, skip):
+            opt.option_image_url = _upload_one(uploader, opt.option_image, results)
 
     # explanation.image → explanation.image_url
-    exp = q.get("explanation")
-    if isinstance(exp, dict):
-        exi = exp.get("image")
-        if isinstance(exi, str) and exi.strip():
-            exp["image_url"] = _upload_one(uploader, exi)
+    exp = q.explanation
+    if _needs_upload(exp.image, exp.image_url, skip):
+        exp.image_url = _upload_one(uploader, exp.image, results)
     return q
 
-def _attach_links(data, uploader: ImageUploader):
-    if isinstance(data, dict):
-        return _attach_links_in_question(data, uploader)
-    if isinstance(data, list):
-        return [_attach_links_in_question(x, uploader) if isinstance(x, dict) else x for x in data]
-    return data
+
+# ========= Ảnh nhúng @@PLUGINFILE@@ (offline) =========
+IMAGE_MODES = ("upload", "embed", "hybrid")
+DEFAULT_EMBED_MAX_BYTES = 150 * 1024
+
+class ImageSources:
+    """
+    Quyết định nguồn cho từng ảnh:
+      - "upload": dùng *_url đã upload (mặc định, như cũ)
+      - "embed":  nhúng MỌI ảnh local vào XML (<file encoding="base64">); ảnh lớn hơn
+                  embed_max_bytes được nén lại bằng ImageUploader (không gửi mạng)
+      - "hybrid": ảnh <= embed_max_bytes nhúng, ảnh lớn hơn vẫn upload
+    """
+
+    def __init__(self, mode: str = "upload", embed_max_bytes: int = DEFAULT_EMBED_MAX_BYTES, uploader=None):
+        mode = (mode or "upload").lower().strip()
+        if mode not in IMAGE_MODES:
+            raise ValueError(f"image_mode không hợp lệ: {mode!r} (chọn {', '.join(IMAGE_MODES)})")
+        self.mode = mode
+        self.embed_max_bytes = int(embed_max_bytes)
+        self.uploader = uploader
+        self._encoded: dict = {}
+        self._digests: dict = {}
+
+    def wants_embed(self, local) -> bool:
+        if self.mode == "upload" or not isinstance(local, str) or not local.strip() or _is_url(local):
+            return False
+        try:
+            size = os.path.getsize(local)
+        except OSError:
+            return False
+        return self.mode == "embed" or size <= self.embed_max_bytes
+
+    def embeds(self, q: Question) -> bool:
+        """Câu có ảnh sẽ nhúng base64 vào XML."""
+        return any(self.wants_embed(p) for p in _image_paths(q))
+
+    def fingerprint(self, q: Question) -> str:
+        """
+        Dấu vân tay (mode + hash NỘI DUNG các ảnh local) — mọi mode: parse lại docx có thể ghi
+        ảnh khác vào cùng đường dẫn, khoá cache phải đổi theo.
+        """
+        parts = [f"{self.mode}:{self.embed_max_bytes}"]
+        for p in _image_paths(q):
+            if isinstance(p, str) and p.strip() and not _is_url(p):
+                if p not in self._digests:
+                    self._digests[p] = hash_file(p)
+                parts.append(f"{p}:{self._digests[p]}")
+        return "|".join(parts)
+
+    def src(self, url, local, files: list) -> str:
+        """Trả src cho <img>; nếu nhúng thì thêm EmbeddedFile vào files (vùng html tương ứng)."""
+        if not self.wants_embed(local):
+            return url or local
+        ef = self._embedded(local)
+        for f in files:
+            if f.path == ef.path and f.data is ef.data:  # cùng ảnh đã có trong vùng html này
+                return f.src
+        # 2 ảnh khác nhau trùng tên file (VD: a/image1.png, b/image1.png) → đổi tên ảnh sau
+        names = {f.name for f in files}
+        if ef.name in names:
+            stem, ext = os.path.splitext(ef.name)
+            n = 2
+            while f"{stem}_{n}{ext}" in names:
+                n += 1
+            ef = EmbeddedFile(f"{stem}_{n}{ext}", path=ef.path, data=ef.data)
+        files.append(ef)
+        return ef.src
+
+    def _embedded(self, local: str) -> EmbeddedFile:
+        if local in self._encoded:
+            return self._encoded[local]
+        ef = EmbeddedFile(os.path.basename(local), path=local)
+        if self.uploader is not None and os.path.getsize(local) > self.embed_max_bytes:
+            try:
+                data, _mime, name = self.uploader.encode_path(local)
+                ef = EmbeddedFile(name, data=data)
+            except Exception as e:
+                print(f"[embed] Không nén được {local}: {e} → nhúng bản gốc")
+        self._encoded[local] = ef
+        return ef
 
 
 # ========= Hàm chính =========
-def build_quiz_from_json(json_file: str, xml_out: str = "output_questions/moodle.xml") -> str:
-    with open(json_file, "r", encoding="utf-8") as f:
-        data = json.load(f)
+def build_quiz_from_json(
+    json_file: str,
+    xml_out: str = "output_questions/moodle.xml",
+    max_shard_bytes: int | None = None,
+    max_shard_questions: int | None = None,
+    image_mode: str = "upload",
+    embed_max_bytes: int = DEFAULT_EMBED_MAX_BYTES,
+    fragment_cache: bool | str = False,
+) -> str:
+    """
+    Dựng XML Moodle từ JSON câu hỏi.
+    - Mặc định: 1 file xml_out, trả về xml_out.
+    - Nếu có max_shard_bytes / max_shard_questions: chia thành '<stem>_partNN.xml'
+      cạnh xml_out (cắt theo category) + '<stem>_manifest.json'; trả về đường dẫn manifest.
+    - image_mode: "upload" | "embed" | "hybrid" (xem ImageSources).
+    - fragment_cache: True (file '.<stem>.fragments.json' cạnh xml_out) hoặc đường dẫn cache;
+      câu hỏi không đổi được ghép từ cache, không upload/render lại.
+    """
+    data = load_questions(json_file)
+
+    return build_quiz_from_questions(
+        data, xml_out,
+        max_shard_bytes=max_shard_bytes, max_shard_questions=max_shard_questions,
+        image_mode=image_mode, embed_max_bytes=embed_max_bytes, fragment_cache=fragment_cache,
+    )
 
-    # NEW: gắn URL ảnh vào dữ liệu (bổ sung *_url, KHÔNG thay trường local)
-    uploader = ImageUploader(api_key=os.getenv("IMGBB_API_KEY"))
-    data = _attach_links(data, uploader)
 
-    quiz = MoodleQuiz()
+def build_quiz_from_questions(
+    data,
+    xml_out: str = "output_questions/moodle.xml",
+    max_shard_bytes: int | None = None,
+    max_shard_questions: int | None = None,
+    image_mode: str = "upload",
+    embed_max_bytes: int = DEFAULT_EMBED_MAX_BYTES,
+    fragment_cache: bool | str = False,
+    uploader: ImageUploader | None = None,
+) -> str:
+    """
+    Như build_quiz_from_json nhưng nhận thẳng list câu hỏi trong bộ nhớ
+    (Question hoặc dict; dict được chuyển sang Question một lần, *_url gắn vào Question).
+    uploader: dùng chung uploader của pipeline (mặc định tạo mới theo IMGBB_API_KEY).
+    """
+    # NEW: gắn URL ảnh vào dữ liệu (bổ sung *_url, KHÔNG thay trường local) — làm theo từng câu
+    # trong _write_questions để câu lấy từ cache không phải upload lại
+    own_uploader = uploader is None
+    if own_uploader:
+        uploader = ImageUploader(api_key=os.getenv("IMGBB_API_KEY"))
+    images = ImageSources(image_mode, embed_max_bytes, uploader=uploader)
+
     count = {"multichoice": 0, "kprime": 0, "shortanswer": 0}
 
     # Chấp nhận root là list hoặc dict 1 câu
     items = data if isinstance(data, list) else [data]
 
-    for q in items:
-        if not isinstance(q, dict) or "question_type" not in q:
-            continue
-
-        qtype = q.get("question_type")
-        qid = (q.get("question_id") or "noid").strip()
-        qname = (q.get("question_name") or qid).strip()
-        qtext = q.get("question_content", "") or ""
-        solution = (q.get("explanation") or {}).get("text", "") or ""
-        qcat = _norm_category(q.get("question_category"))
-
-        # ẢNH ĐỀ đặt SAU nội dung question_content
-        qimg = q.get("question_image_url") or q.get("question_image")
-        if qimg:
-            qtext = f"{qtext}{_img_html(qimg, alt=qname)}"
-
-        # BẢNG ĐỀ (nếu có) đặt SAU ảnh
-        qtbls = q.get("question_table") or []
-        if qtbls:
-            qtext = f"{qtext}{_render_tables_block(qtbls)}"
+    # Ghi streaming: mỗi câu xuống file ngay khi dựng xong
+    out_path = Path(xml_out)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    cache = None
+    if fragment_cache:
+        cache_path = fragment_cache if isinstance(fragment_cache, str) else out_path.with_name(f".{out_path.stem}.fragments.json")
+        cache = FragmentCache(str(cache_path), salt=f"exporter-{EXPORTER_VERSION}")
+    try:
+        if max_shard_bytes or max_shard_questions:
+            with MoodleQuizShardWriter(
+                str(out_path.parent), basename=out_path.stem,
+                max_bytes=max_shard_bytes, max_questions=max_shard_questions,
+            ) as quiz:
+                _write_questions(quiz, items, count, images, uploader, cache)
+            result = str(quiz.manifest_path)
+            where = f"{len(quiz.shards)} shard → {result}"
+        else:
+            with MoodleQuizWriter(xml_out) as quiz:
+                _write_questions(quiz, items, count, images, uploader, cache)
+            result = where = xml_out
+    finally:
+        if own_uploader:
+            uploader.close()
+    if cache is not None:
+        cache.save()
+        where = f"{where} (cache: {cache.hits} giữ nguyên, {cache.misses} dựng lại)"
 
+    print(
+        f"✅ Xuất XML Moodle: {where} | "
+        f"MCQ: {count['multichoice']} | KPrime: {count['kprime']} | SA: {count['shortanswer']}"
+    )
+    return result
 
-        # ẢNH LỜI GIẢI đặt TRƯỚC nội dung solution
-        eimg = (q.get("explanation") or {}).get("image_url") or (q.get("explanation") or {}).get("image")
-        if eimg:
-            solution = f"{_img_html(eimg, alt=f'explain-{qname}')}{(solution or '')}"
 
-        # BẢNG LỜI GIẢI (nếu có) đặt SAU nội dung solution
-        etbls = (q.get("explanation") or {}).get("table") or []
-        if etbls:
-            solution = f"{solution}{_render_tables_block(etbls)}"
+def _write_questions(
+    quiz,
+    items,
+    count: dict,
+    images: ImageSources | None = None,
+    uploader: ImageUploader | None = None,
+    cache: FragmentCache | None = None,
+) -> None:
+    """
+    Dựng từng câu hỏi Moodle từ Question (hoặc dict) và đẩy vào quiz (MoodleQuiz / MoodleQuizWriter / ShardWriter).
+    - uploader: gắn *_url cho câu cần dựng lại (câu lấy từ cache thì KHÔNG upload lại)
+    - cache: FragmentCache; câu không đổi được ghép thẳng từ XML đã render lần trước
+    """
+    images = images or ImageSources()
 
+    # Lượt 1: tra cache; gom ảnh của các câu phải dựng lại để nén + upload cả lô (process pool + luồng I/O)
+    rows = []
+    for item in items:
+        q = as_question(item)
+        if q is None:
+            continue
+        # khoá cache tính trên câu ĐẦU VÀO (trước khi attach *_url). Câu có ảnh nhúng không cache:
+        # XML chứa base64 cả ảnh → file cache phình to và giữ mọi ảnh trong RAM
+        key = None
+        if cache is not None and not images.embeds(q):
+            key = cache.key(q.to_dict(), images.fingerprint(q))
+        rows.append((q, key, cache.get(key) if key else None))
+
+    results = None
+    if uploader is not None:
+        paths = [p for q, _key, hit in rows if not hit for p in _pending_uploads(q, images.wants_embed)]
+        if len(set(paths)) > 1:
+            results = uploader.upload_many(paths)
+
+    # Lượt 2: dựng/ghép XML theo đúng thứ tự câu
+    for q, key, hit in rows:
+        if hit:
+            kind, q_obj = hit[0], CachedFragment(hit[1])
+        else:
+            if uploader is not None:
+                _attach_links_in_question(q, uploader, skip=images.wants_embed, results=results)
+            kind, q_obj = _build_question(q, images)
+            if key:
+                xml = q_obj.to_xml()
+                # ảnh upload lỗi (file:// / path local) → không cache để lần sau upload lại
+                if _remote_images_only(xml):
+                    cache.put(key, kind, xml)
+                q_obj = CachedFragment(xml)
 
         # Mỗi câu: chèn category riêng
+        qcat = _norm_category(q.question_category)
         if qcat:
             quiz.add_category(qcat)
 
-        if qtype == "multichoice":
-            options = q.get("options", []) or []
-            correct = set(q.get("correct_answer", []) or [])
-            answers = []
-            for idx, opt in enumerate(options):
-                text = _get_opt_text(opt)
-
-                # NEW: chèn ảnh option nếu có
-                oimg = (opt or {}).get("option_image_url") or (opt or {}).get("option_image")
-                if oimg:
-                    text = f'{text}{_img_html(oimg, alt=f"opt-{idx+1}-{qname}")}'
-
-                # NEW: chèn BẢNG option nếu có (option_table)
-                otbl = (opt or {}).get("option_table")
-                if otbl:
-                    text = f'{text}{_render_table_html(otbl)}'
-
-                grade = 100 if idx in correct else 0
-                answers.append((text, grade))
-
-            quiz.add_question(MultiChoiceQuestion(qname, qtext, answers, solution))
-            count["multichoice"] += 1
-
-        elif qtype == "kprime":
-            options = q.get("options", []) or []
-            correct = set(q.get("correct_answer", []) or [])
-            pairs = []
-            for idx, opt in enumerate(options):
-                stmt = _get_opt_text(opt)
-
-                # (Kprime T/F cho từng mệnh đề; nếu có ảnh kèm, vẫn gắn vào stmt)
-                oimg = (opt or {}).get("option_image_url") or (opt or {}).get("option_image")
-                if oimg:
-                    stmt = f'{stmt}{_img_html(oimg, alt=f"opt-{idx+1}-{qname}")}'
-
-                # NEW: bảng theo mệnh đề (nếu có)
-                otbl = (opt or {}).get("option_table")
-                if otbl:
-                    stmt = f'{stmt}{_render_table_html(otbl)}'
-
-                is_true = idx in correct
-                pairs.append((stmt, is_true))
-
-            quiz.add_question(ChoiceTFQuestion(qname, qtext, pairs, general_feedback_html=solution))
-            count["kprime"] += 1
-
-        elif qtype == "shortanswer":
-            raw_answers = q.get("correct_answer", []) or []
-
-            # Ưu tiên Key/Trả lời
-            answers, cleaned_qtext = _extract_shortanswer_key_and_clean_text(qtext, solution)
-
-            # Nếu JSON có correct_answer != rỗng thì dùng
-            if not answers and raw_answers:
-                blob = " ".join(a if isinstance(a, str) else str(a) for a in raw_answers)
-                mnum = _re.search(r"([-+]?\d+(?:[.,]\d+)?)", blob)
-                if mnum:
-                    answers = _dedupe_variants(mnum.group(1))
-                else:
-                    answers = [str(raw_answers[0]).strip()]
-
-            # Fallback: bắt số đầu tiên trong (qtext + solution)
-            if not answers:
-                blob = f"{qtext} {solution}"
-                mnum = _re.search(r"([-+]?\d+(?:[.,]\d+)?)", blob)
-                if mnum:
-                    answers = _dedupe_variants(mnum.group(1))
-
-            if not answers:
-                answers = [""]  # vẫn cho import được
-
-            quiz.add_question(ShortAnswerQuestion(qname, cleaned_qtext, answers, solution))
-            count["shortanswer"] += 1
+        quiz.add_question(q_obj)
+        count[kind] += 1
 
-        else:
-            # Fallback: multichoice
-            options = q.get("options", []) or []
-            correct = set(q.get("correct_answer", []) or [])
-            answers = []
-            for idx, opt in enumerate(options):
-                text = _get_opt_text(opt)
 
-                oimg = (opt or {}).get("option_image_url") or (opt or {}).get("option_image")
-                if oimg:
-                    text = f'{text}{_img_html(oimg, alt=f"opt-{idx+1}-{qname}")}'
+def _option_html(opt, idx: int, qname: str, images: ImageSources, files: list) -> str:
+    """Nội dung 1 phương án/mệnh đề: text + ảnh (nếu có) + bảng (nếu có)."""
+    text = opt.option_text
 
-                otbl = (opt or {}).get("option_table")
-                if otbl:
-                    text = f'{text}{_render_table_html(otbl)}'
+    oimg = images.src(opt.option_image_url, opt.option_image, files)
+    if oimg:
+        text = f'{text}{_img_html(oimg, alt=f"opt-{idx+1}-{qname}")}'
 
-                grade = 100 if idx in correct else 0
-                answers.append((text, grade))
+    if opt.option_table:
+        text = f'{text}{_render_table_html(opt.option_table)}'
+    return text
 
-            quiz.add_question(MultiChoiceQuestion(qname, qtext, answers, solution))
-            count["multichoice"] += 1
 
-    Path(Path(xml_out).parent or ".").mkdir(parents=True, exist_ok=True)
-    quiz.export(xml_out)
-    print(
-        f"✅ Xuất XML Moodle: {xml_out} | "
-        f"MCQ: {count['multichoice']} | KPrime: {count['kprime']} | SA: {count['shortanswer']}"
+def _multichoice(q: Question, qname: str, qtext: str, solution: str, qfiles, efiles, images: ImageSources):
+    correct = set(q.correct_answer or [])
+    answers = []
+    for idx, opt in enumerate(q.options):
+        ofiles = []
+        text = _option_html(opt, idx, qname, images, ofiles)
+        grade = 100 if idx in correct else 0
+        answers.append((text, grade, "", ofiles) if ofiles else (text, grade))
+
+    return "multichoice", MultiChoiceQuestion(
+        qname, qtext, answers, solution,
+        questiontext_files=qfiles, generalfeedback_files=efiles,
     )
-    return xml_out
+
+
+def _build_question(q: Question, images: ImageSources):
+    """Question -> (loại để thống kê, đối tượng câu hỏi Moodle)."""
+    qtype = q.question_type
+    qid = (q.question_id or "noid").strip()
+    qname = (q.question_name or qid).strip()
+    qtext = q.question_content
+    exp = q.explanation
+    solution = exp.text
+
+    qfiles, efiles = [], []  # ảnh nhúng theo vùng (đề / lời giải)
+
+    # ẢNH ĐỀ đặt SAU nội dung question_content
+    qimg = images.src(q.question_image_url, q.question_image, qfiles)
+    if qimg:
+        qtext = f"{qtext}{_img_html(qimg, alt=qname)}"
+
+    # BẢNG ĐỀ (nếu có) đặt SAU ảnh
+    if q.question_table:
+        qtext = f"{qtext}{_render_tables_block(q.question_table)}"
+
+
+    # ẢNH LỜI GIẢI đặt TRƯỚC nội dung solution
+    eimg = images.src(exp.image_url, exp.image, efiles)
+    if eimg:
+        solution = f"{_img_html(eimg, alt=f'explain-{qname}')}{solution}"
+
+    # BẢNG LỜI GIẢI (nếu có) đặt SAU nội dung solution
+    if exp.table:
+        solution = f"{solution}{_render_tables_block(exp.table)}"
+
+
+    if qtype == "multichoice":
+        return _multichoice(q, qname, qtext, solution, qfiles, efiles, images)
+
+    elif qtype == "kprime":
+        correct = set(q.correct_answer or [])
+        pairs = []
+        for idx, opt in enumerate(q.options):
+            # (Kprime T/F cho từng mệnh đề; nếu có ảnh/bảng kèm, vẫn gắn vào stmt)
+            ofiles = []
+            stmt = _option_html(opt, idx, qname, images, ofiles)
+            is_true = idx in correct
+            pairs.append((stmt, is_true, ofiles) if ofiles else (stmt, is_true))
+
+        return "kprime", ChoiceTFQuestion(
+            qname, qtext, pairs, general_feedback_html=solution,
+            text_files=qfiles, general_feedback_files=efiles,
+        )
+
+    elif qtype == "shortanswer":
+        raw_answers = q.correct_answer or []
+
+        # Ưu tiên Key/Trả lời
+        answers, cleaned_qtext = _extract_shortanswer_key_and_clean_text(qtext, solution)
+
+        # Nếu JSON có correct_answer != rỗng thì dùng
+        if not answers and raw_answers:
+            blob = " ".join(a if isinstance(a, str) else str(a) for a in raw_answers)
+            mnum = _re.search(r"([-+]?\d+(?:[.,]\d+)?)", blob)
+            if mnum:
+                answers = _dedupe_variants(mnum.group(1))
+            else:
+                answers = [str(raw_answers[0]).strip()]
+
+        # Fallback: bắt số đầu tiên trong (qtext + solution)
+        if not answers:
+            blob = f"{qtext} {solution}"
+            mnum = _re.search(r"([-+]?\d+(?:[.,]\d+)?)", blob)
+            if mnum:
+                answers = _dedupe_variants(mnum.group(1))
+
+        if not answers:
+            answers = [""]  # vẫn cho import được
+
+        return "shortanswer", ShortAnswerQuestion(
+            qname, cleaned_qtext, answers, solution,
+            questiontext_files=qfiles, generalfeedback_files=efiles,
+        )
+
+    else:
+        # Fallback: multichoice
+        return _multichoice(q, qname, qtext, solution, qfiles, efiles, images)
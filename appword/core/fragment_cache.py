@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from appword.core.serialization import default_format, dumps, read_file
+
+
+class CachedFragment:
+    """Khối <question> đã render sẵn (lấy từ cache) — dùng như một câu hỏi có .to_xml()."""
+    __slots__ = ("xml",)
+
+    def __init__(self, xml: str):
+        self.xml = xml
+
+    def to_xml(self) -> str:
+        return self.xml
+
+
+class FragmentCache:
+    """
+    Cache XML đã render theo TỪNG câu hỏi, lưu thành 1 file JSON cạnh moodle.xml.
+      - khoá = sha256(dict câu hỏi chuẩn hoá + salt (phiên bản exporter, tuỳ chọn) + extra)
+      - chỉ giữ lại các khoá dùng ở lần xuất gần nhất (tự dọn câu đã xoá/sửa)
+    """
+
+    def __init__(self, path: str, salt: str = ""):
+        self.path = Path(path)
+        self.salt = salt
+        self.hits = 0
+        self.misses = 0
+        self._old: Dict[str, list] = {}
+        self._new: Dict[str, list] = {}
+        try:
+            raw = read_file(self.path)
+            if raw.get("salt") == salt:
+                self._old = raw.get("fragments") or {}
+        except Exception:
+            # chưa có cache / cache hỏng -> dựng lại toàn bộ
+            self._old = {}
+
+    def key(self, q: dict, extra: str = "") -> str:
+        blob = json.dumps(q, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+        h = hashlib.sha256(self.salt.encode("utf-8"))
+        h.update(blob.encode("utf-8"))
+        if extra:
+            h.update(extra.encode("utf-8"))
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[Tuple[str, str]]:
+        hit = self._new.get(key) or self._old.get(key)
+        if hit is None:
+            self.misses += 1
+            return None
+        self._new[key] = hit
+        self.hits += 1
+        return hit[0], hit[1]
+
+    def put(self, key: str, kind: str, xml: str) -> None:
+        self._new[key] = [kind, xml]
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".part")
+        # file nội bộ: không cần thụt lề; msgpack nếu được chọn (APPWORD_JSON_FORMAT)
+        fmt = "msgpack" if default_format() == "msgpack" else "json-compact"
+        tmp.write_bytes(dumps({"salt": self.salt, "fragments": self._new}, fmt))
+        os.replace(tmp, self.path)
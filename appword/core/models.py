@@ -1,15 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+Model câu hỏi dùng chung cho parser → enricher → exporter.
+- Lớp có __slots__ (Python >= 3.10): không __dict__ cho từng câu, truy cập thuộc tính trực tiếp
+  thay vì (d or {}).get(...) lặp lại trong vòng lặp xuất XML.
+- from_dict / to_dict viết tay (không dùng dataclasses.asdict) — nhanh, giữ nguyên schema JSON cũ;
+  khoá lạ được giữ trong `extra` để ghi lại không mất dữ liệu.
+- List câu hỏi có thể xen các dict không phải câu hỏi (VD {"//": "===== Câu 1 ====="}):
+  chúng được giữ nguyên là dict.
+"""
+from __future__ import annotations
+
+import sys
 from dataclasses import dataclass, field
-from typing import List, Optional, Dict, Any
-@dataclass
-class Explanation: text: str=""; image: Optional[str]=None; table: List[Dict[str,Any]]=field(default_factory=list)
-@dataclass
-class OptionItem: letter: Optional[str]=None; option_text: str=""; option_image: Optional[str]=None; option_table: Optional[dict]=None
-@dataclass
-class Metadata: difficulty: str="medium"; tags: List[str]=field(default_factory=list); author: str="GV Huỳnh Văn Lợi"; source: Dict[str,Any]=field(default_factory=dict)
-@dataclass
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from appword.core.serialization import read_file, write_file
+
+_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+
+def _str_or_none(v) -> Optional[str]:
+    return v if v is None or isinstance(v, str) else str(v)
+
+
+def _with_extra(out: Dict[str, Any], extra: Dict[str, Any]) -> Dict[str, Any]:
+    if extra:
+        for k, v in extra.items():
+            out.setdefault(k, v)
+    return out
+
+
+@dataclass(**_SLOTS)
+class Explanation:
+    text: str = ""
+    image: Optional[str] = None
+    table: List[Dict[str, Any]] = field(default_factory=list)
+    image_url: Optional[str] = None
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+    _KEYS = ("text", "image", "table", "image_url")
+
+    @classmethod
+    def from_dict(cls, d) -> "Explanation":
+        if d is None:
+            return cls()
+        if not isinstance(d, dict):
+            return cls(text=str(d))
+        return cls(
+            text=d.get("text") or "",
+            image=_str_or_none(d.get("image")),
+            table=d.get("table") or [],
+            image_url=_str_or_none(d.get("image_url")),
+            extra={k: v for k, v in d.items() if k not in cls._KEYS},
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        out = {"text": self.text, "image": self.image, "table": self.table}
+        if self.image_url is not None:
+            out["image_url"] = self.image_url
+        return _with_extra(out, self.extra)
+
+
+@dataclass(**_SLOTS)
+class OptionItem:
+    letter: Optional[str] = None
+    option_text: str = ""
+    option_image: Optional[str] = None
+    option_table: Optional[dict] = None
+    option_image_url: Optional[str] = None
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+    _KEYS = ("letter", "option_text", "text", "answer", "value", "option_image", "option_table", "option_image_url")
+
+    @classmethod
+    def from_dict(cls, d) -> "OptionItem":
+        if not isinstance(d, dict):
+            return cls(option_text="" if d is None else str(d))
+        text = d.get("option_text") or d.get("text") or d.get("answer") or d.get("value") or ""
+        return cls(
+            letter=d.get("letter"),
+            option_text=text if isinstance(text, str) else str(text),
+            option_image=_str_or_none(d.get("option_image")),
+            option_table=d.get("option_table"),
+            option_image_url=_str_or_none(d.get("option_image_url")),
+            extra={k: v for k, v in d.items() if k not in cls._KEYS},
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        out = {"option_text": self.option_text, "option_image": self.option_image, "option_table": self.option_table}
+        if self.letter is not None:
+            out["letter"] = self.letter
+        if self.option_image_url is not None:
+            out["option_image_url"] = self.option_image_url
+        return _with_extra(out, self.extra)
+
+
+@dataclass(**_SLOTS)
+class Metadata:
+    difficulty: str = "medium"
+    tags: List[str] = field(default_factory=list)
+    author: str = "GV Huỳnh Văn Lợi"
+    source: Dict[str, Any] = field(default_factory=dict)
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+    _KEYS = ("difficulty", "tags", "author", "source")
+
+    @classmethod
+    def from_dict(cls, d) -> Optional["Metadata"]:
+        if not isinstance(d, dict):
+            return None
+        return cls(
+            difficulty=d.get("difficulty", "medium"),
+            tags=d.get("tags") or [],
+            author=d.get("author", ""),
+            source=d.get("source") or {},
+            extra={k: v for k, v in d.items() if k not in cls._KEYS},
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        out = {"difficulty": self.difficulty, "tags": self.tags, "author": self.author, "source": self.source}
+        return _with_extra(out, self.extra)
+
+
+@dataclass(**_SLOTS)
 class Question:
-    question_type: str="multichoice"; question_id: str="Q001"; question_name: str=""; question_category: str=""
-    question_content: str=""; question_image: Optional[str]=None
-    question_table: List[Dict[str,Any]]=field(default_factory=list); options: List[OptionItem]=field(default_factory=list)
-    correct_answer: List[int]=field(default_factory=list); explanation: Explanation=field(default_factory=Explanation)
-    metadata: Metadata=field(default_factory=Metadata)
+    question_type: str = "multichoice"
+    question_id: str = ""
+    question_name: str = ""
+    question_category: str = ""
+    question_content: str = ""
+    question_image: Optional[str] = None
+    question_table: List[Dict[str, Any]] = field(default_factory=list)
+    options: List[OptionItem] = field(default_factory=list)
+    correct_answer: Optional[List[Any]] = None
+    explanation: Explanation = field(default_factory=Explanation)
+    metadata: Optional[Metadata] = None
+    question_image_url: Optional[str] = None
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+    _KEYS = (
+        "question_type", "question_id", "question_name", "question_category", "question_content",
+        "question_image", "question_table", "options", "correct_answer", "explanation", "metadata",
+        "question_image_url",
+    )
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "Question":
+        qid = d.get("question_id")
+        cat = d.get("question_category")
+        return cls(
+            question_type=d.get("question_type") or "",
+            question_id="" if qid is None else str(qid),
+            question_name=d.get("question_name") or "",
+            question_category="" if cat is None else str(cat),
+            question_content=d.get("question_content") or "",
+            question_image=_str_or_none(d.get("question_image")),
+            question_table=d.get("question_table") or [],
+            options=[OptionItem.from_dict(o) for o in (d.get("options") or [])],
+            correct_answer=d.get("correct_answer"),
+            explanation=Explanation.from_dict(d.get("explanation")),
+            metadata=Metadata.from_dict(d.get("metadata")),
+            question_image_url=_str_or_none(d.get("question_image_url")),
+            extra={k: v for k, v in d.items() if k not in cls._KEYS},
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        out = {
+            "question_type": self.question_type,
+            "question_id": self.question_id,
+            "question_name": self.question_name,
+            "question_category": self.question_category,
+            "question_content": self.question_content,
+            "question_image": self.question_image,
+            "question_table": self.question_table,
+            "options": [o.to_dict() for o in self.options],
+            "correct_answer": self.correct_answer,
+            "explanation": self.explanation.to_dict(),
+        }
+        if self.metadata is not None:
+            out["metadata"] = self.metadata.to_dict()
+        if self.question_image_url is not None:
+            out["question_image_url"] = self.question_image_url
+        return _with_extra(out, self.extra)
+
+
+# list câu hỏi: Question xen dict chú thích
+QuestionList = List[Union[Question, Dict[str, Any]]]
+
+
+# ========= Chuyển đổi list =========
+def as_question(item) -> Optional[Question]:
+    """Question → giữ nguyên; dict có 'question_type' → Question; còn lại (chú thích…) → None."""
+    if isinstance(item, Question):
+        return item
+    if isinstance(item, dict) and "question_type" in item:
+        return Question.from_dict(item)
+    return None
+
+
+def questions_from_dicts(items: Iterable[Any]) -> QuestionList:
+    out: QuestionList = []
+    for item in items:
+        q = as_question(item)
+        out.append(item if q is None else q)
+    return out
+
+
+def questions_to_dicts(items: Iterable[Any]) -> List[Any]:
+    return [x.to_dict() if isinstance(x, Question) else x for x in items]
+
+
+# ========= Biên file (định dạng: appword.core.serialization) =========
+def load_questions(path) -> QuestionList:
+    """Đọc file câu hỏi (JSON / MessagePack, tự nhận diện; list hoặc 1 câu dạng dict)."""
+    data = read_file(path)
+    return questions_from_dicts(data if isinstance(data, list) else [data])
+
+
+def dump_questions(path, items: Iterable[Any], fmt: Optional[str] = None) -> str:
+    """fmt: "json" | "json-compact" | "msgpack" (None → APPWORD_JSON_FORMAT, mặc định "json")."""
+    return write_file(path, questions_to_dicts(items), fmt)
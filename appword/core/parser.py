@@ -1,12 +1,12 @@
 # -*- coding: utf-8 -*-
 import os
 import re
-import json
 from pathlib import Path
 from docx import Document
 from docx.table import Table
 from docx.text.paragraph import Paragraph
 from appword.core.utils import save_inline_images, table_to_json, iter_block_items
+from appword.core.models import Explanation, Metadata, OptionItem, Question, QuestionList, dump_questions
 
 # --- Helpers bắt Key / Trả lời cho shortanswer ---
 _KEY_RE = re.compile(
@@ -65,17 +65,39 @@ def parse_docx_to_json(
     docx_path,
     output_dir="output_questions",
     image_dir="images",
-    author="GV Huỳnh Văn Lợi"
+    author="GV Huỳnh Văn Lợi",
+    fmt=None,
 ):
+    """fmt: định dạng file ("json" | "json-compact" | "msgpack", xem appword.core.serialization)."""
+    questions = parse_docx(docx_path, output_dir=output_dir, image_dir=image_dir, author=author)
+
+    out_file = os.path.join(output_dir, "questionsTF.json")
+    dump_questions(out_file, questions, fmt)
+
+    print(f"✅ Đã parse {sum(isinstance(q, Question) for q in questions)} câu hỏi → {out_file}")
+    return out_file
+
+
+def parse_docx(
+    docx_path,
+    output_dir="output_questions",
+    image_dir="images",
+    author="GV Huỳnh Văn Lợi"
+) -> QuestionList:
+    """
+    Parse .docx -> list Question (xen dict chú thích "//") trong bộ nhớ, KHÔNG ghi JSON.
+    Dựng thẳng Question / OptionItem khi đọc (không qua dict trung gian).
+    Ảnh vẫn được lưu vào <output_dir>/<image_dir>.
+    """
     Path(output_dir).mkdir(parents=True, exist_ok=True)
     image_dir_full = Path(output_dir) / image_dir
     image_dir_full.mkdir(parents=True, exist_ok=True)
 
     doc = Document(docx_path)
 
-    questions = []
+    questions: QuestionList = []
     current_q = None
-    options = []
+    options = []  # [(chữ cái, OptionItem)] — sắp theo chữ cái khi flush
     correct_answers = []
     is_in_explanation = False
     current_tags = []
@@ -95,52 +117,48 @@ def parse_docx_to_json(
     def flush_current():
         nonlocal current_q, options, correct_answers, questions, has_lower_option
         if current_q:
-            q_number = len([q for q in questions if 'question_type' in q]) + 1
+            q_number = sum(isinstance(q, Question) for q in questions) + 1
             questions.append({"//": f"===== Câu {q_number} ====="})
 
             # ✳️ Bắt Key/Trả lời và làm sạch content trước khi xác định loại câu hỏi
             ans_from_key, cleaned_content = extract_key_and_clean(
-                current_q.get("question_content", ""),
-                current_q.get("explanation", {}).get("text", ""),
+                current_q.question_content,
+                current_q.explanation.text,
             )
-            current_q["question_content"] = cleaned_content
+            current_q.question_content = cleaned_content
 
             if not options:
                 # Không có phương án -> shortanswer
-                current_q["question_type"] = "shortanswer"
+                current_q.question_type = "shortanswer"
 
                 if ans_from_key:
                     # Ưu tiên Key/Trả lời
-                    current_q["correct_answer"] = ans_from_key
+                    current_q.correct_answer = ans_from_key
                 else:
                     # Fallback: xem trong 'Lời giải' có 'Đáp án/Đáp số/Kết quả:'
                     ans_match = re.search(
                         r"(Đáp án|Đáp số|Kết quả)\s*[:：]\s*(.+)",
-                        current_q["explanation"]["text"]
+                        current_q.explanation.text
                     )
                     if ans_match:
                         ans_line = ans_match.group(2).strip().splitlines()[0].strip()
-                        current_q["correct_answer"] = [ans_line]
+                        current_q.correct_answer = [ans_line]
                     else:
                         # vẫn không có -> cố gắng lấy từ correct_answers đang gom (nếu có)
-                        current_q["correct_answer"] = ans_from_key or (correct_answers if correct_answers else [])
+                        current_q.correct_answer = ans_from_key or (correct_answers if correct_answers else [])
             else:
                 # Có phương án -> MCQ/KPRIME
-                if current_q.get("question_type") not in ("multichoice", "kprime"):
-                    current_q["question_type"] = "kprime" if has_lower_option else "multichoice"
+                if current_q.question_type not in ("multichoice", "kprime"):
+                    current_q.question_type = "kprime" if has_lower_option else "multichoice"
                 else:
                     if has_lower_option:
-                        current_q["question_type"] = "kprime"
+                        current_q.question_type = "kprime"
 
-                current_q["options"] = [{
-                    "option_text": opt.get("text"),
-                    "option_image": opt.get("image"),
-                    "option_table": opt.get("table")
-                } for opt in sorted(options, key=lambda o: o["letter"])]
+                current_q.options = [opt for _letter, opt in sorted(options, key=lambda o: o[0])]
 
-                current_q["correct_answer"] = correct_answers if correct_answers else []
+                current_q.correct_answer = correct_answers if correct_answers else []
 
-            current_q["metadata"]["source"] = {
+            current_q.metadata.source = {
                 "file_name": Path(docx_path).name,
                 "full_path": str(Path(docx_path).resolve()),
                 "question_index": q_number
@@ -178,19 +196,15 @@ def parse_docx_to_json(
                     qid = f"Q{str(q_counter).zfill(3)}"
                     q_content = tail
 
-                current_q = {
-                    "question_type": "multichoice",
-                    "question_id": qid,
-                    "question_name": title_candidate or "",
-                    "question_category": title_candidate or "",
-                    "question_content": q_content,
-                    "question_image": None,
-                    "question_table": [],
-                    "options": [],
-                    "correct_answer": None,
-                    "explanation": {"text": "", "image": None, "table": []},
-                    "metadata": {"difficulty": "medium", "tags": current_tags, "author": author, "source": {}}
-                }
+                current_q = Question(
+                    question_type="multichoice",
+                    question_id=qid,
+                    question_name=title_candidate or "",
+                    question_category=title_candidate or "",
+                    question_content=q_content,
+                    explanation=Explanation(),
+                    metadata=Metadata(difficulty="medium", tags=current_tags, author=author),
+                )
                 is_in_explanation = False
                 continue
 
@@ -198,10 +212,10 @@ def parse_docx_to_json(
                 is_in_explanation = True
                 # Cắt phần "Lời giải" (nếu có dấu ":" thì bỏ luôn)
                 after = text[len("Lời giải"):].lstrip(" :：").strip() if text.lower().startswith("lời giải") else text[len("loi giai"):].lstrip(" :：").strip()
-                current_q["explanation"]["text"] = after
-                img_paths = save_inline_images(block, str(image_dir_full), current_q["question_id"], part="explanation", idx=b_idx)
+                current_q.explanation.text = after
+                img_paths = save_inline_images(block, str(image_dir_full), current_q.question_id, part="explanation", idx=b_idx)
                 if img_paths:
-                    current_q["explanation"]["image"] = img_paths[0]
+                    current_q.explanation.image = img_paths[0]
                 continue
 
             if current_q and not is_in_explanation:
@@ -218,45 +232,38 @@ def parse_docx_to_json(
                     if is_underlined and "ABCD".find(opt_letter) != -1:
                         correct_answers.append("ABCD".index(opt_letter))
 
-                    img_paths = save_inline_images(block, str(image_dir_full), current_q["question_id"], part=f"opt{opt_letter}", idx=b_idx)
-                    options.append({
-                        "letter": opt_letter,
-                        "text": opt_text,
-                        "image": (img_paths[0] if img_paths else None),
-                        "table": None
-                    })
+                    img_paths = save_inline_images(block, str(image_dir_full), current_q.question_id, part=f"opt{opt_letter}", idx=b_idx)
+                    options.append((opt_letter, OptionItem(
+                        option_text=opt_text,
+                        option_image=(img_paths[0] if img_paths else None),
+                    )))
                     continue
 
             if current_q:
                 if is_in_explanation:
                     if text:
-                        current_q["explanation"]["text"] += (("\n" if current_q["explanation"]["text"] else "") + text)
-                    img_paths = save_inline_images(block, str(image_dir_full), current_q["question_id"], part="explanation", idx=b_idx)
-                    if img_paths and not current_q["explanation"]["image"]:
-                        current_q["explanation"]["image"] = img_paths[0]
+                        exp = current_q.explanation
+                        exp.text += (("\n" if exp.text else "") + text)
+                    img_paths = save_inline_images(block, str(image_dir_full), current_q.question_id, part="explanation", idx=b_idx)
+                    if img_paths and not current_q.explanation.image:
+                        current_q.explanation.image = img_paths[0]
                 else:
                     if text:
-                        if not current_q["question_content"]:
-                            current_q["question_content"] = text
+                        if not current_q.question_content:
+                            current_q.question_content = text
                         else:
-                            current_q["question_content"] += "\n" + text
-                    img_paths = save_inline_images(block, str(image_dir_full), current_q["question_id"], part="content", idx=b_idx)
-                    if img_paths and not current_q["question_image"]:
-                        current_q["question_image"] = img_paths[0]
+                            current_q.question_content += "\n" + text
+                    img_paths = save_inline_images(block, str(image_dir_full), current_q.question_id, part="content", idx=b_idx)
+                    if img_paths and not current_q.question_image:
+                        current_q.question_image = img_paths[0]
 
         elif isinstance(block, Table) and current_q:
             tbl_json = table_to_json(block)
             if is_in_explanation:
-                current_q["explanation"]["table"].append(tbl_json)
+                current_q.explanation.table.append(tbl_json)
             else:
-                current_q["question_table"].append(tbl_json)
+                current_q.question_table.append(tbl_json)
 
     # flush cuối
     flush_current()
-
-    out_file = os.path.join(output_dir, "questionsTF.json")
-    with open(out_file, "w", encoding="utf-8") as f:
-        json.dump(questions, f, ensure_ascii=False, indent=2)
-
-    print(f"✅ Đã parse {len([q for q in questions if 'question_type' in q])} câu hỏi → {out_file}")
-    return out_file
+    return questions
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+Lớp (de)serialize dùng chung cho các file trung gian (questionsTF.json, *.uploaded.json, cache…).
+- "json":         thụt 2 dấu cách, UTF-8 không escape (như json.dump(indent=2, ensure_ascii=False))
+- "json-compact": không thụt/dấu cách — nhỏ và nhanh hơn
+- "msgpack":      MessagePack nhị phân (cần `msgpack` hoặc `msgspec`; thiếu thì ghi json-compact)
+Backend JSON: orjson → msgspec → json chuẩn (tự chọn cái có sẵn).
+Khi đọc, định dạng được nhận diện từ nội dung (không dựa vào đuôi file) → mọi bước đọc được
+file do bước trước ghi ở bất kỳ định dạng nào.
+Định dạng mặc định: biến môi trường APPWORD_JSON_FORMAT (mặc định "json").
+"""
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import Any, Optional, Union
+
+try:
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import msgspec  # type: ignore
+except ImportError:  # pragma: no cover
+    msgspec = None
+
+try:
+    import msgpack  # type: ignore
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+FORMATS = ("json", "json-compact", "msgpack")
+ENV_FORMAT = "APPWORD_JSON_FORMAT"
+
+_BOM = b"\xef\xbb\xbf"
+_WS = b" \t\r\n"
+
+
+def default_format() -> str:
+    fmt = (os.getenv(ENV_FORMAT) or "json").strip().lower()
+    return fmt if fmt in FORMATS else "json"
+
+
+def _resolve(fmt: Optional[str]) -> str:
+    fmt = (fmt or default_format()).strip().lower()
+    if fmt not in FORMATS:
+        raise ValueError(f"Định dạng không hợp lệ: {fmt!r} (chọn {', '.join(FORMATS)})")
+    if fmt == "msgpack" and msgpack is None and msgspec is None:
+        print("[serialization] Chưa cài msgpack/msgspec → ghi json-compact")
+        return "json-compact"
+    return fmt
+
+
+def has_msgpack() -> bool:
+    return msgpack is not None or msgspec is not None
+
+
+# ========= JSON =========
+def _dumps_json(obj: Any, indent: bool) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    if msgspec is not None:
+        data = msgspec.json.encode(obj)
+        return msgspec.json.format(data, indent=2) if indent else data
+    if indent:
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _loads_json(raw: Union[bytes, str]) -> Any:
+    if orjson is not None:
+        return orjson.loads(raw)
+    if msgspec is not None:
+        return msgspec.json.decode(raw)
+    return json.loads(raw)
+
+
+# ========= MessagePack =========
+def _dumps_msgpack(obj: Any) -> bytes:
+    if msgpack is not None:
+        return msgpack.packb(obj, use_bin_type=True)
+    return msgspec.msgpack.encode(obj)
+
+
+def _loads_msgpack(raw: bytes) -> Any:
+    if msgpack is not None:
+        return msgpack.unpackb(raw, raw=False, strict_map_key=False)
+    if msgspec is not None:
+        return msgspec.msgpack.decode(raw)
+    raise RuntimeError("File MessagePack nhưng chưa cài msgpack/msgspec (pip install msgpack)")
+
+
+# ========= API =========
+def detect_format(raw: Union[bytes, str]) -> str:
+    """'json' | 'msgpack' — theo byte đầu: JSON mở bằng [ hoặc {, MessagePack bằng fixmap/fixarray/map/array."""
+    if isinstance(raw, str):
+        return "json"
+    head = raw[3:] if raw.startswith(_BOM) else raw
+    head = head.lstrip(_WS)[:1]
+    if not head or head in (b"[", b"{"):
+        return "json"
+    b0 = head[0]
+    if 0x80 <= b0 <= 0x9F or b0 in (0xDC, 0xDD, 0xDE, 0xDF):
+        return "msgpack"
+    return "json"
+
+
+def dumps(obj: Any, fmt: Optional[str] = None) -> bytes:
+    fmt = _resolve(fmt)
+    if fmt == "msgpack":
+        return _dumps_msgpack(obj)
+    return _dumps_json(obj, indent=(fmt == "json"))
+
+
+def loads(raw: Union[bytes, str]) -> Any:
+    if detect_format(raw) == "msgpack":
+        return _loads_msgpack(raw)
+    if isinstance(raw, bytes) and raw.startswith(_BOM):
+        raw = raw[3:]
+    return _loads_json(raw)
+
+
+def read_file(path) -> Any:
+    return loads(Path(path).read_bytes())
+
+
+def write_file(path, obj: Any, fmt: Optional[str] = None) -> str:
+    p = Path(path)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    p.write_bytes(dumps(obj, fmt))
+    return str(p)
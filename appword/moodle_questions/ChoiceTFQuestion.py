@@ -1,12 +1,36 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 from typing import List, Tuple, Optional
-from appword.moodle_questions.utils import xml_escape
+from appword.moodle_questions.base import MoodleQuestion, write_html_text
+from appword.moodle_questions.utils import EmbeddedFile, xml_escape
 
-class ChoiceTFQuestion:
+# Các đoạn XML tĩnh (ghép sẵn một lần)
+_HEAD = '<question type="kprime">\n  <name><text>'
+_QTEXT_OPEN = '</text></name>\n  <questiontext format="html">\n'
+_QTEXT_CLOSE = '\n  </questiontext>'
+_GF_OPEN = '\n  <generalfeedback format="html">\n'
+_GF_CLOSE = '\n  </generalfeedback>'
+_ROW_CLOSE = '\n    </optiontext>\n    <feedbacktext format="html"><text></text></feedbacktext>\n  </row>'
+_COLUMNS = (
+    '\n  <column number="1">\n    <responsetext>True</responsetext>\n  </column>'
+    '\n  <column number="2">\n    <responsetext>False</responsetext>\n  </column>'
+)
+_WEIGHT_TRUE = 'columnnumber="1"><value>1.000</value></weight>\n  <weight rownumber="{i}" columnnumber="2"><value>0.000</value></weight>'
+_WEIGHT_FALSE = 'columnnumber="1"><value>0.000</value></weight>\n  <weight rownumber="{i}" columnnumber="2"><value>1.000</value></weight>'
+_TAIL = '\n</question>'
+
+
+class ChoiceTFQuestion(MoodleQuestion):
     """
-    K-prime (4 mệnh đề, 2 cột True/False). pairs: List[(text_html, is_true)]
+    K-prime (4 mệnh đề, 2 cột True/False). pairs: List[(text_html, is_true[, files])]
+    text_files / general_feedback_files: ảnh nhúng @@PLUGINFILE@@ cho đề / lời giải.
     """
+    __slots__ = (
+        "name", "text_html", "pairs", "general_feedback_html", "category",
+        "scoringmethod", "shuffleanswers", "hidden",
+        "text_files", "general_feedback_files",
+    )
+
     def __init__(
         self,
         name: str,
@@ -16,7 +40,9 @@ class ChoiceTFQuestion:
         category: Optional[str] = None,
         scoringmethod: str = "kprime",
         shuffleanswers: bool = True,
-        hidden: int = 0
+        hidden: int = 0,
+        text_files: Optional[List[EmbeddedFile]] = None,
+        general_feedback_files: Optional[List[EmbeddedFile]] = None,
     ) -> None:
         self.name = name
         self.text_html = text_html
@@ -26,48 +52,38 @@ class ChoiceTFQuestion:
         self.scoringmethod = scoringmethod
         self.shuffleanswers = shuffleanswers
         self.hidden = hidden
+        self.text_files = text_files or []
+        self.general_feedback_files = general_feedback_files or []
 
-    def to_xml(self) -> str:
+    def write_xml(self, write) -> None:
         rows = len(self.pairs)
-        out: List[str] = []
-        out.append('<question type="kprime">')
-        out.append(f'  <name><text>{xml_escape(self.name)}</text></name>')
-        out.append('  <questiontext format="html">')
-        out.append(f'    <text><![CDATA[{self.text_html}]]></text>')
-        out.append('  </questiontext>')
+        write(_HEAD)
+        write(xml_escape(self.name))
+        write(_QTEXT_OPEN)
+        write_html_text(write, "    ", self.text_html, self.text_files)
+        write(_QTEXT_CLOSE)
         if self.general_feedback_html:
-            out.append('  <generalfeedback format="html">')
-            out.append(f'    <text><![CDATA[{self.general_feedback_html}]]></text>')
-            out.append('  </generalfeedback>')
-        out.append('  <defaultgrade>1</defaultgrade>')
-        out.append('  <penalty>0.3333333</penalty>')
-        out.append(f'  <hidden>{self.hidden}</hidden>')
-        out.append(f'  <scoringmethod>{xml_escape(self.scoringmethod)}</scoringmethod>')
-        out.append(f'  <shuffleanswers>{"true" if self.shuffleanswers else "false"}</shuffleanswers>')
-        out.append(f'  <numberofrows>{rows}</numberofrows>')
-        out.append('  <numberofcolumns>2</numberofcolumns>')
+            write(_GF_OPEN)
+            write_html_text(write, "    ", self.general_feedback_html, self.general_feedback_files)
+            write(_GF_CLOSE)
+        write(
+            '\n  <defaultgrade>1</defaultgrade>'
+            '\n  <penalty>0.3333333</penalty>'
+            f'\n  <hidden>{self.hidden}</hidden>'
+            f'\n  <scoringmethod>{xml_escape(self.scoringmethod)}</scoringmethod>'
+            f'\n  <shuffleanswers>{"true" if self.shuffleanswers else "false"}</shuffleanswers>'
+            f'\n  <numberofrows>{rows}</numberofrows>'
+            '\n  <numberofcolumns>2</numberofcolumns>'
+        )
         # Rows
-        for i, (stmt_html, _) in enumerate(self.pairs, start=1):
-            out.append(f'  <row number="{i}">')
-            out.append('    <optiontext format="html">')
-            out.append(f'      <text><![CDATA[{stmt_html}]]></text>')
-            out.append('    </optiontext>')
-            out.append('    <feedbacktext format="html"><text></text></feedbacktext>')
-            out.append('  </row>')
+        for i, pair in enumerate(self.pairs, start=1):
+            write(f'\n  <row number="{i}">\n    <optiontext format="html">\n')
+            write_html_text(write, "      ", pair[0], pair[2] if len(pair) >= 3 else None)
+            write(_ROW_CLOSE)
         # Columns
-        out.append('  <column number="1">')
-        out.append('    <responsetext>True</responsetext>')
-        out.append('  </column>')
-        out.append('  <column number="2">')
-        out.append('    <responsetext>False</responsetext>')
-        out.append('  </column>')
+        write(_COLUMNS)
         # Weights
-        for i, (_, is_true) in enumerate(self.pairs, start=1):
-            if is_true:
-                out.append(f'  <weight rownumber="{i}" columnnumber="1"><value>1.000</value></weight>')
-                out.append(f'  <weight rownumber="{i}" columnnumber="2"><value>0.000</value></weight>')
-            else:
-                out.append(f'  <weight rownumber="{i}" columnnumber="1"><value>0.000</value></weight>')
-                out.append(f'  <weight rownumber="{i}" columnnumber="2"><value>1.000</value></weight>')
-        out.append('</question>')
-        return "\n".join(out)
+        for i, pair in enumerate(self.pairs, start=1):
+            write(f'\n  <weight rownumber="{i}" ')
+            write((_WEIGHT_TRUE if pair[1] else _WEIGHT_FALSE).format(i=i))
+        write(_TAIL)
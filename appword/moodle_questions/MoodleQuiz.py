@@ -1,7 +1,23 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
-from typing import List, Tuple, Union
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+_XML_HEAD = '<?xml version="1.0" ?>\n<quiz>\n'
+_XML_TAIL = '</quiz>'
+_WRITE_BUFFER = 1 << 16
+
+
+def _category_xml(cat: str) -> str:
+    return (
+        '<question type="category">\n'
+        f'  <category><text>{cat}</text></category>\n'
+        '</question>'
+    )
 
 
 class MoodleQuiz:
@@ -58,31 +74,32 @@ class MoodleQuiz:
 
     # --- XML helpers (flow cũ) ---
     def _categories_to_xml(self) -> str:
-        lines = []
-        for cat in self._categories:
-            lines.append(
-                '<question type="category">\n'
-                f'  <category><text>{cat}</text></category>\n'
-                '</question>'
-            )
-        return "\n".join(lines)
+        return "\n".join(_category_xml(cat) for cat in self._categories)
 
     def _questions_to_xml(self) -> str:
         return "\n".join(q.to_xml() for q in self._questions)
 
     # --- XML helpers (flow mới) ---
     def _items_to_xml(self) -> str:
-        parts: List[str] = []
-        for kind, payload in self._items:
+        return "\n".join(self._iter_blocks())
+
+    def _iter_entries(self) -> Iterator[Tuple[str, Union[str, object]]]:
+        """("category", path) | ("question", q_obj) theo thứ tự xuất của flow đang dùng."""
+        if self._items:
+            yield from self._items
+        else:
+            for cat in self._categories:
+                yield "category", cat
+            for q in self._questions:
+                yield "question", q
+
+    def _iter_blocks(self) -> Iterator[str]:
+        """Từng khối <question> theo thứ tự xuất (category + câu hỏi), KHÔNG gồm header/footer."""
+        for kind, payload in self._iter_entries():
             if kind == "category":
-                parts.append(
-                    '<question type="category">\n'
-                    f'  <category><text>{payload}</text></category>\n'
-                    '</question>'
-                )
+                yield _category_xml(payload)
             elif kind == "question":
-                parts.append(payload.to_xml())
-        return "\n".join(parts)
+                yield payload.to_xml()
 
     def to_xml(self) -> str:
         parts = ['<?xml version="1.0" ?>', '<quiz>']
@@ -101,6 +118,251 @@ class MoodleQuiz:
         return "\n".join(parts)
 
     def export(self, filepath: str) -> None:
-        xml = self.to_xml()
-        with open(filepath, "w", encoding="utf-8") as f:
-            f.write(xml)
+        """Ghi từng khối xuống file (không dựng chuỗi XML toàn bộ trong RAM)."""
+        with open(filepath, "w", encoding="utf-8", buffering=_WRITE_BUFFER) as f:
+            f.write(_XML_HEAD)
+            for kind, payload in self._iter_entries():
+                if kind == "category":
+                    f.write(_category_xml(payload))
+                elif hasattr(payload, "write_xml"):
+                    payload.write_xml(f.write)
+                else:
+                    f.write(payload.to_xml())
+                f.write("\n")
+            f.write(_XML_TAIL)
+
+
+class MoodleQuizWriter:
+    """
+    Bản streaming của MoodleQuiz (flow interleaved): mỗi add_category/add_question
+    được ghi NGAY xuống file qua buffer, không giữ câu hỏi trong bộ nhớ.
+
+        with MoodleQuizWriter("moodle.xml") as quiz:
+            quiz.add_category("A/B")
+            quiz.add_question(q)
+
+    Ghi vào '<file>.part' rồi đổi tên khi đóng thành công; lỗi giữa chừng -> xoá file tạm.
+    """
+
+    def __init__(self, filepath: str, buffering: int = _WRITE_BUFFER):
+        self.filepath = str(filepath)
+        self._tmp_path = self.filepath + ".part"
+        # newline="\n": byte ghi ra đúng bằng byte ShardWriter đếm/hash (Windows không đổi sang CRLF)
+        self._f: Optional[IO[str]] = open(self._tmp_path, "w", encoding="utf-8", newline="\n", buffering=buffering)
+        self._f.write(_XML_HEAD)
+        self._last_category: str | None = None
+        self.count = 0  # số câu hỏi (không tính category) đã ghi
+
+    # --- Category API (cùng quy tắc với MoodleQuiz.add_category) ---
+    def add_category(self, cat: str) -> None:
+        if not cat:
+            return
+        cat = str(cat).strip().strip("/")
+        if not cat or cat == "0":
+            return
+        if self._last_category == cat:
+            return
+        self._write_block(_category_xml(cat))
+        self._last_category = cat
+
+    # --- Question API ---
+    def add_question(self, q_obj: object) -> None:
+        """
+        q_obj phải có .to_xml() -> str; nếu là MoodleQuestion (.write_xml) thì ghi thẳng
+        vào file, không dựng chuỗi XML của cả câu (ảnh base64 mã hoá dần).
+        """
+        write_xml = getattr(q_obj, "write_xml", None)
+        if write_xml is None:
+            self._write_block(q_obj.to_xml())
+        else:
+            if self._f is None:
+                raise ValueError("MoodleQuizWriter đã đóng")
+            write_xml(self._f.write)
+            self._f.write("\n")
+        self.count += 1
+
+    def add_questions(self, q_objs: Iterable[object]) -> None:
+        for q in q_objs:
+            self.add_question(q)
+
+    def _write_block(self, block: str) -> None:
+        if self._f is None:
+            raise ValueError("MoodleQuizWriter đã đóng")
+        self._f.write(block)
+        self._f.write("\n")
+
+    # --- Đóng file ---
+    def close(self) -> None:
+        if self._f is None:
+            return
+        self._f.write(_XML_TAIL)
+        self._f.close()
+        self._f = None
+        os.replace(self._tmp_path, self.filepath)
+
+    def abort(self) -> None:
+        if self._f is None:
+            return
+        self._f.close()
+        self._f = None
+        try:
+            os.remove(self._tmp_path)
+        except OSError:
+            pass
+
+    def __enter__(self) -> "MoodleQuizWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+
+class MoodleQuizShardWriter:
+    """
+    Xuất XML thành nhiều file nhỏ '<base>_partNN.xml' để import Moodle song song / thử lại từng phần.
+
+    - Ưu tiên cắt ở ranh giới category: khi gặp category mới mà shard hiện tại đã đầy
+      >= soft_ratio (theo số câu hoặc số byte) thì mở shard mới.
+    - Nếu một category quá lớn, cắt giữa chừng khi chạm trần cứng và chèn lại
+      <question type="category"> đang dùng ở đầu shard mới.
+    - Khi đóng: ghi '<base>_manifest.json' (file, số câu, bytes, sha256, categories).
+    """
+
+    def __init__(
+        self,
+        out_dir: str,
+        basename: str = "moodle",
+        max_bytes: Optional[int] = None,
+        max_questions: Optional[int] = None,
+        soft_ratio: float = 0.9,
+    ):
+        if not max_bytes and not max_questions:
+            raise ValueError("Cần ít nhất một trong max_bytes / max_questions")
+        self.out_dir = Path(out_dir)
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.basename = basename
+        self.max_bytes = int(max_bytes) if max_bytes else None
+        self.max_questions = int(max_questions) if max_questions else None
+        self.soft_ratio = float(soft_ratio)
+
+        self.shards: List[Dict[str, Any]] = []
+        self._cur: Optional[MoodleQuizWriter] = None
+        self._cur_info: Dict[str, Any] = {}
+        self._cur_hash = None
+        self._category: str | None = None
+        self.count = 0
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.out_dir / f"{self.basename}_manifest.json"
+
+    # --- Shard helpers ---
+    def _fill_ratio(self) -> float:
+        info = self._cur_info
+        r = 0.0
+        if self.max_questions:
+            r = max(r, info["questions"] / self.max_questions)
+        if self.max_bytes:
+            r = max(r, info["bytes"] / self.max_bytes)
+        return r
+
+    def _open_shard(self) -> None:
+        self._close_shard()
+        name = f"{self.basename}_part{len(self.shards) + 1:02d}.xml"
+        self._cur = MoodleQuizWriter(str(self.out_dir / name))
+        self._cur_hash = hashlib.sha256(_XML_HEAD.encode("utf-8"))
+        self._cur_info = {"file": name, "questions": 0, "bytes": len(_XML_HEAD.encode("utf-8")), "categories": []}
+        self.shards.append(self._cur_info)
+        # shard mới tiếp tục category đang mở
+        if self._category:
+            self._emit_category(self._category)
+
+    def _close_shard(self) -> None:
+        if self._cur is None:
+            return
+        tail = _XML_TAIL.encode("utf-8")
+        self._cur_hash.update(tail)
+        self._cur_info["bytes"] += len(tail)
+        self._cur_info["sha256"] = self._cur_hash.hexdigest()
+        self._cur.close()
+        self._cur = None
+
+    def _write(self, block: str) -> None:
+        data = (block + "\n").encode("utf-8")
+        self._cur._write_block(block)
+        self._cur_hash.update(data)
+        self._cur_info["bytes"] += len(data)
+
+    def _emit_category(self, cat: str) -> None:
+        self._write(_category_xml(cat))
+        self._cur._last_category = cat
+        if cat not in self._cur_info["categories"]:
+            self._cur_info["categories"].append(cat)
+
+    # --- Category API ---
+    def add_category(self, cat: str) -> None:
+        if not cat:
+            return
+        cat = str(cat).strip().strip("/")
+        if not cat or cat == "0":
+            return
+        if self._category == cat:
+            return
+        self._category = cat
+        if self._cur is None or (self._cur_info["questions"] and self._fill_ratio() >= self.soft_ratio):
+            self._open_shard()  # tự chèn category ở đầu shard
+        else:
+            self._emit_category(cat)
+
+    # --- Question API ---
+    def add_question(self, q_obj: object) -> None:
+        block = q_obj.to_xml()
+        if self._cur is None:
+            self._open_shard()
+        elif self._cur_info["questions"]:
+            full = bool(self.max_questions and self._cur_info["questions"] >= self.max_questions)
+            if not full and self.max_bytes:
+                size = len(block.encode("utf-8")) + 1 + len(_XML_TAIL)
+                full = self._cur_info["bytes"] + size > self.max_bytes
+            if full:
+                self._open_shard()
+        self._write(block)
+        self._cur_info["questions"] += 1
+        self._cur.count += 1
+        self.count += 1
+
+    def add_questions(self, q_objs: Iterable[object]) -> None:
+        for q in q_objs:
+            self.add_question(q)
+
+    # --- Đóng + manifest ---
+    def close(self) -> None:
+        if self._cur is None and not self.shards:
+            self._open_shard()  # luôn có ít nhất 1 file hợp lệ
+        self._close_shard()
+        manifest = {
+            "basename": self.basename,
+            "max_bytes": self.max_bytes,
+            "max_questions": self.max_questions,
+            "total_questions": self.count,
+            "shards": self.shards,
+        }
+        self.manifest_path.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    def abort(self) -> None:
+        if self._cur is not None:
+            self._cur.abort()
+            self._cur = None
+
+    def __enter__(self) -> "MoodleQuizShardWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
@@ -1,8 +1,19 @@
 # -*- coding: utf-8 -*-
 from typing import List, Optional, Dict, Any
-from .utils import xml_escape
+from .base import MoodleQuestion, write_html_text
+from .utils import EmbeddedFile, xml_escape
 
-class MultiChoiceQuestion:
+# Các đoạn XML tĩnh (ghép sẵn một lần)
+_HEAD = '<question type="multichoice">\n  <name><text>'
+_QTEXT_OPEN = '</text></name>\n  <questiontext format="html">\n'
+_GF_OPEN = '\n  </questiontext>\n  <generalfeedback format="html">\n'
+_GF_CLOSE = '\n  </generalfeedback>\n  <shuffleanswers>'
+_FEEDBACK_OPEN = '\n    <feedback format="html">\n'
+_FEEDBACK_CLOSE = '\n    </feedback>'
+_TAIL = '\n</question>'
+
+
+class MultiChoiceQuestion(MoodleQuestion):
     """
     MULTICHOICE
     - KHÔNG chèn category bên trong to_xml().
@@ -10,7 +21,17 @@ class MultiChoiceQuestion:
         - text: str (HTML)
         - fraction: int|float (0..100)
         - feedback_html: str (optional)
+        - files: List[EmbeddedFile] (optional, ảnh nhúng @@PLUGINFILE@@)
+      hoặc tuple (text, fraction[, feedback_html[, files]])
+    - questiontext_files / generalfeedback_files: ảnh nhúng cho đề / lời giải.
     """
+    __slots__ = (
+        "name", "questiontext_html", "answers", "generalfeedback_html",
+        "shuffleanswers", "single", "answernumbering", "defaultgrade",
+        "penalty", "hidden", "category_path",
+        "questiontext_files", "generalfeedback_files",
+    )
+
     def __init__(
         self,
         name: str,
@@ -24,6 +45,8 @@ class MultiChoiceQuestion:
         penalty: float = 0.3333333,
         hidden: int = 0,
         category_path: Optional[str] = None,
+        questiontext_files: Optional[List[EmbeddedFile]] = None,
+        generalfeedback_files: Optional[List[EmbeddedFile]] = None,
     ):
         self.name = name
         self.questiontext_html = questiontext_html or ""
@@ -36,24 +59,26 @@ class MultiChoiceQuestion:
         self.penalty = float(penalty)
         self.hidden = int(hidden)
         self.category_path = category_path  # để builder sử dụng
+        self.questiontext_files = questiontext_files or []
+        self.generalfeedback_files = generalfeedback_files or []
 
-    def to_xml(self) -> str:
+    def write_xml(self, write) -> None:
         # KHÔNG render category ở đây
-        lines = []
-        lines.append('<question type="multichoice">')
-        lines.append(f'  <name><text>{xml_escape(self.name)}</text></name>')
-        lines.append('  <questiontext format="html">')
-        lines.append(f'    <text><![CDATA[{self.questiontext_html}]]></text>')
-        lines.append('  </questiontext>')
-        lines.append('  <generalfeedback format="html">')
-        lines.append(f'    <text><![CDATA[{self.generalfeedback_html}]]></text>')
-        lines.append('  </generalfeedback>')
-        lines.append(f'  <shuffleanswers>{"true" if self.shuffleanswers else "false"}</shuffleanswers>')
-        lines.append(f'  <single>{"true" if self.single else "false"}</single>')
-        lines.append(f'  <answernumbering>{xml_escape(self.answernumbering)}</answernumbering>')
-        lines.append(f'  <defaultgrade>{self.defaultgrade:g}</defaultgrade>')
-        lines.append(f'  <penalty>{self.penalty}</penalty>')
-        lines.append(f'  <hidden>{self.hidden}</hidden>')
+        write(_HEAD)
+        write(xml_escape(self.name))
+        write(_QTEXT_OPEN)
+        write_html_text(write, "    ", self.questiontext_html, self.questiontext_files)
+        write(_GF_OPEN)
+        write_html_text(write, "    ", self.generalfeedback_html, self.generalfeedback_files)
+        write(_GF_CLOSE)
+        write(
+            f'{"true" if self.shuffleanswers else "false"}</shuffleanswers>\n'
+            f'  <single>{"true" if self.single else "false"}</single>\n'
+            f'  <answernumbering>{xml_escape(self.answernumbering)}</answernumbering>\n'
+            f'  <defaultgrade>{self.defaultgrade:g}</defaultgrade>\n'
+            f'  <penalty>{self.penalty}</penalty>\n'
+            f'  <hidden>{self.hidden}</hidden>'
+        )
 
         for ans in self.answers:
             # hỗ trợ nhiều dạng: dict | tuple/list | str
@@ -61,23 +86,25 @@ class MultiChoiceQuestion:
                 fraction = float(ans.get("fraction", 0))
                 text_html = ans.get("text", "") or ans.get("answer", "") or ""
                 feedback_html = ans.get("feedback_html", "")
+                files = ans.get("files")
             elif isinstance(ans, (tuple, list)):
                 text_html = str(ans[0]) if len(ans) >= 1 else ""
                 frac = float(ans[1]) if len(ans) >= 2 else 0.0
                 # nếu 0..1 coi là tỉ lệ
                 fraction = int(frac*100) if 0.0 <= frac <= 1.0 else int(frac)
                 feedback_html = str(ans[2]) if len(ans) >= 3 else ""
+                files = ans[3] if len(ans) >= 4 else None
             else:
                 text_html = str(ans)
                 fraction = 0
                 feedback_html = ""
-            lines.append(f'  <answer fraction="{int(fraction)}">')
-            lines.append(f'    <text><![CDATA[{text_html}]]></text>')
+                files = None
+            write(f'\n  <answer fraction="{int(fraction)}">\n')
+            write_html_text(write, "    ", text_html, files)
             if feedback_html:
-                lines.append('    <feedback format="html">')
-                lines.append(f'      <text><![CDATA[{feedback_html}]]></text>')
-                lines.append('    </feedback>')
-            lines.append('  </answer>')
+                write(_FEEDBACK_OPEN)
+                write_html_text(write, "      ", feedback_html)
+                write(_FEEDBACK_CLOSE)
+            write('\n  </answer>')
 
-        lines.append('</question>')
-        return "\n".join(lines)
+        write(_TAIL)
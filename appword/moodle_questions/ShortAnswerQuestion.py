@@ -1,8 +1,19 @@
 # -*- coding: utf-8 -*-
 from typing import List, Dict, Any, Optional
-from .utils import xml_escape
+from .base import MoodleQuestion, write_html_text
+from .utils import EmbeddedFile, xml_escape
 
-class ShortAnswerQuestion:
+# Các đoạn XML tĩnh (ghép sẵn một lần)
+_HEAD = '<question type="shortanswer">\n  <name><text>'
+_QTEXT_OPEN = '</text></name>\n  <questiontext format="html">\n'
+_GF_OPEN = '\n  </questiontext>\n  <generalfeedback format="html">\n'
+_GF_CLOSE = '\n  </generalfeedback>\n'
+_FEEDBACK_OPEN = '\n    <feedback format="html">\n'
+_FEEDBACK_CLOSE = '\n    </feedback>'
+_TAIL = '\n</question>'
+
+
+class ShortAnswerQuestion(MoodleQuestion):
     """
     SHORTANSWER
     - KHÔNG chèn category bên trong to_xml().
@@ -10,7 +21,14 @@ class ShortAnswerQuestion:
         - text: str (đáp án)
         - fraction: int|float (0..100)
         - feedback_html: str (optional)
+    - questiontext_files / generalfeedback_files: ảnh nhúng @@PLUGINFILE@@ cho đề / lời giải.
     """
+    __slots__ = (
+        "name", "questiontext_html", "answers", "generalfeedback_html",
+        "defaultgrade", "penalty", "hidden", "usecase", "category_path",
+        "questiontext_files", "generalfeedback_files",
+    )
+
     def __init__(
         self,
         name: str,
@@ -22,6 +40,8 @@ class ShortAnswerQuestion:
         hidden: int = 0,
         usecase: int = 0,
         category_path: Optional[str] = None,
+        questiontext_files: Optional[List[EmbeddedFile]] = None,
+        generalfeedback_files: Optional[List[EmbeddedFile]] = None,
     ):
         self.name = name
         self.questiontext_html = questiontext_html or ""
@@ -32,22 +52,24 @@ class ShortAnswerQuestion:
         self.hidden = int(hidden)
         self.usecase = int(usecase)  # 0 = not case sensitive, 1 = case sensitive
         self.category_path = category_path  # để builder sử dụng
+        self.questiontext_files = questiontext_files or []
+        self.generalfeedback_files = generalfeedback_files or []
 
-    def to_xml(self) -> str:
+    def write_xml(self, write) -> None:
         # KHÔNG render category ở đây
-        lines = []
-        lines.append('<question type="shortanswer">')
-        lines.append(f'  <name><text>{xml_escape(self.name)}</text></name>')
-        lines.append('  <questiontext format="html">')
-        lines.append(f'    <text><![CDATA[{self.questiontext_html}]]></text>')
-        lines.append('  </questiontext>')
-        lines.append('  <generalfeedback format="html">')
-        lines.append(f'    <text><![CDATA[{self.generalfeedback_html}]]></text>')
-        lines.append('  </generalfeedback>')
-        lines.append(f'  <defaultgrade>{self.defaultgrade:g}</defaultgrade>')
-        lines.append(f'  <penalty>{self.penalty}</penalty>')
-        lines.append(f'  <hidden>{self.hidden}</hidden>')
-        lines.append(f'  <usecase>{self.usecase}</usecase>')
+        write(_HEAD)
+        write(xml_escape(self.name))
+        write(_QTEXT_OPEN)
+        write_html_text(write, "    ", self.questiontext_html, self.questiontext_files)
+        write(_GF_OPEN)
+        write_html_text(write, "    ", self.generalfeedback_html, self.generalfeedback_files)
+        write(_GF_CLOSE)
+        write(
+            f'  <defaultgrade>{self.defaultgrade:g}</defaultgrade>\n'
+            f'  <penalty>{self.penalty}</penalty>\n'
+            f'  <hidden>{self.hidden}</hidden>\n'
+            f'  <usecase>{self.usecase}</usecase>'
+        )
 
         for ans in self.answers:
             if isinstance(ans, dict):
@@ -63,13 +85,12 @@ class ShortAnswerQuestion:
                 text_val = str(ans)
                 fraction = 100
                 feedback_html = ""
-            lines.append(f'  <answer fraction="{int(fraction)}">')
-            lines.append(f'    <text><![CDATA[{text_val}]]></text>')
+            write(f'\n  <answer fraction="{int(fraction)}">\n')
+            write_html_text(write, "    ", text_val)
             if feedback_html:
-                lines.append('    <feedback format="html">')
-                lines.append(f'      <text><![CDATA[{feedback_html}]]></text>')
-                lines.append('    </feedback>')
-            lines.append('  </answer>')
+                write(_FEEDBACK_OPEN)
+                write_html_text(write, "      ", feedback_html)
+                write(_FEEDBACK_CLOSE)
+            write('\n  </answer>')
 
-        lines.append('</question>')
-        return "\n".join(lines)
+        write(_TAIL)
@@ -2,13 +2,17 @@
 
 # -*- coding: utf-8 -*-
 
-from .MoodleQuiz import MoodleQuiz
+from .base import MoodleQuestion
+from .MoodleQuiz import MoodleQuiz, MoodleQuizWriter, MoodleQuizShardWriter
 from .ChoiceTFQuestion import ChoiceTFQuestion
 from .MultiChoiceQuestion import MultiChoiceQuestion
 from .ShortAnswerQuestion import ShortAnswerQuestion
 
 __all__ = [
+    "MoodleQuestion",
     "MoodleQuiz",
+    "MoodleQuizWriter",
+    "MoodleQuizShardWriter",
     "ChoiceTFQuestion",
     "MultiChoiceQuestion",
     "ShortAnswerQuestion",
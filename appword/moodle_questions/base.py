@@ -1 +1,48 @@
-# Lớp cha hoặc interface dùng chung
\ No newline at end of file
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from typing import Callable, Iterable, List, Optional
+
+from .utils import EmbeddedFile
+
+# write(str) -> Any : file.write, list.append, io.StringIO.write, …
+Write = Callable[[str], object]
+
+
+class MoodleQuestion(ABC):
+    """
+    Lớp gốc cho mọi câu hỏi Moodle.
+    - __slots__: không có __dict__ cho từng câu (ngân hàng lớn tốn ít RAM hơn)
+    - write_xml(write) (bắt buộc ở lớp con): ghi thẳng các đoạn XML tĩnh + trường đã escape vào một output
+      (file/buffer), KHÔNG dựng chuỗi trung gian cho cả câu hỏi
+    - to_xml(): tương thích ngược, ghép từ write_xml
+    """
+    __slots__ = ()
+
+    @abstractmethod
+    def write_xml(self, write: Write) -> None:
+        ...
+
+    def to_xml(self) -> str:
+        parts: List[str] = []
+        self.write_xml(parts.append)
+        return "".join(parts)
+
+
+# ========= Helpers dùng chung cho write_xml =========
+def write_files(write: Write, files: Optional[Iterable[EmbeddedFile]], indent: str = "    ") -> None:
+    """Các dòng <file> ngay sau <text> của một vùng html; ảnh mã hoá base64 dần theo khối."""
+    for f in files or ():
+        write("\n")
+        f.write_xml(write, indent)
+
+
+def write_html_text(write: Write, indent: str, html: str, files: Optional[Iterable[EmbeddedFile]] = None) -> None:
+    """'<indent><text><![CDATA[html]]></text>' + các <file> (nếu có). Không xuống dòng ở đầu/cuối."""
+    write(indent)
+    write("<text><![CDATA[")
+    write(html)
+    write("]]></text>")
+    if files:
+        write_files(write, files, indent)
@@ -1,5 +1,19 @@
 # class CalculatedMultiQuestion
-class CalculatedMultiQuestion:
+from .base import MoodleQuestion
+
+_FIXED = (
+    '  <defaultgrade>1.0</defaultgrade>\n'
+    '  <penalty>0.1</penalty>\n'
+    '  <hidden>0</hidden>\n'
+    '  <single>true</single>\n'
+    '  <shuffleanswers>true</shuffleanswers>\n'
+    '  <answernumbering>abc</answernumbering>\n'
+)
+
+
+class CalculatedMultiQuestion(MoodleQuestion):
+    __slots__ = ("name", "text", "qtype", "answers", "solution", "vars_def")
+
     def __init__(self, name, text, answers, solution="", vars_def=None):
         self.name = name
         self.text = text
@@ -8,22 +22,17 @@ class CalculatedMultiQuestion:
         self.solution = solution
         self.vars_def = vars_def or {}
 
-    def to_xml(self):
-        xml = f'<question type="{self.qtype}">\n'
-        xml += f'  <name><text>{self.name}</text></name>\n'
-        xml += f'  <questiontext format="html"><text><![CDATA[{self.text}]]></text></questiontext>\n'
-        xml += f'  <generalfeedback format="html"><text><![CDATA[{self.solution}]]></text></generalfeedback>\n'
-        xml += '  <defaultgrade>1.0</defaultgrade>\n'
-        xml += '  <penalty>0.1</penalty>\n'
-        xml += '  <hidden>0</hidden>\n'
-        xml += '  <single>true</single>\n'
-        xml += '  <shuffleanswers>true</shuffleanswers>\n'
-        xml += '  <answernumbering>abc</answernumbering>\n'
+    def write_xml(self, write):
+        write(f'<question type="{self.qtype}">\n')
+        write(f'  <name><text>{self.name}</text></name>\n')
+        write(f'  <questiontext format="html"><text><![CDATA[{self.text}]]></text></questiontext>\n')
+        write(f'  <generalfeedback format="html"><text><![CDATA[{self.solution}]]></text></generalfeedback>\n')
+        write(_FIXED)
         for text, fraction, feedback in self.answers:
-            xml += f'  <answer fraction="{fraction}" format="moodle_auto_format">\n'
-            xml += f'    <text>{text}</text>\n'
-            xml += f'    <feedback><text>{feedback}</text></feedback>\n'
-            xml += f'  </answer>\n'
-        xml += '</question>\n'
-        return xml
-
+            write(
+                f'  <answer fraction="{fraction}" format="moodle_auto_format">\n'
+                f'    <text>{text}</text>\n'
+                f'    <feedback><text>{feedback}</text></feedback>\n'
+                '  </answer>\n'
+            )
+        write('</question>\n')
@@ -1,6 +1,20 @@
 # moodle_questions/ddwtos.py
+from .base import MoodleQuestion
+
+_FIXED = (
+    '  <defaultgrade>1.0</defaultgrade>\n'
+    '  <penalty>0.1</penalty>\n'
+    '  <hidden>0</hidden>\n'
+    '  <shuffleanswers>true</shuffleanswers>\n'
+    '  <correctfeedback><text>Đúng rồi!</text></correctfeedback>\n'
+    '  <partiallycorrectfeedback><text>Gần đúng!</text></partiallycorrectfeedback>\n'
+    '  <incorrectfeedback><text>Chưa chính xác.</text></incorrectfeedback>\n'
+)
+
+
+class DragDropWordsQuestion(MoodleQuestion):
+    __slots__ = ("name", "text", "qtype", "choices", "solution")
 
-class DragDropWordsQuestion:
     def __init__(self, name, text, qtype="ddwtos", choices=None, solution=""):
         self.name = name
         self.text = text  # Ví dụ: "Trái [[1]] thường có màu [[2]]."
@@ -8,23 +22,18 @@ class DragDropWordsQuestion:
         self.choices = choices or []  # danh sách các lựa chọn dạng (group, text)
         self.solution = solution
 
-    def to_xml(self):
-        xml = f'<question type="ddwtos">\n'
-        xml += f'  <name><text>{self.name}</text></name>\n'
-        xml += f'  <questiontext format="html"><text><![CDATA[{self.text}]]></text></questiontext>\n'
-        xml += f'  <generalfeedback format="html"><text><![CDATA[{self.solution}]]></text></generalfeedback>\n'
-        xml += '  <defaultgrade>1.0</defaultgrade>\n'
-        xml += '  <penalty>0.1</penalty>\n'
-        xml += '  <hidden>0</hidden>\n'
-        xml += '  <shuffleanswers>true</shuffleanswers>\n'
-        xml += '  <correctfeedback><text>Đúng rồi!</text></correctfeedback>\n'
-        xml += '  <partiallycorrectfeedback><text>Gần đúng!</text></partiallycorrectfeedback>\n'
-        xml += '  <incorrectfeedback><text>Chưa chính xác.</text></incorrectfeedback>\n'
+    def write_xml(self, write):
+        write('<question type="ddwtos">\n')
+        write(f'  <name><text>{self.name}</text></name>\n')
+        write(f'  <questiontext format="html"><text><![CDATA[{self.text}]]></text></questiontext>\n')
+        write(f'  <generalfeedback format="html"><text><![CDATA[{self.solution}]]></text></generalfeedback>\n')
+        write(_FIXED)
 
         for group, text in self.choices:
-            xml += f'  <dragbox group="{group}">\n'
-            xml += f'    <text><![CDATA[{text}]]></text>\n'
-            xml += f'  </dragbox>\n'
+            write(
+                f'  <dragbox group="{group}">\n'
+                f'    <text><![CDATA[{text}]]></text>\n'
+                '  </dragbox>\n'
+            )
 
-        xml += '</question>\n'
-        return xml
+        write('</question>\n')
@@ -1,21 +1,29 @@
 # class EssayQuestion
-class EssayQuestion:
+from .base import MoodleQuestion
+
+_FIXED = (
+    '  <responseformat>editor</responseformat>\n'
+    '  <responserequired>1</responserequired>\n'
+    '  <responsefieldlines>10</responsefieldlines>\n'
+    '  <attachments>0</attachments>\n'
+)
+
+
+class EssayQuestion(MoodleQuestion):
+    __slots__ = ("name", "text", "qtype", "solution")
+
     def __init__(self, name, text, solution=""):
         self.name = name
         self.text = text
         self.qtype = "essay"
         self.solution = solution
 
-    def to_xml(self):
-        xml = f'<question type="essay">\n'
-        xml += f'  <name><text>{self.name}</text></name>\n'
-        xml += f'  <questiontext format="html"><text><![CDATA[{self.text}]]></text></questiontext>\n'
-        xml += f'  <generalfeedback format="html"><text><![CDATA[{self.solution}]]></text></generalfeedback>\n'
-        xml += '  <responseformat>editor</responseformat>\n'
-        xml += '  <responserequired>1</responserequired>\n'
-        xml += '  <responsefieldlines>10</responsefieldlines>\n'
-        xml += '  <attachments>0</attachments>\n'
-        xml += f'  <graderinfo format="html"><text><![CDATA[{self.solution}]]></text></graderinfo>\n'
-        xml += '  <responsetemplate format="html"><text><![CDATA[]]></text></responsetemplate>\n'
-        xml += '</question>\n'
-        return xml
+    def write_xml(self, write):
+        write('<question type="essay">\n')
+        write(f'  <name><text>{self.name}</text></name>\n')
+        write(f'  <questiontext format="html"><text><![CDATA[{self.text}]]></text></questiontext>\n')
+        write(f'  <generalfeedback format="html"><text><![CDATA[{self.solution}]]></text></generalfeedback>\n')
+        write(_FIXED)
+        write(f'  <graderinfo format="html"><text><![CDATA[{self.solution}]]></text></graderinfo>\n')
+        write('  <responsetemplate format="html"><text><![CDATA[]]></text></responsetemplate>\n')
+        write('</question>\n')
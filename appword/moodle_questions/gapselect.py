@@ -1,6 +1,19 @@
 # moodle_questions/gapselect.py
+from .base import MoodleQuestion
+
+_FIXED = '''    <defaultgrade>1</defaultgrade>
+    <penalty>0</penalty>
+    <hidden>0</hidden>
+    <shuffleanswers>1</shuffleanswers>
+    <correctfeedback format="html"><text></text></correctfeedback>
+    <partiallycorrectfeedback format="html"><text></text></partiallycorrectfeedback>
+    <incorrectfeedback format="html"><text></text></incorrectfeedback>
+'''
+
+
+class GapSelectQuestion(MoodleQuestion):
+    __slots__ = ("name", "text", "qtype", "choices", "solution", "extra")
 
-class GapSelectQuestion:
     def __init__(self, name, text, qtype="gapselect", choices=None, solution="", extra=None):
         self.name = name
         self.text = text  # Ví dụ: "Trái [[1]] thường có màu [[2]]."
@@ -9,8 +22,8 @@ class GapSelectQuestion:
         self.solution = solution
         self.extra = extra or {}
 
-    def to_xml(self):
-        xml = f'''  <question type="gapselect">
+    def write_xml(self, write):
+        write(f'''  <question type="gapselect">
     <name><text>{self.name}</text></name>
     <questiontext format="html">
       <text><![CDATA[<p>{self.text}</p>]]></text>
@@ -18,20 +31,13 @@ class GapSelectQuestion:
     <generalfeedback format="html">
       <text><![CDATA[<p>{self.solution}</p>]]></text>
     </generalfeedback>
-    <defaultgrade>1</defaultgrade>
-    <penalty>0</penalty>
-    <hidden>0</hidden>
-    <shuffleanswers>1</shuffleanswers>
-    <correctfeedback format="html"><text></text></correctfeedback>
-    <partiallycorrectfeedback format="html"><text></text></partiallycorrectfeedback>
-    <incorrectfeedback format="html"><text></text></incorrectfeedback>
-'''
+''')
+        write(_FIXED)
         for group_index, options in enumerate(self.choices, 1):
             for opt in options:
-                xml += f'''    <selectoption>
+                write(f'''    <selectoption>
       <text>{opt}</text>
       <group>{group_index}</group>
     </selectoption>
-'''
-        xml += '  </question>\n'
-        return xml
+''')
+        write('  </question>\n')
@@ -1,5 +1,10 @@
 # class MatchingQuestion
-class MatchingQuestion:
+from .base import MoodleQuestion
+
+
+class MatchingQuestion(MoodleQuestion):
+    __slots__ = ("name", "text", "qtype", "answers", "solution")
+
     def __init__(self, name, text, answers, solution=""):
         self.name = name
         self.text = text
@@ -7,15 +12,16 @@ class MatchingQuestion:
         self.answers = answers  # List of (subquestion, subanswer)
         self.solution = solution
 
-    def to_xml(self):
-        xml = f'<question type="{self.qtype}">\n'
-        xml += f'  <name><text>{self.name}</text></name>\n'
-        xml += f'  <questiontext format="html"><text><![CDATA[{self.text}]]></text></questiontext>\n'
-        xml += f'  <generalfeedback format="html"><text><![CDATA[{self.solution}]]></text></generalfeedback>\n'
+    def write_xml(self, write):
+        write(f'<question type="{self.qtype}">\n')
+        write(f'  <name><text>{self.name}</text></name>\n')
+        write(f'  <questiontext format="html"><text><![CDATA[{self.text}]]></text></questiontext>\n')
+        write(f'  <generalfeedback format="html"><text><![CDATA[{self.solution}]]></text></generalfeedback>\n')
         for subq, suba in self.answers:
-            xml += '  <subquestion format="html">\n'
-            xml += f'    <text><![CDATA[{subq}]]></text>\n'
-            xml += f'    <answer><text><![CDATA[{suba}]]></text></answer>\n'
-            xml += '  </subquestion>\n'
-        xml += '</question>\n'
-        return xml
+            write(
+                '  <subquestion format="html">\n'
+                f'    <text><![CDATA[{subq}]]></text>\n'
+                f'    <answer><text><![CDATA[{suba}]]></text></answer>\n'
+                '  </subquestion>\n'
+            )
+        write('</question>\n')
@@ -1,26 +1,35 @@
 # moodle_questions/numerical.py
+from .base import MoodleQuestion
+
+_FIXED = (
+    '  <defaultgrade>1.0</defaultgrade>\n'
+    '  <penalty>0.1</penalty>\n'
+    '  <hidden>0</hidden>\n'
+)
+
+
+class NumericalQuestion(MoodleQuestion):
+    __slots__ = ("name", "text", "answers", "solution")
 
-class NumericalQuestion:
     def __init__(self, name, text, answers, solution=""):
         self.name = name
         self.text = text
         self.answers = answers  # List of tuples: (answer, tolerance, fraction, feedback)
         self.solution = solution
 
-    def to_xml(self):
-        xml = f'<question type="numerical">\n'
-        xml += f'  <name><text>{self.name}</text></name>\n'
-        xml += f'  <questiontext format="html"><text><![CDATA[{self.text}]]></text></questiontext>\n'
-        xml += f'  <generalfeedback format="html"><text><![CDATA[{self.solution}]]></text></generalfeedback>\n'
-        xml += f'  <defaultgrade>1.0</defaultgrade>\n'
-        xml += f'  <penalty>0.1</penalty>\n'
-        xml += f'  <hidden>0</hidden>\n'
+    def write_xml(self, write):
+        write('<question type="numerical">\n')
+        write(f'  <name><text>{self.name}</text></name>\n')
+        write(f'  <questiontext format="html"><text><![CDATA[{self.text}]]></text></questiontext>\n')
+        write(f'  <generalfeedback format="html"><text><![CDATA[{self.solution}]]></text></generalfeedback>\n')
+        write(_FIXED)
 
         for ans, tol, frac, fb in self.answers:
-            xml += f'  <answer fraction="{frac}" tolerance="{tol}">\n'
-            xml += f'    <text>{ans}</text>\n'
-            xml += f'    <feedback><text><![CDATA[{fb}]]></text></feedback>\n'
-            xml += f'  </answer>\n'
+            write(
+                f'  <answer fraction="{frac}" tolerance="{tol}">\n'
+                f'    <text>{ans}</text>\n'
+                f'    <feedback><text><![CDATA[{fb}]]></text></feedback>\n'
+                '  </answer>\n'
+            )
 
-        xml += '</question>\n'
-        return xml
+        write('</question>\n')
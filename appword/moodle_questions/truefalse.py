@@ -1,23 +1,29 @@
 # class TrueFalseQuestion
-class TrueFalseQuestion:
+from .base import MoodleQuestion
+
+_ANSWERS_TRUE = (
+    '  <answer fraction="100"><text>true</text></answer>\n'
+    '  <answer fraction="0"><text>false</text></answer>\n'
+)
+_ANSWERS_FALSE = (
+    '  <answer fraction="0"><text>true</text></answer>\n'
+    '  <answer fraction="100"><text>false</text></answer>\n'
+)
+
+
+class TrueFalseQuestion(MoodleQuestion):
+    __slots__ = ("name", "text", "correct", "solution")
+
     def __init__(self, name, text, correct=True, solution=""):
         self.name = name
         self.text = text
         self.correct = correct
         self.solution = solution
 
-    def to_xml(self):
-        xml = '<question type="truefalse">\n'
-        xml += f'  <name><text>{self.name}</text></name>\n'
-        xml += f'  <questiontext format="html"><text><![CDATA[{self.text}]]></text></questiontext>\n'
-        xml += f'  <generalfeedback format="html"><text><![CDATA[{self.solution}]]></text></generalfeedback>\n'
-
-        if self.correct:
-            xml += '  <answer fraction="100"><text>true</text></answer>\n'
-            xml += '  <answer fraction="0"><text>false</text></answer>\n'
-        else:
-            xml += '  <answer fraction="0"><text>true</text></answer>\n'
-            xml += '  <answer fraction="100"><text>false</text></answer>\n'
-
-        xml += '</question>\n'
-        return xml
+    def write_xml(self, write):
+        write('<question type="truefalse">\n')
+        write(f'  <name><text>{self.name}</text></name>\n')
+        write(f'  <questiontext format="html"><text><![CDATA[{self.text}]]></text></questiontext>\n')
+        write(f'  <generalfeedback format="html"><text><![CDATA[{self.solution}]]></text></generalfeedback>\n')
+        write(_ANSWERS_TRUE if self.correct else _ANSWERS_FALSE)
+        write('</question>\n')
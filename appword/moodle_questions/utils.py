@@ -1,5 +1,8 @@
 # -*- coding: utf-8 -*-
-from typing import List, Any, Optional
+import base64
+import os
+from typing import List, Any, Iterator, Optional
+from urllib.parse import quote
 
 def xml_escape(s: Optional[str]) -> str:
     """Escape cơ bản cho các thẻ <text> không dùng CDATA."""
@@ -12,6 +15,50 @@ def xml_escape(s: Optional[str]) -> str:
          .replace("'", "&apos;")
     )
 
+class EmbeddedFile:
+    """
+    File nhúng thẳng vào XML Moodle: <file name=".." path="/" encoding="base64">…</file>,
+    nội dung tham chiếu bằng '@@PLUGINFILE@@/<name>'.
+    - path: đọc từ đĩa, mã hoá base64 DẦN theo khối (không giữ cả ảnh trong RAM)
+    - data: bytes có sẵn (VD: ảnh đã nén lại)
+    """
+    __slots__ = ("name", "path", "data")
+
+    _CHUNK = 3 * 16 * 1024  # bội số của 3 -> các khối base64 nối được với nhau
+
+    def __init__(self, name: str, path: Optional[str] = None, data: Optional[bytes] = None):
+        self.name = os.path.basename(name or "image.png")
+        self.path = path
+        self.data = data
+
+    @property
+    def src(self) -> str:
+        return f"@@PLUGINFILE@@/{quote(self.name)}"
+
+    def iter_base64(self) -> Iterator[str]:
+        if self.data is not None:
+            for i in range(0, len(self.data), self._CHUNK):
+                yield base64.b64encode(self.data[i:i + self._CHUNK]).decode("ascii")
+            return
+        with open(self.path, "rb") as f:
+            while True:
+                chunk = f.read(self._CHUNK)
+                if not chunk:
+                    break
+                yield base64.b64encode(chunk).decode("ascii")
+
+    def write_xml(self, write, indent: str = "    ") -> None:
+        write(f'{indent}<file name="{xml_escape(self.name)}" path="/" encoding="base64">')
+        for chunk in self.iter_base64():
+            write(chunk)
+        write("</file>")
+
+    def to_xml(self, indent: str = "    ") -> str:
+        parts: List[str] = []
+        self.write_xml(parts.append, indent)
+        return "".join(parts)
+
+
 def render_quiz_xml(questions: List[Any]) -> str:
     """
     Ghép XML cuối cùng:
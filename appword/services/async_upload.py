@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+Engine upload asyncio cho tầng mạng của UploadPool.
+- Mỗi request đi qua limiter của (provider, key) (rate_limit.limiter_for):
+  token bucket giữ nhịp request/giây, AIMD giữ số request đồng thời.
+- 429/503: đọc Retry-After (khoá bucket tới hạn đó), giảm nửa cửa sổ đồng thời rồi thử lại;
+  thành công: cửa sổ tăng dần → chạy ở thông lượng cao nhất mà key không bị chặn.
+- HTTP vẫn là requests.Session keep-alive (http_session) chạy trên executor riêng — không thêm
+  phụ thuộc (aiohttp…); session chỉ tự thử lại lỗi kết nối, 429/503 để engine thấy và điều tiết.
+Thứ tự fallback như ImageUploader.upload_encoded: ImgBB → Catbox → lưu local.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import queue
+import random
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Awaitable, Callable, Optional
+
+from appword.services.http_session import shared_session
+from appword.services.rate_limit import THROTTLE_STATUSES, limiter_for, parse_retry_after
+from appword.services.uploader import CATBOX_URL, IMGBB_URL, ImageUploader, UploadResult, requests
+
+
+class AsyncUploadEngine:
+    """Dùng trong một event loop; nhiều engine (nhiều loop/luồng) vẫn chia chung limiter theo key."""
+
+    def __init__(self, uploader: ImageUploader, max_attempts: Optional[int] = None):
+        self.uploader = uploader
+        self.max_attempts = max(1, int(max_attempts or uploader.max_retries))
+        self.keys = uploader.key_pool
+        self.catbox = limiter_for("catbox")
+        self.s3 = limiter_for("s3")
+        per_key = max([limiter_for("imgbb", k).aimd.maximum for k in uploader.api_keys] or [0])
+        threads = min(64, max(per_key * max(1, len(self.keys)), self.catbox.aimd.maximum, self.s3.aimd.maximum) + 1)
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="appword-upload")
+        self.session = shared_session(threads, uploader.max_retries, uploader.backoff_factor)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    async def _call(self, fn, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, partial(fn, *args, **kwargs))
+
+    # ---------- HTTP có điều tiết ----------
+    async def _post(self, limiter, url: str, data: dict, files: dict):
+        """
+        POST qua limiter; trả response cuối (có thể vẫn là 429/503 khi hết lượt thử).
+        Chỉ thử lại 429/503 (server từ chối, chưa nhận ảnh); lỗi kết nối do adapter của session thử lại.
+        Timeout đọc / 5xx khác KHÔNG thử lại: server có thể đã lưu ảnh → upload trùng.
+        """
+        up = self.uploader
+        for attempt in range(1, self.max_attempts + 1):
+            await limiter.bucket.acquire()
+            await limiter.aimd.acquire()
+            outcome = "error"
+            try:
+                r = await self._call(self.session.post, url, data=data, files=files, timeout=up.timeout)
+                if r.status_code not in THROTTLE_STATUSES or attempt == self.max_attempts:
+                    outcome = "ok" if r.status_code < 400 else "error"
+                    return r
+                outcome = "throttled"
+                wait = parse_retry_after(r.headers.get("Retry-After"))
+                limiter.throttled(wait)
+                up._v(f"HTTP {r.status_code} → thử lại (lần {attempt}, cửa sổ {limiter.aimd.window})")
+            finally:
+                limiter.aimd.release(outcome)
+            # không có Retry-After: backoff lũy thừa + full jitter
+            await asyncio.sleep(wait if wait is not None else random.uniform(0, up.backoff_factor * 2 ** (attempt - 1)))
+
+    async def _imgbb(self, data_bytes: bytes, out_name: str, mime: str):
+        """ImgBB qua pool key: key ít tải nhất; key bị loại (xác thực/quota) → thử key khác."""
+        tried, last_err = [], None
+        while True:
+            key = self.keys.pick(exclude=tried)
+            if key is None:
+                raise RuntimeError(last_err or "No usable ImgBB key")
+            tried.append(key)
+            data, files = self.uploader._imgbb_form(data_bytes, out_name, mime, key)
+            try:
+                r = await self._post(limiter_for("imgbb", key), IMGBB_URL, data, files)
+            except Exception as e:
+                self.keys.report(key, None, str(e))
+                raise
+            if self.keys.report(key, r.status_code, r.text, parse_retry_after(r.headers.get("Retry-After"))) in ("auth", "quota"):
+                last_err = f"ImgBB key rejected (status {r.status_code}): {r.text[:200]}"
+                continue
+            return self.uploader._imgbb_result(r)
+
+    async def _s3_put(self, data_bytes: bytes, out_name: str, mime: str) -> str:
+        """PUT S3 song song trên executor (boto3 client dùng chung, tự retry); AIMD giới hạn số PUT cùng lúc."""
+        await self.s3.aimd.acquire()
+        outcome = "error"
+        try:
+            url = await self._call(self.uploader.s3.put, data_bytes, out_name, mime)
+            outcome = "ok"
+            return url
+        finally:
+            self.s3.aimd.release(outcome)
+
+    def window(self) -> int:
+        """Số upload chạy cùng lúc: S3 → cửa sổ S3; ImgBB → tổng cửa sổ AIMD các key còn dùng; còn lại → Catbox."""
+        if self.uploader.provider == "s3":
+            return self.s3.aimd.window
+        return self.keys.window() if self.keys.active_keys() else self.catbox.aimd.window
+
+    async def upload_encoded(self, data_bytes: bytes, out_name: str, mime: str, info: Optional[dict] = None) -> UploadResult:
+        up = self.uploader
+        info = info or {}
+        up._log_encode(data_bytes, out_name, mime, info)
+
+        if up.provider == "s3":
+            try:
+                url = await self._s3_put(data_bytes, out_name, mime)
+                return UploadResult(ok=True, url=url, provider="s3", encode=info)
+            except Exception as e:
+                up._v("S3 upload failed → fallback ImgBB/Catbox:", e)
+
+        if up.api_key and requests:
+            try:
+                url, status = await self._imgbb(data_bytes, out_name, mime)
+                return UploadResult(ok=True, url=url, provider="imgbb", status_code=status, encode=info)
+            except Exception as e:
+                up._v("ImgBB upload failed → fallback Catbox:", e)
+
+        if requests:
+            try:
+                data, files = up._catbox_form(data_bytes, out_name, mime)
+                url = up._catbox_result(await self._post(self.catbox, CATBOX_URL, data, files))
+                return UploadResult(ok=True, url=url, provider="catbox", status_code=200, encode=info)
+            except Exception as e:
+                up._v("Catbox upload failed → save local:", e)
+
+        return await self._call(up._local_result, data_bytes, out_name, info)
+
+    # ---------- tiêu thụ hàng đợi của UploadPool ----------
+    async def drain(self, q: "queue.Queue", handle: Callable[[object], Awaitable[None]], sentinel=None) -> None:
+        """
+        Lấy item từ q (tới sentinel) và chạy handle(item) đồng thời, số task tối đa = cửa sổ AIMD
+        hiện tại → không rút hàng đợi nhanh hơn tốc độ upload (giữ backpressure cho tầng nén).
+        """
+        tasks = set()
+        try:
+            while True:
+                while len(tasks) >= self.window():
+                    _done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                item = await self._call(q.get)
+                if item is sentinel:
+                    break
+                tasks.add(asyncio.ensure_future(handle(item)))
+        finally:
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def run_engine(uploader: ImageUploader, q: "queue.Queue", store: Callable[[str, UploadResult], None], sentinel=None) -> None:
+    """Chạy engine trên event loop riêng (gọi từ luồng upload của UploadPool) cho tới sentinel."""
+    engine = AsyncUploadEngine(uploader)
+
+    async def handle(item):
+        path, encoded = item
+        try:
+            if isinstance(encoded, BaseException) or encoded is None:
+                # nén trong process lỗi / chưa nén → đường tuần tự cũ (có fallback local)
+                res = await engine._call(uploader.upload_path, os.path.abspath(path))
+            else:
+                data, mime, name, info = encoded
+                res = await engine.upload_encoded(data, name, mime, info)
+        except Exception as e:
+            res = UploadResult(ok=False, url=None, error=str(e), provider="local")
+        store(path, res)
+
+    try:
+        asyncio.run(engine.drain(q, handle, sentinel))
+    finally:
+        engine.close()
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+Checkpoint theo từng bước của pipeline cho MỘT file đầu vào (parsed → enriched → uploaded → exported).
+Mỗi bước xong ghi 1 bản ghi: input (hash file nguồn / mapping / tuỳ chọn xuất) + hash output của
+bước trước ("prev") + đường dẫn và hash output của chính nó.
+run_pipeline(resume=True): bỏ qua các bước đầu còn hợp lệ — chuỗi input khớp với hiện tại VÀ output
+của mọi bước đã xong vẫn còn nguyên (bước sau còn đọc lại) — rồi chạy tiếp từ bước đầu tiên chưa xong.
+(enrich ghi đè questionsTF.json tại chỗ → output của "parsed" không còn, nhưng "enriched" vẫn hợp lệ:
+output bị bước sau ghi đè cùng đường dẫn thì không kiểm.)
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from appword.core.serialization import dumps, read_file
+
+CHECKPOINT_VERSION = 1
+CHECKPOINT_FILE = ".checkpoints.json"
+
+
+# ========= Hash =========
+def hash_file(path) -> Optional[str]:
+    try:
+        h = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        return h.hexdigest()
+    except OSError:
+        return None
+
+
+def hash_value(obj) -> str:
+    blob = json.dumps(obj, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.blake2b(blob.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def fingerprint_mapping_dir(path: Optional[str]) -> Optional[str]:
+    """
+    Hash nội dung đúng các file mapping mà load_mapping_dir đọc (*.xlsx lẫn *.xls)
+    — None nếu không có thư mục.
+    """
+    if not path or not Path(path).is_dir():
+        return None
+    from appword.adapters.excel_mapping import mapping_files
+
+    return hash_value([[p.name, hash_file(p)] for p in mapping_files(Path(path))])
+
+
+# ========= Checkpoint 1 file =========
+def _intact(rec: dict, later: List[dict]) -> bool:
+    """Output của bước còn nguyên — hoặc đã bị một bước sau ghi đè tại chỗ (cùng đường dẫn)."""
+    if any(r.get("output") == rec.get("output") for r in later):
+        return True
+    return hash_file(rec.get("output")) == rec.get("output_hash")
+
+
+class StageCheckpoints:
+    """
+    plan: [(stage, input tĩnh của bước)] theo thứ tự chạy. Dùng:
+        ck = StageCheckpoints(path, plan); ck.resume()
+        if ck.skip("parsed"): out = ck.output("parsed") else: ...; ck.mark("parsed", out)
+    """
+
+    def __init__(self, path, plan: Sequence[Tuple[str, dict]]):
+        self.path = Path(path)
+        self.plan: List[Tuple[str, dict]] = [(s, {**inp, "v": CHECKPOINT_VERSION}) for s, inp in plan]
+        self._done = 0
+        self._prev: Optional[str] = None
+        try:
+            self._records: Dict[str, dict] = read_file(self.path).get("stages") or {}
+        except Exception:
+            self._records = {}
+
+    def resume(self) -> int:
+        """Số bước đầu còn hợp lệ (0 = chạy lại từ đầu)."""
+        prev, valid = None, []
+        for stage, inputs in self.plan:
+            rec = self._records.get(stage)
+            if not rec or rec.get("inputs") != {**inputs, "prev": prev}:
+                break
+            valid.append(rec)
+            prev = rec.get("output_hash")
+        # output mọi bước đã xong phải còn nguyên (VD *.uploaded.json mất/bị sửa → chạy lại từ bước đó);
+        # cắt tại bước hỏng đầu tiên rồi kiểm lại (bước trước có thể chỉ được "che" bởi bước vừa cắt)
+        while True:
+            bad = next((i for i, rec in enumerate(valid) if not _intact(rec, valid[i + 1:])), None)
+            if bad is None:
+                break
+            valid = valid[:bad]
+        self._done = len(valid)
+        self._prev = valid[-1]["output_hash"] if valid else None
+        return self._done
+
+    @property
+    def completed(self) -> Optional[str]:
+        return self.plan[self._done - 1][0] if self._done else None
+
+    def skip(self, stage: str) -> bool:
+        return any(s == stage for s, _ in self.plan[: self._done])
+
+    def output(self, stage: str) -> Optional[Path]:
+        rec = self._records.get(stage)
+        return Path(rec["output"]) if rec and rec.get("output") else None
+
+    def mark(self, stage: str, output) -> None:
+        """Ghi nhận bước vừa xong (ghi file ngay — crash ở bước sau vẫn giữ được)."""
+        inputs = dict(self.plan)[stage]
+        out_hash = hash_file(output)
+        self._records[stage] = {
+            "inputs": {**inputs, "prev": self._prev},
+            "output": str(output),
+            "output_hash": out_hash,
+            "ts": round(time.time(), 3),
+        }
+        self._prev = out_hash
+        self._save()
+
+    def _save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".part")
+        tmp.write_bytes(dumps({"version": CHECKPOINT_VERSION, "stages": self._records}, "json-compact"))
+        os.replace(tmp, self.path)
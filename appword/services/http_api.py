@@ -0,0 +1,507 @@
+# -*- coding: utf-8 -*-
+"""
+API HTTP cho script tự động (không cần mở giao diện Streamlit), chỉ dùng thư viện chuẩn
+(http.server, đa luồng). Dùng chung JobManager (cùng pool worker, cache kết quả, nhật ký upload)
+với web app: chạy riêng bằng `python -m appword.cli serve`, hoặc cùng process với web app khi đặt
+APPWORD_API_PORT (web_app.py tự khởi động).
+
+  POST /jobs                    multipart/form-data (Content-Length hoặc Transfer-Encoding: chunked)
+                                  files=@a.docx (nhiều lần), mapping=@ID.xlsx | mapping_name=ID10.xlsx,
+                                  api_key=… (tuỳ chọn), export_options={"image_mode": "embed"} (JSON)
+                                → 202 {"job_id", "status_url", "events_url", "result_url"}
+  GET  /jobs                    các job của người gọi
+  GET  /jobs/<id>               trạng thái (như status.json)
+  GET  /jobs/<id>/events        server-sent events: "progress" mỗi khi trạng thái đổi, "end" khi xong
+  GET  /jobs/<id>/result        result.zip (stream theo khúc)
+  GET  /jobs/<id>/files/<tên>   zip của một file đã xong (tên trong "ready" của trạng thái; có ngay
+                                khi job còn chạy)
+  POST /jobs/<id>/retry         chạy tiếp job lỗi / bị ngắt (resume)
+  GET  /healthz
+
+- Body multipart được đọc theo khúc và ghi thẳng xuống vùng đệm đĩa (upload_spool) → RAM không
+  tăng theo kích thước file; job hard-link file từ vùng đệm, không chép lại.
+- Xác thực: APPWORD_API_TOKEN="t1,t2" → bắt buộc "Authorization: Bearer <token>", mỗi token chỉ
+  thấy job của mình. Không đặt → chỉ được nghe trên loopback (127.0.0.1 / localhost); chạy cùng
+  web app thì luôn phải có token.
+- export_options chỉ nhận image_mode, embed_max_bytes, max_shard_bytes, max_shard_questions.
+- APPWORD_API_MAX_MB: giới hạn kích thước body (mặc định 512).
+"""
+from __future__ import annotations
+
+import hashlib
+import ipaddress
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+
+from appword.core.exporter import IMAGE_MODES
+from appword.services.jobs import ACTIVE_STATES, JobManager, job_manager
+from appword.services.upload_spool import UploadSpool
+
+_CHUNK = 256 << 10
+_HEADER_LIMIT = 16 << 10
+_SSE_POLL = 0.5
+_SSE_PING = 15.0
+# export_options client được đặt: tên → (kiểu, cho phép null)
+_EXPORT_OPTIONS = {
+    "image_mode": (str, False),
+    "embed_max_bytes": (int, False),
+    "max_shard_bytes": (int, True),
+    "max_shard_questions": (int, True),
+}
+
+_PARAM_RE = re.compile(r';\s*([\w*-]+)\s*=\s*(?:"([^"]*)"|([^;]*))')
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, ""))
+    except ValueError:
+        return default
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+# ========= Body / multipart (đọc theo khúc) =========
+class _BodyReader:
+    """read(n) trên body request: Content-Length hoặc Transfer-Encoding: chunked; chặn vượt giới hạn."""
+
+    def __init__(self, rfile, length: Optional[int], chunked: bool, limit: int):
+        if not chunked and length is None:
+            raise ApiError(HTTPStatus.LENGTH_REQUIRED, "Thiếu Content-Length")
+        if length is not None and length > limit:
+            raise ApiError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Body quá lớn")
+        self.rfile = rfile
+        self.left = length
+        self.chunked = chunked
+        self.limit = limit
+        self.total = 0
+        self._chunk_left = 0
+        self._done = False
+
+    def read(self, n: int) -> bytes:
+        if self._done:
+            return b""
+        data = self._read_chunked(n) if self.chunked else self._read_plain(n)
+        self.total += len(data)
+        if self.total > self.limit:
+            raise ApiError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Body quá lớn")
+        return data
+
+    def _read_plain(self, n: int) -> bytes:
+        if not self.left:
+            self._done = True
+            return b""
+        data = self.rfile.read(min(n, self.left))
+        if not data:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Body bị cắt")
+        self.left -= len(data)
+        return data
+
+    def _read_chunked(self, n: int) -> bytes:
+        if not self._chunk_left:
+            line = self.rfile.readline(1024)
+            try:
+                self._chunk_left = int(line.split(b";", 1)[0].strip(), 16)
+            except ValueError:
+                raise ApiError(HTTPStatus.BAD_REQUEST, "Chunk lỗi")
+            if self._chunk_left == 0:
+                while self.rfile.readline(1024) not in (b"\r\n", b"\n", b""):
+                    pass  # trailer
+                self._done = True
+                return b""
+        data = self.rfile.read(min(n, self._chunk_left))
+        if not data:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Body bị cắt")
+        self._chunk_left -= len(data)
+        if not self._chunk_left:
+            self.rfile.readline(1024)  # CRLF sau mỗi chunk
+        return data
+
+
+def _header_params(value: str) -> Dict[str, str]:
+    """'form-data; name="files"; filename="a.docx"' → {"name": "files", "filename": "a.docx"}."""
+    return {k.lower(): (q or v).strip() for k, q, v in _PARAM_RE.findall(value)}
+
+
+def parse_multipart(read: Callable[[int], bytes], boundary: bytes, open_part: Callable[[str, Optional[str]], object]) -> None:
+    """
+    Tách body multipart/form-data theo khúc, không giữ cả body trong RAM.
+    open_part(tên field, tên file | None) → đối tượng có write(bytes) / close() (hoặc None để bỏ qua).
+    """
+    delim = b"\r\n--" + boundary
+    buf, eof = b"\r\n", False
+
+    def fill() -> None:
+        nonlocal buf, eof
+        chunk = read(_CHUNK)
+        eof = not chunk
+        buf += chunk
+
+    while True:  # phần mở đầu (preamble) trước boundary đầu tiên
+        i = buf.find(delim)
+        if i >= 0:
+            buf = buf[i + len(delim):]
+            break
+        if eof:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "multipart: không thấy boundary")
+        buf = buf[-len(delim):]
+        fill()
+    while True:
+        while len(buf) < 2 and not eof:
+            fill()
+        if buf[:2] == b"--":
+            return
+        while b"\r\n\r\n" not in buf:
+            if eof or len(buf) > _HEADER_LIMIT:
+                raise ApiError(HTTPStatus.BAD_REQUEST, "multipart: header lỗi")
+            fill()
+        head, buf = buf.split(b"\r\n\r\n", 1)
+        disposition = ""
+        for line in head.decode("utf-8", "replace").split("\r\n"):
+            k, _, v = line.partition(":")
+            if k.strip().lower() == "content-disposition":
+                disposition = v.strip()
+        params = _header_params(disposition)
+        sink = open_part(params.get("name", ""), params.get("filename"))
+        try:
+            while True:
+                i = buf.find(delim)
+                if i >= 0:
+                    if sink is not None:
+                        sink.write(buf[:i])
+                    buf = buf[i + len(delim):]
+                    break
+                keep = len(delim) - 1
+                if len(buf) > keep:
+                    if sink is not None:
+                        sink.write(buf[:-keep])
+                    buf = buf[-keep:]
+                if eof:
+                    raise ApiError(HTTPStatus.BAD_REQUEST, "multipart: body bị cắt")
+                fill()
+        except BaseException:
+            if sink is not None and hasattr(sink, "abort"):
+                sink.abort()
+            raise
+        if sink is not None:
+            sink.close()
+
+
+class _Field:
+    """Field text nhỏ trong multipart (api_key, mapping_name…)."""
+
+    def __init__(self, store: Dict[str, str], name: str):
+        self.store, self.name, self.parts, self.size = store, name, [], 0
+
+    def write(self, data: bytes) -> None:
+        self.size += len(data)
+        if self.size > _HEADER_LIMIT:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"Field quá dài: {self.name}")
+        self.parts.append(data)
+
+    def close(self) -> None:
+        self.store[self.name] = b"".join(self.parts).decode("utf-8", "replace").strip()
+
+
+# ========= Handler =========
+class ApiHandler(BaseHTTPRequestHandler):
+    server_version = "appword-api/1"
+    jobs: JobManager = None  # gán bởi make_server
+    mapping_dir: Optional[Path] = None
+    tokens: Tuple[str, ...] = ()
+    max_bytes = 512 << 20
+
+    def log_message(self, fmt, *args):  # gọn: 1 dòng / request
+        print(f"[API] {self.address_string()} {fmt % args}")
+
+    # ---------- tiện ích ----------
+    def _owner(self) -> str:
+        if not self.tokens:
+            return "api"
+        auth = self.headers.get("Authorization", "")
+        token = auth[7:].strip() if auth.lower().startswith("bearer ") else ""
+        if token not in self.tokens:
+            raise ApiError(HTTPStatus.UNAUTHORIZED, "Sai hoặc thiếu token")
+        return "api-" + hashlib.sha1(token.encode("utf-8")).hexdigest()[:12]
+
+    def _job(self, job_id: str, owner: str) -> dict:
+        try:
+            info = self.jobs.job(job_id)
+        except ValueError:
+            info = {}
+        if not info or info.get("owner") != owner:
+            raise ApiError(HTTPStatus.NOT_FOUND, "Không có job này")
+        return info
+
+    def _json(self, obj, status: int = HTTPStatus.OK) -> None:
+        body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _links(self, job_id: str) -> dict:
+        base = f"/jobs/{job_id}"
+        return {"job_id": job_id, "status_url": base, "events_url": f"{base}/events", "result_url": f"{base}/result"}
+
+    def _dispatch(self, routes) -> None:
+        path = [unquote(p) for p in urlsplit(self.path).path.strip("/").split("/") if p]
+        try:
+            for pattern, fn in routes:
+                if len(pattern) == len(path) and all(p == "*" or p == s for p, s in zip(pattern, path)):
+                    fn(*[s for p, s in zip(pattern, path) if p == "*"])
+                    return
+            raise ApiError(HTTPStatus.NOT_FOUND, "Không có endpoint này")
+        except ApiError as e:
+            self.close_connection = True
+            self._json({"error": str(e)}, e.status)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        except Exception as e:
+            print(f"[API] Lỗi xử lý {self.command} {self.path} :: {e!r}")
+            self.close_connection = True
+            try:
+                self._json({"error": f"Lỗi máy chủ: {e}"}, HTTPStatus.INTERNAL_SERVER_ERROR)
+            except OSError:
+                pass
+
+    def do_GET(self):
+        self._dispatch([
+            (["healthz"], lambda: self._json({"ok": True})),
+            (["jobs"], self._list_jobs),
+            (["jobs", "*"], self._get_job),
+            (["jobs", "*", "events"], self._events),
+            (["jobs", "*", "result"], self._result),
+            (["jobs", "*", "files", "*"], self._file_result),
+        ])
+
+    def do_POST(self):
+        self._dispatch([
+            (["jobs"], self._create_job),
+            (["jobs", "*", "retry"], self._retry),
+        ])
+
+    # ---------- endpoint ----------
+    def _list_jobs(self) -> None:
+        self._json([
+            {**self._links(j["id"]), "files": j.get("files"), "created": j.get("created"), "status": j.get("status")}
+            for j in self.jobs.jobs_for(self._owner())
+        ])
+
+    def _get_job(self, job_id: str) -> None:
+        self._job(job_id, self._owner())
+        self._json({**self._links(job_id), **self.jobs.status(job_id)})
+
+    def _retry(self, job_id: str) -> None:
+        self._job(job_id, self._owner())
+        self.jobs.retry(job_id, self.headers.get("X-Imgbb-Key") or None)
+        self._json(self._links(job_id), HTTPStatus.ACCEPTED)
+
+    def _create_job(self) -> None:
+        owner = self._owner()
+        ctype = self.headers.get("Content-Type", "")
+        m = re.search(r'boundary="?([^";]+)"?', ctype)
+        if not ctype.lower().startswith("multipart/form-data") or not m:
+            raise ApiError(HTTPStatus.UNSUPPORTED_MEDIA_TYPE, "Cần multipart/form-data")
+        try:
+            length = int(self.headers["Content-Length"]) if self.headers.get("Content-Length") else None
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Content-Length không hợp lệ")
+        if length is not None and length < 0:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Content-Length không hợp lệ")
+        body = _BodyReader(
+            self.rfile, length,
+            "chunked" in self.headers.get("Transfer-Encoding", "").lower(), self.max_bytes,
+        )
+        spool = UploadSpool()
+        try:
+            fields: Dict[str, str] = {}
+            docs: List[str] = []
+            maps: List[str] = []
+
+            def open_part(name: str, filename: Optional[str]):
+                if filename is None:
+                    return _Field(fields, name)
+                if name == "files" and filename.lower().endswith(".docx"):
+                    docs.append(os.path.basename(filename))
+                elif name == "mapping" and filename.lower().endswith((".xlsx", ".xls")):
+                    maps.append(os.path.basename(filename))
+                else:
+                    return None
+                return spool.writer(filename)
+
+            parse_multipart(body.read, m.group(1).encode("latin-1"), open_part)
+            if not docs:
+                raise ApiError(HTTPStatus.BAD_REQUEST, "Cần ít nhất một file .docx (field 'files')")
+            blobs = {name: path for name, path, _ in spool.files()}
+            mapping = [(n, blobs[n]) for n in maps] + self._named_mapping(fields.get("mapping_name"))
+            job_id = self.jobs.submit(
+                owner, [(n, blobs[n]) for n in docs], mapping, fields.get("api_key") or None,
+                os.path.join(tempfile.gettempdir(), "appword_journal", f"{owner}.jsonl"),
+                **self._options(fields.get("export_options")),
+            )
+        finally:
+            spool.destroy()  # job đã hard-link / chép file sang thư mục của nó
+        self._json(self._links(job_id), HTTPStatus.ACCEPTED)
+
+    def _named_mapping(self, name: Optional[str]) -> List[Path]:
+        if not name:
+            return []
+        p = (self.mapping_dir or Path("ID")) / os.path.basename(name)
+        if not p.is_file():
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"Không có file mapping: {name}")
+        return [p]
+
+    @staticmethod
+    def _options(raw: Optional[str]) -> dict:
+        if not raw:
+            return {}
+        try:
+            opts = json.loads(raw)
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "export_options phải là JSON")
+        if not isinstance(opts, dict):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "export_options phải là object JSON")
+        for key, value in opts.items():
+            if key not in _EXPORT_OPTIONS:
+                raise ApiError(
+                    HTTPStatus.BAD_REQUEST,
+                    f"export_options không nhận {key!r} (chỉ {', '.join(_EXPORT_OPTIONS)})",
+                )
+            kind, nullable = _EXPORT_OPTIONS[key]
+            if value is None and nullable:
+                continue
+            # bool là int trong Python → loại riêng
+            if not isinstance(value, kind) or isinstance(value, bool):
+                raise ApiError(HTTPStatus.BAD_REQUEST, f"export_options.{key}: sai kiểu")
+            if kind is int and value < 0:
+                raise ApiError(HTTPStatus.BAD_REQUEST, f"export_options.{key}: phải >= 0")
+        if opts.get("image_mode", IMAGE_MODES[0]) not in IMAGE_MODES:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"export_options.image_mode: chọn {', '.join(IMAGE_MODES)}")
+        return {"export_options": opts}
+
+    def _events(self, job_id: str) -> None:
+        self._job(job_id, self._owner())
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("X-Accel-Buffering", "no")
+        self.end_headers()
+        self.close_connection = True
+        last, last_write = None, time.monotonic()
+        while True:
+            st = self.jobs.status(job_id)
+            if st.get("updated") != last:
+                last = st.get("updated")
+                self._sse("progress", st)
+                last_write = time.monotonic()
+            if st.get("state") not in ACTIVE_STATES:
+                self._sse("end", {**self._links(job_id), "state": st.get("state"), "error": st.get("error")})
+                return
+            if time.monotonic() - last_write > _SSE_PING:
+                self.wfile.write(b": ping\n\n")
+                self.wfile.flush()
+                last_write = time.monotonic()
+            time.sleep(_SSE_POLL)
+
+    def _sse(self, event: str, data: dict) -> None:
+        payload = json.dumps(data, ensure_ascii=False)
+        self.wfile.write(f"event: {event}\ndata: {payload}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+    def _result(self, job_id: str) -> None:
+        self._job(job_id, self._owner())
+        self._send_file(self.jobs.result_path(job_id), "ket_qua_moodle.zip")
+
+    def _file_result(self, job_id: str, name: str) -> None:
+        self._job(job_id, self._owner())
+        self._send_file(self.jobs.file_result_path(job_id, name), f"{os.path.basename(name)}.zip")
+
+    def _send_file(self, path: Optional[Path], download_name: str) -> None:
+        if path is None:
+            raise ApiError(HTTPStatus.CONFLICT, "Kết quả chưa sẵn sàng")
+        with open(path, "rb") as f:
+            self.send_response(HTTPStatus.OK)
+            self.send_header("Content-Type", "application/zip")
+            self.send_header("Content-Length", str(os.fstat(f.fileno()).st_size))
+            self.send_header("Content-Disposition", f'attachment; filename="{download_name}"')
+            self.end_headers()
+            shutil.copyfileobj(f, self.wfile, _CHUNK)
+
+
+# ========= Server =========
+def _is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False  # "" (mọi interface) hoặc tên máy
+
+
+def make_server(
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    jobs: Optional[JobManager] = None,
+    mapping_dir: Optional[str] = None,
+    require_token: bool = False,
+) -> ThreadingHTTPServer:
+    """
+    Server chưa chạy. Không có APPWORD_API_TOKEN → RuntimeError nếu require_token hoặc host không
+    phải loopback (API mở sẽ cho mọi máy trong mạng xếp job / tải kết quả).
+    """
+    tokens = tuple(t.strip() for t in (os.getenv("APPWORD_API_TOKEN") or "").split(",") if t.strip())
+    if not tokens and (require_token or not _is_loopback(host)):
+        raise RuntimeError(
+            f"API trên {host or '0.0.0.0'}:{port} cần APPWORD_API_TOKEN"
+            + ("" if require_token else " (không token chỉ nghe trên 127.0.0.1)")
+        )
+    handler = type("BoundApiHandler", (ApiHandler,), {
+        "jobs": jobs or job_manager(),
+        "mapping_dir": Path(mapping_dir) if mapping_dir else Path(os.getcwd()) / "ID",
+        "tokens": tokens,
+        "max_bytes": _env_int("APPWORD_API_MAX_MB", 512) << 20,
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def serve(host: str = "127.0.0.1", port: int = 8765, mapping_dir: Optional[str] = None) -> None:
+    """Chạy API (chặn tới khi Ctrl+C)."""
+    jobs = job_manager()
+    server = make_server(host, port, jobs, mapping_dir)
+    jobs.warm(mapping_dir or os.path.join(os.getcwd(), "ID"))
+    print(f"[API] http://{host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        jobs.shutdown(wait=False)
+
+
+def start_background(
+    jobs: Optional[JobManager] = None, host: str = "127.0.0.1", port: int = 8765, mapping_dir: Optional[str] = None,
+    require_token: bool = False,
+) -> ThreadingHTTPServer:
+    """Chạy API trên luồng nền trong process hiện tại (VD cùng process với web app → chung pool)."""
+    server = make_server(host, port, jobs, mapping_dir, require_token)
+    threading.Thread(target=server.serve_forever, name="appword-api", daemon=True).start()
+    return server
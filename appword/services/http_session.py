@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Session HTTP dùng chung cho upload ảnh (ImgBB / Catbox).
+- requests.Session + HTTPAdapter: giữ kết nối keep-alive (không bắt tay TCP/TLS lại mỗi ảnh),
+  số kết nối mỗi host = số luồng upload (APPWORD_UPLOAD_WORKERS) hoặc APPWORD_HTTP_POOL.
+- Retry ở tầng adapter CHỈ cho lỗi kết nối (request chưa tới server), backoff lũy thừa có jitter
+  ngẫu nhiên (tránh nhiều luồng cùng thử lại một lúc). Upload là POST: timeout đọc / 5xx xảy ra khi
+  server có thể đã lưu ảnh → thử lại sẽ upload trùng, nên không thử lại. 429/503 do người gọi thử lại
+  qua token bucket + AIMD (uploader._post, async_upload) để giữ đúng nhịp chung.
+- Session được dùng chung trong cả process: mọi file của một lần run_pipeline và mọi phiên
+  Streamlit (các script chạy trên luồng của cùng một process) dùng chung một pool kết nối.
+"""
+from __future__ import annotations
+
+import os
+import random
+import threading
+from typing import Dict, Optional, Tuple
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+except Exception:
+    requests = None
+    HTTPAdapter = Retry = None
+
+_BACKOFF_MAX = 30.0
+
+_sessions: Dict[Tuple[int, int, float], "requests.Session"] = {}
+_lock = threading.Lock()
+
+
+def default_pool_size() -> int:
+    """APPWORD_HTTP_POOL, không có thì bằng số luồng upload (APPWORD_UPLOAD_WORKERS, mặc định 4)."""
+    for name in ("APPWORD_HTTP_POOL", "APPWORD_UPLOAD_WORKERS"):
+        try:
+            return max(1, int(os.getenv(name, "")))
+        except ValueError:
+            pass
+    return 4
+
+
+if Retry is not None:
+    class _JitterRetry(Retry):
+        """Backoff 'full jitter': chờ ngẫu nhiên trong [0, backoff lũy thừa] (urllib3 1.x lẫn 2.x)."""
+
+        def get_backoff_time(self) -> float:
+            base = min(super().get_backoff_time(), _BACKOFF_MAX)
+            return random.uniform(0, base) if base > 0 else 0.0
+else:
+    _JitterRetry = None
+
+
+def make_session(pool_size: Optional[int] = None, max_retries: int = 4, backoff_factor: float = 1.8):
+    """Tạo Session mới (pool riêng). Thường dùng shared_session()."""
+    if requests is None:
+        raise RuntimeError("Missing 'requests'")
+    pool_size = int(pool_size or default_pool_size())
+    retry = _JitterRetry(
+        total=max_retries,
+        connect=max_retries,
+        read=0,  # đã gửi request → không thử lại (tránh upload trùng)
+        status=0,
+        other=0,
+        backoff_factor=backoff_factor,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+    s = requests.Session()
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    s.headers["Connection"] = "keep-alive"
+    return s
+
+
+def shared_session(pool_size: Optional[int] = None, max_retries: int = 4, backoff_factor: float = 1.8):
+    """Session dùng chung trong process, theo cấu hình (pool_size, max_retries, backoff_factor)."""
+    key = (int(pool_size or default_pool_size()), int(max_retries), float(backoff_factor))
+    s = _sessions.get(key)
+    if s is None:
+        with _lock:
+            s = _sessions.get(key)
+            if s is None:
+                s = _sessions[key] = make_session(*key)
+    return s
+
+
+def close_shared_sessions() -> None:
+    """Đóng mọi session dùng chung (VD khi tắt app); lần gọi shared_session() sau sẽ tạo lại."""
+    with _lock:
+        for s in _sessions.values():
+            s.close()
+        _sessions.clear()
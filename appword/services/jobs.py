@@ -0,0 +1,570 @@
+# -*- coding: utf-8 -*-
+"""
+Hàng đợi job chạy nền cho web app: run_pipeline chạy trên ProcessPoolExecutor, KHÔNG trong lượt
+chạy script Streamlit → refresh trình duyệt / rerun widget / nhiều người bấm cùng lúc không giết
+hay chặn việc đang chạy.
+
+Mỗi job là một thư mục <root>/<job_id>/:
+  job.json     thông tin job (chủ sở hữu, tên file, tuỳ chọn — KHÔNG lưu API key)
+  status.json  trạng thái (queued / running / done / error / interrupted) + tiến trình + log gần nhất,
+               worker ghi đè nguyên tử sau mỗi file → UI chỉ việc đọc (polling)
+  in/ map/ out/  input, mapping Excel, output của pipeline (có checkpoint + nhật ký upload)
+  result.zip   kết quả để tải, giữ tới khi hết hạn (APPWORD_JOB_TTL giây sau khi xong) — đóng gói dần
+               trong lúc chạy: mỗi file xong được ghi ngay vào zip (ảnh/Office: STORED, còn lại DEFLATED)
+  files/       <tên>.zip của từng file đã xong → tải sớm khi job vẫn đang chạy
+  cached/      các .docx đã lấy output từ cache kết quả (result_cache) — pipeline không chạy lại
+
+- Worker sống lâu, khởi động sẵn (warm): import sẵn python-docx / PIL / pandas / pipeline, nạp sẵn
+  mapping ID/*.xlsx, process pool nén + HTTP session + pool key dùng chung giữa các job → job đầu
+  tiên sau lúc rảnh không phải trả chi phí khởi động.
+- API key truyền qua biến môi trường của run_pipeline được trả lại như cũ sau mỗi job → không lọt
+  sang job của người khác.
+- App khởi động lại khi job đang chạy/xếp hàng → job thành "interrupted"; retry() chạy tiếp với
+  resume=True (checkpoint từng bước + nhật ký upload → chỉ làm phần còn thiếu).
+- Nhiều process dùng chung một thư mục job (VD web app + `appword.cli serve`): mỗi JobManager giữ
+  khoá file <root>/.manager-<id>.lock suốt đời process, status.json ghi "manager" = id đó → chỉ job
+  của process đã chết (khoá không còn ai giữ) mới thành "interrupted".
+- Worker chết giữa chừng (hết RAM với docx lớn, PIL/lxml segfault) → executor hỏng: các job trong đó
+  thành "error", executor được tạo mới cho job sau; không xếp được job → "error", không kẹt "queued".
+- Pool spawn nạp lại __main__ của process cha ở mỗi worker → submit trong _plain_main() (Streamlit).
+
+Cấu hình qua biến môi trường:
+  APPWORD_JOBS_DIR     thư mục chứa job (mặc định <tempdir>/appword_jobs)
+  APPWORD_JOB_WORKERS  số job chạy đồng thời (mặc định 2); mỗi worker có pool nén riêng
+                       với số lõi // APPWORD_JOB_WORKERS process (APPWORD_ENCODE_WORKERS ghi đè)
+  APPWORD_JOB_TTL      giữ kết quả bao lâu sau khi xong, giây (mặc định 21600 = 6 giờ)
+"""
+from __future__ import annotations
+
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import types
+import uuid
+import zipfile
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:  # POSIX
+    msvcrt = None
+
+from appword.core.serialization import dumps, read_file
+from appword.services.result_cache import shared_cache
+
+JOB_FILE = "job.json"
+STATUS_FILE = "status.json"
+RESULT_FILE = "result.zip"
+FILES_DIR = "files"
+ACTIVE_STATES = ("queued", "running")
+_LOG_LINES = 20
+_KEY_ENV = "IMGBB_API_KEY"
+_STORED_SUFFIXES = {".jpg", ".jpeg", ".png", ".gif", ".webp", ".zip", ".docx", ".xlsx", ".gz"}
+
+# input: (tên file, bytes), (tên file, đường dẫn — VD blob của upload_spool) hoặc đường dẫn file có sẵn
+Source = Union[str, Path, Tuple[str, Union[bytes, str, Path]]]
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, ""))
+    except ValueError:
+        return default
+
+
+# ========= Trạng thái (dùng chung process chính & worker) =========
+def _write(path: Path, obj: dict) -> None:
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.part")
+    tmp.write_bytes(dumps(obj, "json-compact"))
+    os.replace(tmp, path)
+
+
+def _read(path: Path) -> dict:
+    try:
+        return read_file(path)
+    except Exception:
+        return {}
+
+
+def _update_status(job_dir: Path, **fields) -> dict:
+    st = _read(job_dir / STATUS_FILE)
+    st.update(fields, updated=round(time.time(), 3))
+    _write(job_dir / STATUS_FILE, st)
+    return st
+
+
+def _iter_files(paths: Iterable[Path]) -> Iterable[Path]:
+    """File trong paths (thư mục → duyệt đệ quy), bỏ file nội bộ bắt đầu bằng "." (checkpoint, nhật ký)."""
+    for p in paths:
+        if p.is_dir():
+            for r, _, fs in os.walk(p):
+                for f in sorted(fs):
+                    if not f.startswith("."):
+                        yield Path(r) / f
+        elif p.is_file() and not p.name.startswith("."):
+            yield p
+
+
+def _compress_type(p: Path) -> int:
+    # ảnh / file Office đã nén sẵn → STORED (deflate lại chỉ tốn CPU, không nhỏ đi)
+    return zipfile.ZIP_STORED if p.suffix.lower() in _STORED_SUFFIXES else zipfile.ZIP_DEFLATED
+
+
+class _ResultZip:
+    """
+    Đóng gói dần: mỗi file input xong → ghi ngay output của nó vào result.zip (ghi thẳng xuống đĩa,
+    không giữ trong RAM) + một zip riêng files/<tên>.zip để tải sớm. close() thêm nốt các file còn
+    thiếu (VD JSON debug ghi nền) rồi đổi tên result.zip.part → result.zip.
+    """
+
+    def __init__(self, job_dir: Path):
+        self.job_dir = job_dir
+        self.out_dir = job_dir / "out"
+        self.z_path = job_dir / RESULT_FILE
+        self._tmp = self.z_path.with_name(self.z_path.name + ".part")
+        self._zip = zipfile.ZipFile(self._tmp, "w")
+        self._added = set()
+        self.ready: List[str] = []
+
+    def _write(self, z: zipfile.ZipFile, p: Path) -> str:
+        arc = p.relative_to(self.out_dir).as_posix()
+        z.write(p, arc, compress_type=_compress_type(p))
+        return arc
+
+    def add(self, name: str, paths: Iterable[Path]) -> None:
+        files = [p for p in _iter_files(paths) if p.relative_to(self.out_dir).as_posix() not in self._added]
+        if not files:
+            return
+        (self.job_dir / FILES_DIR).mkdir(exist_ok=True)
+        part = self.job_dir / FILES_DIR / f"{name}.zip.part"
+        with zipfile.ZipFile(part, "w") as single:
+            for p in files:
+                self._added.add(self._write(self._zip, p))
+                self._write(single, p)
+        os.replace(part, part.with_suffix(""))
+        self.ready.append(name)
+
+    def close(self) -> None:
+        for p in _iter_files([self.out_dir]):
+            if p.relative_to(self.out_dir).as_posix() not in self._added:
+                self._added.add(self._write(self._zip, p))
+        self._zip.close()
+        os.replace(self._tmp, self.z_path)
+
+    def abort(self) -> None:
+        self._zip.close()
+        self._tmp.unlink(missing_ok=True)
+
+
+def _pack_cached(packer: _ResultZip) -> None:
+    """Output lấy từ cache (các .docx trong cached/) → đóng gói ngay, tải sớm được."""
+    cached = packer.job_dir / "cached"
+    if cached.is_dir():
+        for p in sorted(cached.iterdir()):
+            packer.add(p.stem, [packer.out_dir / p.stem])
+
+
+def _mapping_arg(job_dir: Path) -> Optional[str]:
+    mapping = job_dir / "map"
+    return str(mapping) if any(mapping.iterdir()) else None
+
+
+def _restore_cached(job_dir: Path, options: dict) -> Tuple[int, Dict[Path, str]]:
+    """
+    Trả output đã cache cho các .docx trúng cache (chuyển file đó sang cached/ để pipeline bỏ qua).
+    Trả về (tổng số file đã lấy từ cache của job, {file còn phải chạy: key cache}).
+    """
+    cache = shared_cache()
+    if cache is None:
+        return 0, {}
+    keys = cache.keys_for(job_dir / "in", _mapping_arg(job_dir), options)
+    cached = job_dir / "cached"
+    for p, key in list(keys.items()):
+        if cache.get(key, job_dir / "out" / p.stem):
+            cached.mkdir(exist_ok=True)
+            os.replace(p, cached / p.name)
+            del keys[p]
+    return (len(list(cached.iterdir())) if cached.is_dir() else 0), keys
+
+
+def _store_cached(job_dir: Path, keys: Dict[Path, str]) -> None:
+    cache = shared_cache()
+    for p, key in keys.items():
+        cache.put(key, job_dir / "out" / p.stem)
+
+
+def _pending_inputs(job_dir: Path) -> bool:
+    return any(not p.name.startswith("~$") for p in (job_dir / "in").rglob("*.docx")) or any(
+        (job_dir / "in").rglob("*.json")
+    )
+
+
+# ========= Khoá của process quản lý (nhiều process chung một thư mục job) =========
+def _lock_path(root: Path, manager_id: str) -> Path:
+    return root / f".manager-{manager_id}.lock"
+
+
+def _try_lock(path: Path):
+    """Khoá độc quyền (không chờ) trên path → file đang mở (giữ để giữ khoá), hoặc None nếu process khác giữ."""
+    f = open(path, "a+b")
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        elif msvcrt is not None:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            raise OSError("Không có fcntl/msvcrt")
+        return f
+    except OSError:
+        f.close()
+        return None
+
+
+def _manager_alive(root: Path, manager_id: str) -> bool:
+    """Process quản lý manager_id còn sống (còn giữ khoá)? Khoá bỏ lại của process đã chết → xoá."""
+    path = _lock_path(root, manager_id)
+    if not path.exists():
+        return False
+    f = _try_lock(path)
+    if f is None:
+        return True
+    f.close()
+    try:
+        path.unlink()
+    except OSError:
+        pass
+    return False
+
+
+# ========= Worker (chạy trong process con) =========
+def _warm_worker(mapping_dir: Optional[str], job_workers: int = 1) -> None:
+    """Initializer của worker: import các thư viện nặng và nạp sẵn từng file mapping vào cache."""
+    os.environ.setdefault("APPWORD_SHARED_ENCODE_POOL", "1")
+    # mỗi worker job giữ pool nén riêng → chia lõi cho các worker (mặc định số lõi - 1 ở MỖI worker
+    # sẽ chạy gấp job_workers lần số lõi)
+    os.environ.setdefault("APPWORD_ENCODE_WORKERS", str(max(1, (os.cpu_count() or 2) // max(1, job_workers))))
+    import appword.services.pipeline  # noqa: F401  (python-docx, PIL, openpyxl, requests…)
+    from appword.adapters.excel_mapping import load_mapping_files
+
+    try:
+        import pandas  # noqa: F401  (mapping .xls cũ)
+    except ImportError:
+        pass
+    if mapping_dir and Path(mapping_dir).is_dir():
+        for p in sorted(Path(mapping_dir).glob("*.xlsx")):
+            if not p.name.startswith("~$"):
+                try:
+                    load_mapping_files([p])
+                except Exception:
+                    continue
+
+
+def _noop() -> None:
+    pass
+
+
+def _run_job(job_dir: str, api_key, journal: Optional[str], options: dict, resume: bool) -> None:
+    saved_key = os.environ.get(_KEY_ENV)
+    try:
+        _run_job_inner(job_dir, api_key, journal, options, resume)
+    finally:
+        # run_pipeline ghi key vào biến môi trường → trả lại cho job sau trên cùng worker
+        if saved_key is None:
+            os.environ.pop(_KEY_ENV, None)
+        else:
+            os.environ[_KEY_ENV] = saved_key
+
+
+def _run_job_inner(job_dir: str, api_key, journal: Optional[str], options: dict, resume: bool) -> None:
+    from appword.services.pipeline import run_pipeline
+
+    d = Path(job_dir)
+    log: List[str] = []
+    _update_status(d, state="running", started=round(time.time(), 3), pid=os.getpid(), error=None)
+
+    def on_prog(c: int, t: int, m: str) -> None:
+        log.append(m)
+        del log[:-_LOG_LINES]
+        _update_status(d, done=c, total=t, message=m, log=list(log))
+
+    packer = _ResultZip(d)
+
+    def on_file(src: Path, outputs: List[Path]) -> None:
+        packer.add(src.stem, outputs)
+        _update_status(d, ready=list(packer.ready))
+
+    try:
+        n, keys = _restore_cached(d, options)
+        if n:
+            _pack_cached(packer)
+            _update_status(d, cached=n, ready=list(packer.ready))
+            on_prog(0, 0, f"CACHE {n} file: dùng lại kết quả cũ")
+        if _pending_inputs(d):
+            n += run_pipeline(
+                str(d / "in"), str(d / "out"), api_key, on_prog, _mapping_arg(d),
+                upload_journal=journal, resume=resume, file_cb=on_file, **options,
+            )
+            _store_cached(d, keys)
+        packer.close()
+        _update_status(d, state="done", files=n, ready=list(packer.ready), finished=round(time.time(), 3))
+    except Exception as e:
+        packer.abort()
+        _update_status(d, state="error", error=str(e), finished=round(time.time(), 3))
+
+
+# ========= Quản lý job (process chính) =========
+_main_lock = threading.Lock()
+
+
+@contextmanager
+def _plain_main():
+    """
+    Process con (spawn) nạp lại module __main__ của process cha. Dưới Streamlit, __main__ là chính
+    script web_app.py → tạm thay bằng module rỗng trong lúc submit (lúc pool khởi động worker)
+    để worker không chạy lại cả trang.
+    """
+    with _main_lock:
+        main = sys.modules.get("__main__")
+        sys.modules["__main__"] = types.ModuleType("__main__")
+        try:
+            yield
+        finally:
+            sys.modules["__main__"] = main
+
+
+class JobManager:
+    def __init__(self, root: Optional[str] = None, max_workers: Optional[int] = None, ttl: Optional[int] = None):
+        self.root = Path(root or os.getenv("APPWORD_JOBS_DIR") or Path(tempfile.gettempdir()) / "appword_jobs")
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_workers = max(1, max_workers or _env_int("APPWORD_JOB_WORKERS", 2))
+        self.ttl = ttl if ttl is not None else _env_int("APPWORD_JOB_TTL", 6 * 3600)
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._futures: Dict[str, Future] = {}
+        self.warm_mapping: Optional[str] = None
+        self.manager_id = uuid.uuid4().hex
+        # giữ khoá tới khi process kết thúc (OS tự nhả khi process chết); không khoá được → None
+        self._manager_lock = (
+            _try_lock(_lock_path(self.root, self.manager_id)) if (fcntl or msvcrt) else None
+        )
+        if self._manager_lock is None:
+            self.manager_id = None
+        self._recover()
+        self.cleanup()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is not None and getattr(self._executor, "_broken", False):
+                # một worker chết → executor hỏng vĩnh viễn (mọi submit sau: BrokenProcessPool) → tạo mới
+                self._executor.shutdown(wait=False)
+                self._executor = None
+            if self._executor is None:
+                # spawn: không fork process chính đang có nhiều luồng (server Streamlit)
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_warm_worker,
+                    initargs=(self.warm_mapping, self.max_workers),
+                )
+            return self._executor
+
+    def warm(self, mapping_dir: Optional[str] = None) -> None:
+        """Khởi động sẵn đủ worker (import + nạp mapping trong mapping_dir) trước job đầu tiên."""
+        with self._lock:
+            if self._executor is None:
+                self.warm_mapping = mapping_dir
+        pool = self._pool()
+        with _plain_main():
+            for _ in range(self.max_workers):
+                try:
+                    pool.submit(_noop)
+                except BrokenProcessPool:
+                    break
+
+    def _dir(self, job_id: str) -> Path:
+        if not job_id.isalnum():
+            raise ValueError(f"Job ID không hợp lệ: {job_id!r}")
+        return self.root / job_id
+
+    def _recover(self) -> None:
+        """
+        Job còn queued/running từ lần chạy app trước → interrupted (chờ retry). Job của process khác
+        còn sống (web app và API chạy riêng trên cùng thư mục) thì để nguyên.
+        """
+        for d in self.root.iterdir():
+            st = _read(d / STATUS_FILE)
+            if st.get("state") not in ACTIVE_STATES:
+                continue
+            owner = st.get("manager")
+            if owner and _manager_alive(self.root, owner):
+                continue
+            _update_status(d, state="interrupted", error="Ứng dụng khởi động lại khi job đang chạy")
+
+    # ---------- tạo / chạy ----------
+    def submit(
+        self,
+        owner: str,
+        files: Iterable[Source],
+        mapping: Sequence[Source] = (),
+        api_key=None,
+        journal: Optional[str] = None,
+        **options,
+    ) -> str:
+        """Lưu input vào thư mục job rồi xếp hàng; trả job_id. options: tham số thêm cho run_pipeline."""
+        self.cleanup()
+        job_id = uuid.uuid4().hex
+        d = self._dir(job_id)
+        names = []
+        for sub, items in (("in", files), ("map", mapping)):
+            (d / sub).mkdir(parents=True)
+            for src in items:
+                name = self._save_input(d / sub, src)
+                if sub == "in":
+                    names.append(name)
+        (d / "out").mkdir()
+        info = {"id": job_id, "owner": owner, "files": names, "created": round(time.time(), 3),
+                "journal": journal, "options": options}
+        _write(d / JOB_FILE, info)
+        # Cả bộ file đã có trong cache → trả zip ngay, không cần xếp hàng
+        hits, _ = _restore_cached(d, options)
+        if hits and not _pending_inputs(d):
+            packer = _ResultZip(d)
+            _pack_cached(packer)
+            packer.close()
+            now = round(time.time(), 3)
+            _update_status(d, state="done", done=hits, total=hits, files=hits, cached=hits, ready=packer.ready,
+                           message=f"CACHE {hits} file: dùng lại kết quả cũ", log=[], finished=now)
+            return job_id
+        _update_status(d, state="queued", done=0, total=len(names), message="Đang chờ…", log=[],
+                       manager=self.manager_id)
+        self._start(job_id, api_key, journal, options, resume=False)
+        return job_id
+
+    @staticmethod
+    def _save_input(dest: Path, src: Source) -> str:
+        if isinstance(src, tuple) and isinstance(src[1], bytes):
+            name = os.path.basename(src[0])
+            (dest / name).write_bytes(src[1])
+            return name
+        name, path = (src if isinstance(src, tuple) else (str(src), src))
+        name = os.path.basename(name)
+        try:
+            os.link(path, dest / name)  # đọc tại chỗ, không chép (cùng ổ đĩa)
+        except OSError:
+            shutil.copy2(path, dest / name)  # giữ mtime → trúng cache mapping của worker
+        return name
+
+    def _start(self, job_id: str, api_key, journal, options: dict, resume: bool) -> None:
+        args = (str(self._dir(job_id)), api_key, journal, options, resume)
+        try:
+            with _plain_main():
+                try:
+                    fut = self._pool().submit(_run_job, *args)
+                except BrokenProcessPool:  # hỏng giữa lúc kiểm và lúc submit → thử lại với pool mới
+                    fut = self._pool().submit(_run_job, *args)
+        except Exception as e:
+            _update_status(self._dir(job_id), state="error", error=f"Không xếp được job: {e}",
+                           finished=round(time.time(), 3))
+            return
+        with self._lock:
+            self._futures[job_id] = fut
+        fut.add_done_callback(lambda f, j=job_id: self._finished(j, f))
+
+    def _finished(self, job_id: str, fut: Future) -> None:
+        with self._lock:
+            self._futures.pop(job_id, None)
+        err = fut.exception()
+        if err is not None:  # worker chết (BrokenProcessPool…) trước khi kịp ghi trạng thái
+            _update_status(self._dir(job_id), state="error", error=str(err) or type(err).__name__,
+                           finished=round(time.time(), 3))
+
+    def retry(self, job_id: str, api_key=None) -> None:
+        """Chạy lại job lỗi/bị ngắt với resume=True (bỏ qua các bước, ảnh đã xong)."""
+        d = self._dir(job_id)
+        info = _read(d / JOB_FILE)
+        if not info or self.status(job_id).get("state") in ACTIVE_STATES:
+            return
+        _update_status(d, state="queued", message="Chạy tiếp…", error=None, finished=None, manager=self.manager_id)
+        self._start(job_id, api_key, info.get("journal"), info.get("options") or {}, resume=True)
+
+    # ---------- tra cứu ----------
+    def status(self, job_id: str) -> dict:
+        d = self._dir(job_id)
+        st = _read(d / STATUS_FILE)
+        if st.get("state") == "done" and st.get("finished"):
+            st["expires"] = st["finished"] + self.ttl
+        return st
+
+    def job(self, job_id: str) -> dict:
+        return _read(self._dir(job_id) / JOB_FILE)
+
+    def jobs_for(self, owner: str) -> List[dict]:
+        """Các job của owner, mới nhất trước: [{**job, "status": {...}}]."""
+        out = []
+        for d in self.root.iterdir():
+            info = _read(d / JOB_FILE)
+            if info.get("owner") == owner:
+                out.append({**info, "status": self.status(info["id"])})
+        return sorted(out, key=lambda j: j.get("created") or 0, reverse=True)
+
+    def result_path(self, job_id: str) -> Optional[Path]:
+        p = self._dir(job_id) / RESULT_FILE
+        return p if p.is_file() else None
+
+    def file_result_path(self, job_id: str, name: str) -> Optional[Path]:
+        """Zip riêng của một file input đã xong (có ngay khi file đó xong, trước khi cả job xong)."""
+        p = self._dir(job_id) / FILES_DIR / f"{os.path.basename(name)}.zip"
+        return p if p.is_file() else None
+
+    # ---------- dọn dẹp ----------
+    def cleanup(self) -> int:
+        """Xoá job đã xong/lỗi quá TTL (và thư mục rác không có job.json). Trả số job đã xoá."""
+        now, removed = time.time(), 0
+        with self._lock:
+            running = set(self._futures)
+        for d in list(self.root.iterdir()):
+            if d.name.startswith(".manager-") and d.suffix == ".lock" and d.stem[9:] != self.manager_id:
+                _manager_alive(self.root, d.stem[9:])  # khoá bỏ lại của process đã thoát → xoá
+            if not d.is_dir() or d.name in running:
+                continue
+            st = _read(d / STATUS_FILE)
+            if st.get("state") in ACTIVE_STATES:
+                continue
+            ts = st.get("finished") or st.get("updated") or d.stat().st_mtime
+            if now - ts > self.ttl:
+                shutil.rmtree(d, ignore_errors=True)
+                removed += 1
+        return removed
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            ex, self._executor = self._executor, None
+        if ex is not None:
+            ex.shutdown(wait=wait)
+
+
+_shared: Optional[JobManager] = None
+_shared_lock = threading.Lock()
+
+
+def job_manager() -> JobManager:
+    """JobManager dùng chung trong process (mọi phiên Streamlit cùng một hàng đợi)."""
+    global _shared
+    if _shared is None:
+        with _shared_lock:
+            if _shared is None:
+                _shared = JobManager()
+    return _shared
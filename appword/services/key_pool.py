@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+Pool nhiều API key cho một provider (ImgBB).
+- Nguồn key: tham số / configs/settings.json / Streamlit secrets / biến môi trường; mỗi nguồn có thể
+  chứa nhiều key (list, hoặc chuỗi ngăn bởi dấu phẩy / chấm phẩy / xuống dòng) — xem parse_keys.
+- Mỗi key có limiter riêng (rate_limit.limiter_for) → thông lượng tổng tăng theo số key.
+- pick(): chọn key ít tải nhất (request đang chạy / cửa sổ AIMD, rồi thời gian chờ token).
+- report(): key trả lỗi xác thực → loại hẳn; hết quota → tạm loại (Retry-After hoặc
+  APPWORD_IMGBB_QUOTA_COOLDOWN giây, mặc định 3600).
+Pool dùng chung trong process theo (provider, danh sách key) → key đã bị loại không bị thử lại
+ở file/lần chạy sau.
+"""
+from __future__ import annotations
+
+import os
+import re
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from appword.services.rate_limit import limiter_for
+
+AUTH_STATUSES = (401, 403)
+_AUTH_MARKERS = ("invalid api", "api key", "invalid key", "unauthorized")
+_QUOTA_MARKERS = ("rate limit", "quota", "limit reached", "too many uploads")
+_SPLIT = re.compile(r"[\s,;]+")
+
+
+def parse_keys(value: Union[None, str, Iterable[str]]) -> List[str]:
+    """Chuỗi (ngăn bởi , ; hoặc khoảng trắng) / list → list key, bỏ rỗng và trùng, giữ thứ tự."""
+    if not value:
+        return []
+    parts = _SPLIT.split(value) if isinstance(value, str) else [str(v).strip() for v in value]
+    return list(dict.fromkeys(p.strip() for p in parts if p and p.strip()))
+
+
+def _quota_cooldown() -> float:
+    try:
+        return float(os.getenv("APPWORD_IMGBB_QUOTA_COOLDOWN", ""))
+    except ValueError:
+        return 3600.0
+
+
+class _KeyState:
+    __slots__ = ("key", "limiter", "in_flight", "ok", "failed", "ejected_until", "reason")
+
+    def __init__(self, provider: str, key: str):
+        self.key = key
+        self.limiter = limiter_for(provider, key)
+        self.in_flight = 0
+        self.ok = 0
+        self.failed = 0
+        self.ejected_until = 0.0  # float("inf") = loại hẳn
+        self.reason = ""
+
+
+class ApiKeyPool:
+    def __init__(self, provider: str, keys: Sequence[str]):
+        self.provider = provider
+        self._states = [_KeyState(provider, k) for k in parse_keys(keys)]
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def _active(self, now: float) -> List[_KeyState]:
+        return [s for s in self._states if s.ejected_until <= now]
+
+    def active_keys(self) -> List[str]:
+        return [s.key for s in self._active(time.monotonic())]
+
+    def window(self) -> int:
+        """Tổng cửa sổ đồng thời của các key còn dùng được (tối thiểu 1)."""
+        return max(1, sum(s.limiter.aimd.window for s in self._active(time.monotonic())))
+
+    def pick(self, exclude: Iterable[str] = ()) -> Optional[str]:
+        """Key ít tải nhất (đã +1 in_flight — luôn gọi report() sau đó); None nếu không còn key."""
+        exclude = set(exclude)
+        with self._lock:
+            cands = [s for s in self._active(time.monotonic()) if s.key not in exclude]
+            if not cands:
+                return None
+            best = min(cands, key=lambda s: (s.in_flight / s.limiter.aimd.window, s.limiter.bucket.delay(), s.failed))
+            best.in_flight += 1
+            return best.key
+
+    def report(self, key: str, status: Optional[int], text: str = "", retry_after: Optional[float] = None) -> str:
+        """
+        Ghi nhận kết quả 1 request của key (status None = lỗi mạng).
+        Trả "ok" | "auth" | "quota" | "error"; "auth"/"quota" → key đã bị loại, nên thử key khác.
+        """
+        outcome = classify_response(status, text)
+        with self._lock:
+            st = next((s for s in self._states if s.key == key), None)
+            if st is None:
+                return outcome
+            st.in_flight = max(0, st.in_flight - 1)
+            if outcome == "ok":
+                st.ok += 1
+                return outcome
+            st.failed += 1
+            newly = st.ejected_until <= time.monotonic()  # các request đang chạy của key cũng báo lỗi: chỉ log lần đầu
+            if outcome == "auth":
+                st.ejected_until, st.reason = float("inf"), f"auth (HTTP {status})"
+            elif outcome == "quota":
+                st.ejected_until = time.monotonic() + max(retry_after or 0.0, _quota_cooldown())
+                st.reason = f"quota (HTTP {status})"
+        if outcome in ("auth", "quota") and newly:
+            print(f"[key_pool] Loại key …{key[-4:]} ({self.provider}): {st.reason}; còn {len(self.active_keys())} key")
+        return outcome
+
+    def stats(self) -> List[dict]:
+        now = time.monotonic()
+        return [
+            {
+                "key": f"…{s.key[-4:]}", "ok": s.ok, "failed": s.failed, "in_flight": s.in_flight,
+                "window": s.limiter.aimd.window, "ejected": s.ejected_until > now, "reason": s.reason,
+            }
+            for s in self._states
+        ]
+
+
+def classify_response(status: Optional[int], text: str = "") -> str:
+    if status is None:
+        return "error"
+    if 200 <= status < 300:
+        return "ok"
+    low = (text or "").lower()
+    if status in (400, 403, 429) and any(m in low for m in _QUOTA_MARKERS):
+        return "quota"
+    if status in AUTH_STATUSES or (status == 400 and any(m in low for m in _AUTH_MARKERS)):
+        return "auth"
+    return "error"
+
+
+_pools: Dict[Tuple[str, Tuple[str, ...]], ApiKeyPool] = {}
+_lock = threading.Lock()
+
+
+def key_pool_for(provider: str, keys: Sequence[str]) -> ApiKeyPool:
+    """Pool dùng chung trong process theo (provider, danh sách key)."""
+    k = (provider.lower(), tuple(parse_keys(keys)))
+    pool = _pools.get(k)
+    if pool is None:
+        with _lock:
+            pool = _pools.get(k)
+            if pool is None:
+                pool = _pools[k] = ApiKeyPool(provider, k[1])
+    return pool
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+Chỉ mục hash cảm quan (dHash 64 bit) của ảnh đã upload → URL.
+Cùng một hình (scan lại, lưu lại, đổi định dạng) ở nhiều file đề có byte khác nhau nhưng dHash gần
+như trùng: ảnh mới cách một ảnh đã upload ≤ max_distance bit (Hamming), kích thước tương thích VÀ
+ảnh thu nhỏ 64×64 khớp từng điểm → dùng lại URL cũ, bỏ qua giải mã/nén/upload.
+
+- dHash: ảnh xám thu về 9×8, so sánh từng cặp điểm ảnh kề nhau theo hàng. JPEG dùng draft()
+  (giải mã ở tỉ lệ 1/8) → tính hash rẻ hơn nhiều so với giải mã đầy đủ để nén.
+- Tra cứu: chia hash thành 8 byte; hai hash cách nhau ≤ 7 bit chắc chắn trùng ít nhất 1 byte
+  (nguyên lý Dirichlet) → chỉ so với ứng viên cùng byte, không quét cả chỉ mục.
+- Xác nhận: dHash 9×8 không phân biệt được hình vẽ chỉ khác nhãn (ABC / XYZ) hay thêm một đường
+  mảnh → mỗi ứng viên còn phải khớp ảnh xám 64×64 lưu kèm: không điểm nào lệch quá
+  _PIXEL_TOLERANCE mức xám (lưu lại / nén JPEG / đổi cỡ chỉ lệch ~30; khác nhãn, thêm nét ≥ 50).
+- Hash quá ít thông tin (ảnh trống / dải màu đều: gần như toàn bit 0 hoặc 1) không được dedupe.
+- Kích thước tương thích: tỉ lệ khung hình lệch ≤ 5%, và ảnh mới không lớn hơn ảnh đã upload
+  quá 25% (không dùng bản nhỏ thay cho bản nét hơn).
+- Mỗi entry ghi provider đã upload (s3 / imgbb / catbox); lookup(providers=…) chỉ nhận entry của các
+  provider đó (VD provider="s3" không dùng lại URL ImgBB/Catbox — như nhật ký upload).
+- Lưu file (serialization, json-compact/msgpack) → dùng lại giữa các lần chạy, cả ngân hàng câu hỏi.
+
+Bật bằng APPWORD_PHASH_INDEX=<đường dẫn file> (hoặc "1" → ~/.appword/phash_index.json);
+ngưỡng: APPWORD_PHASH_DISTANCE (mặc định 3, tối đa 7). Mỗi entry giữ ảnh thu nhỏ ~4 KB.
+"""
+from __future__ import annotations
+
+import base64
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from appword.core.serialization import default_format, dumps, read_file
+
+try:
+    from PIL import Image
+except Exception:
+    Image = None
+
+_BANDS = 8
+_MAX_DISTANCE = _BANDS - 1
+_ASPECT_TOLERANCE = 0.05
+_MAX_UPSCALE = 1.25
+_SAVE_EVERY = 50
+_HASH_SIZE = 8
+_THUMB_SIZE = 64
+_PIXEL_TOLERANCE = 40
+_INDEX_VERSION = 3  # v2: thêm ảnh thu nhỏ (entry v1 không xác nhận được → bỏ); v3: thêm provider
+DEFAULT_DISTANCE = 3
+_MIN_BITS = 6  # hash gần như toàn 0/1 (ảnh trống, dải màu đều) → quá ít thông tin, không dedupe
+
+# entry: (hash, width, height, ảnh xám 64×64, url, provider — "" nếu không rõ)
+Entry = Tuple[int, int, int, bytes, str, str]
+
+
+# ========= Hash =========
+def _gray(im):
+    """Ảnh xám, nền trong suốt coi như trắng."""
+    if im.mode in ("RGBA", "LA", "PA") or (im.mode == "P" and "transparency" in im.info):
+        im = im.convert("RGBA")
+        bg = Image.new("RGBA", im.size, (255, 255, 255, 255))
+        bg.alpha_composite(im)
+        im = bg
+    return im.convert("L")
+
+
+def dhash_image(im) -> int:
+    """dHash 64 bit của ảnh PIL (nền trong suốt coi như trắng)."""
+    g = _gray(im).resize((_HASH_SIZE + 1, _HASH_SIZE), Image.BILINEAR)
+    px = list(g.getdata())
+    bits = 0
+    for row in range(_HASH_SIZE):
+        base = row * (_HASH_SIZE + 1)
+        for col in range(_HASH_SIZE):
+            bits = (bits << 1) | (px[base + col] > px[base + col + 1])
+    return bits
+
+
+def thumbnail_image(im) -> bytes:
+    """Ảnh xám 64×64 (trung bình khối) để xác nhận ứng viên trùng dHash."""
+    return _gray(im).resize((_THUMB_SIZE, _THUMB_SIZE), Image.BOX).tobytes()
+
+
+def dhash_file(path: str) -> Tuple[int, int, int, bytes]:
+    """(hash, width, height, ảnh thu nhỏ) — width/height là kích thước GỐC của file."""
+    if Image is None:
+        raise RuntimeError("Missing 'Pillow'")
+    with Image.open(path) as im:
+        size = im.size
+        if im.format == "JPEG":
+            im.draft("L", (4 * _THUMB_SIZE, 4 * _THUMB_SIZE))  # giải mã ở tỉ lệ nhỏ (DCT scaling), vẫn ≥ 256×256
+        im.load()
+        return dhash_image(im), size[0], size[1], thumbnail_image(im)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def informative(h: int) -> bool:
+    ones = bin(h).count("1")
+    return _MIN_BITS <= ones <= _HASH_SIZE * _HASH_SIZE - _MIN_BITS
+
+
+def same_picture(a: bytes, b: bytes) -> bool:
+    """Hai ảnh thu nhỏ khớp: không điểm nào lệch quá _PIXEL_TOLERANCE mức xám."""
+    return len(a) == len(b) and all(abs(x - y) <= _PIXEL_TOLERANCE for x, y in zip(a, b))
+
+
+def _compatible(w: int, h: int, ew: int, eh: int) -> bool:
+    if min(w, h, ew, eh) <= 0:
+        return False
+    if abs((w / h) / (ew / eh) - 1.0) > _ASPECT_TOLERANCE:
+        return False
+    return w <= ew * _MAX_UPSCALE and h <= eh * _MAX_UPSCALE
+
+
+# ========= Chỉ mục =========
+class PerceptualIndex:
+    def __init__(self, path: Optional[str] = None, max_distance: int = DEFAULT_DISTANCE):
+        self.path = Path(path) if path else None
+        self.max_distance = max(0, min(int(max_distance), _MAX_DISTANCE))
+        self._entries: List[Entry] = []
+        self._bands: List[Dict[int, List[int]]] = [{} for _ in range(_BANDS)]
+        self._urls = set()
+        self._lock = threading.Lock()
+        self._dirty = 0
+        self.hits = 0
+        if self.path is not None:
+            try:
+                raw = read_file(self.path)
+                if raw.get("version") in (2, _INDEX_VERSION):
+                    for h, w, hh, thumb, url, *provider in raw.get("entries") or []:
+                        self._add(
+                            int(h, 16), int(w), int(hh), base64.b64decode(thumb), url, (provider or [""])[0],
+                        )
+            except Exception:
+                pass  # chưa có / hỏng → bắt đầu rỗng
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _add(self, h: int, w: int, hh: int, thumb: bytes, url: str, provider: str = "") -> None:
+        idx = len(self._entries)
+        self._entries.append((h, w, hh, thumb, url, provider))
+        self._urls.add((h, url))
+        for b in range(_BANDS):
+            self._bands[b].setdefault((h >> (8 * b)) & 0xFF, []).append(idx)
+
+    def lookup(
+        self, h: int, w: int, hh: int, thumb: bytes, providers: Optional[Iterable[str]] = None,
+    ) -> Optional[str]:
+        """
+        URL của ảnh gần nhất (≤ max_distance bit, kích thước tương thích, ảnh thu nhỏ khớp) hoặc None.
+        providers: chỉ nhận entry upload lên các provider này.
+        """
+        providers = None if providers is None else set(providers)
+        if not informative(h):
+            return None
+        with self._lock:
+            seen = set()
+            best: Optional[Tuple[int, str]] = None
+            for b in range(_BANDS):
+                for idx in self._bands[b].get((h >> (8 * b)) & 0xFF, ()):
+                    if idx in seen:
+                        continue
+                    seen.add(idx)
+                    eh_, ew, ehh, ethumb, url, provider = self._entries[idx]
+                    if providers is not None and provider not in providers:
+                        continue
+                    d = hamming(h, eh_)
+                    if d > self.max_distance or (best is not None and d >= best[0]):
+                        continue
+                    if _compatible(w, hh, ew, ehh) and same_picture(thumb, ethumb):
+                        best = (d, url)
+            if best is not None:
+                self.hits += 1
+                return best[1]
+        return None
+
+    def add(self, h: int, w: int, hh: int, thumb: bytes, url: str, provider: str = "") -> None:
+        """Ghi nhận ảnh vừa upload lên provider (chỉ URL http/https — bản local file:// không dùng lại được)."""
+        if url and str(url).lower().startswith(("http://", "https://")):
+            self.insert(h, w, hh, thumb, url, provider)
+
+    def insert(self, h: int, w: int, hh: int, thumb: bytes, value: str, provider: str = "") -> None:
+        """Thêm không lọc giá trị (VD chỉ mục tạm trong 1 lô: value = đường dẫn ảnh đại diện)."""
+        if not informative(h):
+            return
+        with self._lock:
+            if (h, value) in self._urls:
+                return
+            self._add(h, w, hh, thumb, value, provider)
+            self._dirty += 1
+            due = self.path is not None and self._dirty >= _SAVE_EVERY
+        if due:
+            self.save()
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            payload = {"version": _INDEX_VERSION, "entries": [
+                [f"{h:016x}", w, hh, base64.b64encode(thumb).decode("ascii"), url, provider]
+                for h, w, hh, thumb, url, provider in self._entries
+            ]}
+            self._dirty = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".part")
+        fmt = "msgpack" if default_format() == "msgpack" else "json-compact"
+        tmp.write_bytes(dumps(payload, fmt))
+        os.replace(tmp, self.path)
+
+
+_indexes: Dict[str, PerceptualIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def index_from_env() -> Optional[PerceptualIndex]:
+    """Chỉ mục dùng chung trong process theo APPWORD_PHASH_INDEX (None nếu không bật)."""
+    raw = (os.getenv("APPWORD_PHASH_INDEX") or "").strip()
+    if not raw or raw.lower() in ("0", "false", "no", "off"):
+        return None
+    path = str(Path.home() / ".appword" / "phash_index.json") if raw.lower() in ("1", "true", "yes", "on") else raw
+    try:
+        dist = int(os.getenv("APPWORD_PHASH_DISTANCE", str(DEFAULT_DISTANCE)))
+    except ValueError:
+        dist = DEFAULT_DISTANCE
+    with _indexes_lock:
+        idx = _indexes.get(path)
+        if idx is None:
+            idx = _indexes[path] = PerceptualIndex(path, dist)
+    return idx
@@ -1,29 +1,38 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 import os
-import json
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Callable, Optional, Tuple
+from typing import Callable, List, Optional, Sequence, Tuple, Union
 
 # --- Core steps ---
-from appword.core.parser import parse_docx_to_json
-from appword.core.enricher import enrich_json_with_mapping
-from appword.core.exporter import build_quiz_from_json
+from appword.adapters.excel_mapping import MappingIndex, load_mapping_dir
+from appword.core.models import Question, dump_questions, load_questions
+from appword.core.serialization import read_file, write_file
+from appword.core.parser import parse_docx, parse_docx_to_json
+from appword.core.enricher import enrich_json_with_mapping, enrich_questions, write_enrich_log
+from appword.core.exporter import (
+    build_quiz_from_json, build_quiz_from_questions, ImageSources, DEFAULT_EMBED_MAX_BYTES,
+)
 
 # --- Image upload/attach ---
+from appword.services.checkpoints import CHECKPOINT_FILE, StageCheckpoints, fingerprint_mapping_dir, hash_file, hash_value
+from appword.services.upload_journal import UploadJournal
 from appword.services.uploader import ImageUploader
 from appword.tools.post_upload_links import attach_image_links
 
 
 # ========== Small IO helpers ==========
 def _read_json(p: Path):
-    with open(p, "r", encoding="utf-8") as f:
-        return json.load(f)
+    # JSON / MessagePack: tự nhận diện theo nội dung
+    return read_file(p)
 
-def _write_json(p: Path, obj):
-    p.parent.mkdir(parents=True, exist_ok=True)
-    with open(p, "w", encoding="utf-8") as f:
-        json.dump(obj, f, ensure_ascii=False, indent=2)
+def _write_json(p: Path, obj, fmt: Optional[str] = None):
+    write_file(p, obj, fmt)
+
+def _write_json_compact(p: Path, items, fmt: Optional[str] = None):
+    """Bản debug của chế độ in-memory: mặc định không indent → ghi nhanh, file nhỏ."""
+    dump_questions(p, items, fmt or "json-compact")
 
 def _safe_progress(cb: Optional[Callable[[int, int, str], None]], i: int, total: int, msg: str):
     try:
@@ -33,6 +42,49 @@ def _safe_progress(cb: Optional[Callable[[int, int, str], None]], i: int, total:
         # never let UI crash because of a bad callback
         pass
 
+def _safe_file_cb(cb: Optional[Callable[[Path, List[Path]], None]], src: Path, outputs: List[Path]):
+    try:
+        if cb:
+            cb(src, outputs)
+    except Exception:
+        pass
+
+class _FileDone:
+    """
+    Gọi file_cb theo thứ tự file, nhưng chỉ sau khi JSON debug của file đó (ghi nền, in-memory) đã ghi
+    xong → zip tải sớm của file giống hệt phần của nó trong kết quả cuối.
+    """
+
+    def __init__(self, cb: Optional[Callable[[Path, List[Path]], None]], pending: List[Future]):
+        self.cb = cb
+        self.pending = pending
+        self.waiting: List[Tuple[Optional[Future], Path, List[Path]]] = []
+
+    def mark(self) -> int:
+        """Số tác vụ ghi nền trước khi xử lý một file (để biết file đó có thêm tác vụ nào không)."""
+        return len(self.pending)
+
+    def done(self, src: Path, outputs: List[Path], mark: int) -> None:
+        fut = self.pending[-1] if len(self.pending) > mark else None
+        self.waiting.append((fut, src, outputs))
+        self.flush()
+
+    def flush(self, wait: bool = False) -> None:
+        while self.waiting:
+            fut, src, outputs = self.waiting[0]
+            if fut is not None and not (wait or fut.done()):
+                return
+            if fut is not None:
+                fut.exception()  # chờ ghi xong; lỗi ghi JSON được báo ở run_pipeline
+            self.waiting.pop(0)
+            _safe_file_cb(self.cb, src, outputs)
+
+def _embed_skip(export_options: Optional[dict]):
+    """Ảnh sẽ nhúng vào XML (image_mode embed/hybrid) thì KHÔNG upload ở bước attach."""
+    opts = export_options or {}
+    images = ImageSources(opts.get("image_mode", "upload"), opts.get("embed_max_bytes", DEFAULT_EMBED_MAX_BYTES))
+    return images.wants_embed
+
 def _file_ok(p: Optional[Path]) -> bool:
     try:
         return bool(p and p.exists() and p.stat().st_size > 0)
@@ -40,34 +92,66 @@ def _file_ok(p: Optional[Path]) -> bool:
         return False
 
 
+def _count_kinds(data) -> Tuple[int, int, int]:
+    try:
+        types = [
+            x.question_type if isinstance(x, Question) else x.get("question_type")
+            for x in data if isinstance(x, (Question, dict))
+        ]
+    except Exception:
+        types = []
+    mc = sum(1 for t in types if t == "multichoice")
+    kp = sum(1 for t in types if t in ("kprime", "truefalse", "tf", "true_false"))
+    sa = sum(1 for t in types if t == "shortanswer")
+    return mc, kp, sa
+
+
 # ========== DOCX pipeline ==========
 def _process_one_docx(
     docx: Path,
     per_out_dir: Path,
     uploader: ImageUploader,
     mapping_dir: Optional[str],
+    export_options: Optional[dict] = None,
+    mapping_index: Optional[MappingIndex] = None,
+    json_format: Optional[str] = None,
+    resume: bool = False,
 ) -> Tuple[Optional[Path], Optional[Path], Optional[str]]:
     """
     Xử lý 1 file .docx:
       .docx -> questionsTF.json -> (enrich) -> attach *_url -> questionsTF.uploaded.json -> moodle.xml
+    Mỗi bước xong ghi checkpoint (<per_out_dir>/.checkpoints.json); resume=True bỏ qua các bước còn hợp lệ.
     Trả về: (uploaded_json_path | None, xml_path | None, error | None)
     """
     try:
         per_out_dir.mkdir(parents=True, exist_ok=True)
+        plan = [("parsed", {"docx": hash_file(docx)})]
+        if mapping_dir:
+            plan.append(("enriched", {"mapping": fingerprint_mapping_dir(mapping_dir)}))
+        plan += [("uploaded", {"options": hash_value(export_options)}), ("exported", {"options": hash_value(export_options)})]
+        ck = StageCheckpoints(per_out_dir / CHECKPOINT_FILE, plan)
+        if resume and ck.resume():
+            print(f"[DOCX] Resume {docx.name}: đã xong tới bước '{ck.completed}'")
 
         # 1) DOCX -> JSON
-        print(f"[DOCX] Parse: {docx}")
-        raw_json_path = Path(parse_docx_to_json(str(docx), output_dir=str(per_out_dir)))
-        if not _file_ok(raw_json_path):
-            raise RuntimeError(
-                f"Parser KHÔNG sinh JSON cho '{docx.name}'. "
-                f"Kiểm tra lại định dạng docx. Dự kiến: {per_out_dir/'questionsTF.json'}"
-            )
-        print(f"[DOCX]   ✓ JSON: {raw_json_path.name} ({raw_json_path.stat().st_size} bytes)")
+        if ck.skip("parsed"):
+            raw_json_path = ck.output("parsed")
+        else:
+            print(f"[DOCX] Parse: {docx}")
+            raw_json_path = Path(parse_docx_to_json(str(docx), output_dir=str(per_out_dir), fmt=json_format))
+            if not _file_ok(raw_json_path):
+                raise RuntimeError(
+                    f"Parser KHÔNG sinh JSON cho '{docx.name}'. "
+                    f"Kiểm tra lại định dạng docx. Dự kiến: {per_out_dir/'questionsTF.json'}"
+                )
+            print(f"[DOCX]   ✓ JSON: {raw_json_path.name} ({raw_json_path.stat().st_size} bytes)")
+            ck.mark("parsed", raw_json_path)
 
         # 2) Enrich (optional)
         json_path = raw_json_path
-        if mapping_dir:
+        if mapping_dir and ck.skip("enriched"):
+            json_path = ck.output("enriched")
+        elif mapping_dir:
             print(f"[DOCX] Enrich với mapping_dir={mapping_dir!r}")
             json_path = Path(
                 enrich_json_with_mapping(
@@ -76,6 +160,8 @@ def _process_one_docx(
                     json_out=None,
                     overwrite=True,
                     log=True,
+                    index=mapping_index,
+                    fmt=json_format,
                 )
             )
             if not _file_ok(json_path):
@@ -83,37 +169,116 @@ def _process_one_docx(
                     f"Enricher chạy xong nhưng KHÔNG thấy JSON: {json_path}"
                 )
             print(f"[DOCX]   ✓ Enriched JSON: {json_path.name}")
+            ck.mark("enriched", json_path)
 
         # 3) Upload & attach *_url
-        print(f"[DOCX] Upload & attach image links…")
-        data = _read_json(json_path)
-        data = attach_image_links(data, uploader)
-        uploaded_json = json_path.with_suffix(".uploaded.json")
-        _write_json(uploaded_json, data)
-        if not _file_ok(uploaded_json):
+        if ck.skip("uploaded"):
+            uploaded_json = ck.output("uploaded")
+            data = _read_json(uploaded_json)
+        else:
+            print(f"[DOCX] Upload & attach image links…")
+            data = _read_json(json_path)
+            data = attach_image_links(data, uploader, skip=_embed_skip(export_options))
+            uploaded_json = json_path.with_suffix(".uploaded.json")
+            _write_json(uploaded_json, data, json_format)
+            if not _file_ok(uploaded_json):
+                raise RuntimeError(
+                    f"Không tạo được file uploaded JSON: {uploaded_json}"
+                )
+            ck.mark("uploaded", uploaded_json)
+
+        # 4) Build XML
+        if ck.skip("exported"):
+            xml_out = ck.output("exported")
+        else:
+            xml_out = Path(build_quiz_from_json(
+                str(uploaded_json), xml_out=str(per_out_dir / "moodle.xml"), **(export_options or {})
+            ))
+            if not _file_ok(xml_out):
+                raise RuntimeError(
+                    f"Exporter báo thành công nhưng KHÔNG thấy XML: {xml_out}"
+                )
+            ck.mark("exported", xml_out)
+
+        # 5) Nhặt thống kê nhanh (để nhìn log)
+        mc, kp, sa = _count_kinds(data)
+
+        print(
+            f"[DOCX] OK {docx.name} -> {uploaded_json.name}, XML={xml_out.name} | "
+            f"MCQ: {mc} | KPrime: {kp} | SA: {sa}"
+        )
+        return uploaded_json, xml_out, None
+
+    except Exception as e:
+        print(f"[DOCX] FAIL {docx} :: {e}")
+        return None, None, str(e)
+
+
+def _process_one_docx_in_memory(
+    docx: Path,
+    per_out_dir: Path,
+    uploader: ImageUploader,
+    mapping_index: Optional[MappingIndex],
+    export_options: Optional[dict] = None,
+    json_writer: Optional[ThreadPoolExecutor] = None,
+    pending: Optional[List[Future]] = None,
+    json_format: Optional[str] = None,
+    resume: bool = False,
+    mapping_hash: Optional[str] = None,
+) -> Tuple[Optional[Path], Optional[Path], Optional[str]]:
+    """
+    Như _process_one_docx nhưng list Question đi thẳng qua các bước, KHÔNG ghi/đọc JSON trung gian:
+      .docx -> parse -> (enrich) -> moodle.xml (exporter upload & gắn *_url ngay trên Question)
+    json_writer: nếu có, questionsTF.uploaded.json (debug, dạng gọn) được ghi nền SAU khi xuất XML.
+    Không có file trung gian → chỉ 1 checkpoint "exported" (resume=True bỏ qua file đã xuất xong).
+    mapping_hash: hash nội dung mapping_index (tính một lần cho cả lượt chạy).
+    """
+    try:
+        per_out_dir.mkdir(parents=True, exist_ok=True)
+        ck = StageCheckpoints(per_out_dir / CHECKPOINT_FILE, [(
+            "exported",
+            {"docx": hash_file(docx), "mapping": mapping_hash, "options": hash_value(export_options)},
+        )])
+        if resume and ck.resume():
+            print(f"[DOCX] Resume {docx.name}: đã xuất XML trước đó → bỏ qua")
+            return None, ck.output("exported"), None
+
+        # 1) DOCX -> list Question
+        print(f"[DOCX] Parse (in-memory): {docx}")
+        data = parse_docx(str(docx), output_dir=str(per_out_dir))
+        if not any(isinstance(x, Question) for x in data):
             raise RuntimeError(
-                f"Không tạo được file uploaded JSON: {uploaded_json}"
+                f"Parser KHÔNG tìm thấy câu hỏi nào trong '{docx.name}'. Kiểm tra lại định dạng docx."
             )
 
-        # 4) Build XML
-        xml_out = per_out_dir / "moodle.xml"
-        build_quiz_from_json(str(uploaded_json), xml_out=str(xml_out))
+        # 2) Enrich (optional) — log CSV vẫn ghi như chế độ thường
+        if mapping_index is not None:
+            log_rows = enrich_questions(data, mapping_index, overwrite=True)
+            write_enrich_log(per_out_dir / "enrich_log.csv", log_rows)
+            print(f"[DOCX]   ✓ Enriched {len(log_rows)} câu")
+
+        # 3) Upload ảnh + Build XML (ảnh nhúng theo image_mode thì không upload)
+        xml_out = Path(build_quiz_from_questions(
+            data, xml_out=str(per_out_dir / "moodle.xml"), uploader=uploader, **(export_options or {})
+        ))
         if not _file_ok(xml_out):
             raise RuntimeError(
                 f"Exporter báo thành công nhưng KHÔNG thấy XML: {xml_out}"
             )
+        ck.mark("exported", xml_out)
+
+        # 4) JSON debug: ghi một lần, ở luồng nền (data không còn bị sửa sau bước 3)
+        uploaded_json = per_out_dir / "questionsTF.uploaded.json"
+        if json_writer is not None:
+            fut = json_writer.submit(_write_json_compact, uploaded_json, data, json_format)
+            if pending is not None:
+                pending.append(fut)
+        else:
+            uploaded_json = None
 
-        # 5) Nhặt thống kê nhanh (để nhìn log)
-        try:
-            qs = [x for x in data if isinstance(x, dict) and x.get("question_type")]
-        except Exception:
-            qs = []
-        mc = sum(1 for q in qs if q.get("question_type") == "multichoice")
-        kp = sum(1 for q in qs if q.get("question_type") in ("kprime", "truefalse", "tf", "true_false"))
-        sa = sum(1 for q in qs if q.get("question_type") == "shortanswer")
-
+        mc, kp, sa = _count_kinds(data)
         print(
-            f"[DOCX] OK {docx.name} -> {uploaded_json.name}, XML={xml_out.name} | "
+            f"[DOCX] OK {docx.name} -> XML={xml_out.name} | "
             f"MCQ: {mc} | KPrime: {kp} | SA: {sa}"
         )
         return uploaded_json, xml_out, None
@@ -128,39 +293,77 @@ def _process_one_json(
     src_json: Path,
     out_root: Path,
     in_root: Path,
-    uploader: ImageUploader
+    uploader: ImageUploader,
+    export_options: Optional[dict] = None,
+    in_memory: bool = False,
+    json_writer: Optional[ThreadPoolExecutor] = None,
+    pending: Optional[List[Future]] = None,
+    json_format: Optional[str] = None,
+    resume: bool = False,
 ) -> Tuple[Optional[Path], Optional[Path], Optional[str]]:
     """
     JSON mode: mirror cấu trúc input
       <out_root>/<relative_path>.uploaded.json và .xml
+    in_memory=True: xuất XML thẳng từ dữ liệu đã attach; .uploaded.json (nếu có json_writer)
+      ghi gọn ở luồng nền sau khi xuất XML.
+    Checkpoint: <out_root>/<thư mục>/.<tên>.checkpoints.json; resume=True bỏ qua các bước còn hợp lệ.
     """
     try:
         rel = src_json.relative_to(in_root)
         out_json = (out_root / rel).with_suffix(".uploaded.json")
-        out_xml  = (out_root / rel).with_suffix(".xml")
+        xml_target = (out_root / rel).with_suffix(".xml")
 
         print(f"[JSON] Attach & Export: {src_json}")
         if not _file_ok(src_json):
             raise RuntimeError(f"File JSON rỗng/không tồn tại: {src_json}")
 
-        data = _read_json(src_json)
-        data = attach_image_links(data, uploader)
-        _write_json(out_json, data)
-        if not _file_ok(out_json):
-            raise RuntimeError(f"Không tạo được uploaded JSON: {out_json}")
-
-        build_quiz_from_json(str(out_json), xml_out=str(out_xml))
+        options = {"options": hash_value(export_options)}
+        plan = [("exported", {**options, "json": hash_file(src_json)})] if in_memory else [
+            ("uploaded", {**options, "json": hash_file(src_json)}), ("exported", options),
+        ]
+        ck = StageCheckpoints((out_root / rel).parent / f".{rel.stem}{CHECKPOINT_FILE}", plan)
+        if resume and ck.resume():
+            print(f"[JSON] Resume {src_json.name}: đã xong tới bước '{ck.completed}'")
+            if ck.skip("exported"):
+                return (None if in_memory else ck.output("uploaded")), ck.output("exported"), None
+
+        if in_memory:
+            # Question: exporter upload & gắn *_url ngay trên model, rồi ghi JSON một lần
+            data = load_questions(src_json)
+            out_xml = Path(build_quiz_from_questions(
+                data, xml_out=str(xml_target), uploader=uploader, **(export_options or {})
+            ))
+            if not _file_ok(out_xml):
+                raise RuntimeError(f"Exporter KHÔNG sinh XML: {out_xml}")
+            ck.mark("exported", out_xml)
+            if json_writer is not None:
+                fut = json_writer.submit(_write_json_compact, out_json, data, json_format)
+                if pending is not None:
+                    pending.append(fut)
+            else:
+                out_json = None
+            mc, kp, sa = _count_kinds(data)
+            print(f"[JSON] OK {src_json.name} | XML: {out_xml.name} | MCQ:{mc} KPrime:{kp} SA:{sa}")
+            return out_json, out_xml, None
+
+        if ck.skip("uploaded"):
+            out_json = ck.output("uploaded")
+            data = _read_json(out_json)
+        else:
+            data = _read_json(src_json)
+            data = attach_image_links(data, uploader, skip=_embed_skip(export_options))
+            _write_json(out_json, data, json_format)
+            if not _file_ok(out_json):
+                raise RuntimeError(f"Không tạo được uploaded JSON: {out_json}")
+            ck.mark("uploaded", out_json)
+
+        out_xml = Path(build_quiz_from_json(str(out_json), xml_out=str(xml_target), **(export_options or {})))
         if not _file_ok(out_xml):
             raise RuntimeError(f"Exporter KHÔNG sinh XML: {out_xml}")
+        ck.mark("exported", out_xml)
 
         # Thống kê nhanh
-        try:
-            qs = [x for x in data if isinstance(x, dict) and x.get("question_type")]
-        except Exception:
-            qs = []
-        mc = sum(1 for q in qs if q.get("question_type") == "multichoice")
-        kp = sum(1 for q in qs if q.get("question_type") in ("kprime", "truefalse", "tf", "true_false"))
-        sa = sum(1 for q in qs if q.get("question_type") == "shortanswer")
+        mc, kp, sa = _count_kinds(data)
 
         print(f"[JSON] OK {src_json.name} -> {out_json.name} | XML: {out_xml.name} | MCQ:{mc} KPrime:{kp} SA:{sa}")
         return out_json, out_xml, None
@@ -170,13 +373,30 @@ def _process_one_json(
         return None, None, str(e)
 
 
+def _open_journal(upload_journal: Union[None, bool, str], out_dir: Path) -> Optional[UploadJournal]:
+    if upload_journal is False:
+        return None
+    path = upload_journal if isinstance(upload_journal, str) else os.getenv("APPWORD_UPLOAD_JOURNAL")
+    journal = UploadJournal(path or out_dir / ".upload_journal.jsonl")
+    if len(journal):
+        print(f"[RUN] Nhật ký upload: {len(journal)} ảnh đã upload từ lần chạy trước → {journal.path}")
+    return journal
+
+
 # ========== Public API ==========
 def run_pipeline(
     input_folder: str,
     output_folder: str,
-    api_key: Optional[str] = None,
+    api_key: Optional[Union[str, Sequence[str]]] = None,
     progress_cb: Optional[Callable[[int, int, str], None]] = None,
     mapping_dir: Optional[str] = None,
+    export_options: Optional[dict] = None,
+    in_memory: bool = False,
+    debug_json: bool = True,
+    json_format: Optional[str] = None,
+    upload_journal: Union[None, bool, str] = None,
+    resume: bool = False,
+    file_cb: Optional[Callable[[Path, List[Path]], None]] = None,
 ) -> int:
     """
     DOCX mode:
@@ -184,6 +404,23 @@ def run_pipeline(
     JSON mode:
         questionsTF.json -> attach *_url -> *.uploaded.json -> .xml (mirror cây)
     Trả về: tổng số file INPUT đã thử xử lý (để UI hiển thị "Hoàn tất N file").
+    api_key: 1 key, "k1,k2,…" hoặc list key — upload xoay vòng qua pool key (key_pool)
+    export_options: tham số thêm cho build_quiz_from_json
+        (VD: {"max_shard_bytes": 8 << 20} để chia XML thành nhiều shard + manifest,
+             {"image_mode": "embed"} để nhúng ảnh vào XML, chạy offline không upload).
+    in_memory: list Question đi thẳng parse -> enrich -> attach -> export, KHÔNG ghi/đọc lại
+        questionsTF.json giữa các bước (mapping Excel chỉ nạp một lần cho cả lượt chạy).
+    debug_json: (chỉ với in_memory) vẫn ghi *.uploaded.json dạng gọn ở luồng nền;
+        tắt đi nếu chỉ cần XML.
+    json_format: định dạng các file JSON trung gian: "json" (thụt lề) | "json-compact" | "msgpack"
+        (None → biến môi trường APPWORD_JSON_FORMAT). Khi đọc lại, định dạng được tự nhận diện.
+    upload_journal: nhật ký upload để chạy lại sau khi bị ngắt chỉ upload ảnh còn thiếu
+        (None → APPWORD_UPLOAD_JOURNAL hoặc <output>/.upload_journal.jsonl; False → tắt; str → đường dẫn).
+    resume: mỗi file chạy tiếp từ bước đầu tiên chưa xong (parsed / enriched / uploaded / exported)
+        theo checkpoint của lần chạy trước (input đổi → bước đó và các bước sau chạy lại).
+    file_cb: gọi ngay khi MỘT file input xử lý xong (không lỗi): file_cb(file input, [output])
+        — DOCX: [thư mục output của file], JSON: [*.uploaded.json, .xml] (VD đóng gói dần kết quả).
+        In-memory: gọi sau khi JSON debug của file đó ghi nền xong (output đã đủ, không đổi nữa).
     """
     in_dir = Path(input_folder)
     out_dir = Path(output_folder)
@@ -195,9 +432,44 @@ def run_pipeline(
 
     # API key cho uploader (ưu tiên tham số truyền vào)
     if api_key:
-        os.environ["IMGBB_API_KEY"] = api_key
-    uploader = ImageUploader(api_key=os.getenv("IMGBB_API_KEY"), verbose=True)
+        os.environ["IMGBB_API_KEY"] = api_key if isinstance(api_key, str) else ",".join(api_key)
+    uploader = ImageUploader(
+        api_key=os.getenv("IMGBB_API_KEY"), verbose=True, journal=_open_journal(upload_journal, out_dir),
+    )
 
+    # JSON debug (in-memory): 1 luồng nền ghi lần lượt, chờ xong trước khi return
+    json_writer = ThreadPoolExecutor(max_workers=1) if (in_memory and debug_json) else None
+    pending: List[Future] = []
+    try:
+        return _run_files(
+            in_dir, out_dir, uploader, progress_cb, mapping_dir,
+            export_options, in_memory, json_writer, pending, json_format, resume, file_cb,
+        )
+    finally:
+        uploader.close()  # giải phóng process pool nén ảnh (nếu đã tạo)
+        if json_writer is not None:
+            json_writer.shutdown(wait=True)
+            for fut in pending:
+                err = fut.exception()
+                if err:
+                    print(f"[RUN] Không ghi được JSON debug :: {err}")
+
+
+def _run_files(
+    in_dir: Path,
+    out_dir: Path,
+    uploader: ImageUploader,
+    progress_cb: Optional[Callable[[int, int, str], None]],
+    mapping_dir: Optional[str],
+    export_options: Optional[dict],
+    in_memory: bool,
+    json_writer: Optional[ThreadPoolExecutor],
+    pending: List[Future],
+    json_format: Optional[str],
+    resume: bool = False,
+    file_cb: Optional[Callable[[Path, List[Path]], None]] = None,
+) -> int:
+    """Vòng lặp DOCX/JSON của run_pipeline (tách riêng để luồng ghi JSON luôn được đóng)."""
     # --- DOCX mode ---
     docxs = sorted(
         p for p in in_dir.rglob("*.docx")
@@ -206,14 +478,39 @@ def run_pipeline(
     if docxs:
         total = len(docxs)
         print(f"[RUN] DOCX mode | {total} file(s) | input={in_dir} -> output={out_dir}")
+        # Mapping Excel: nạp MỘT lần cho mọi file. Lỗi nạp → từng file báo lỗi (như enrich từng file),
+        # không dừng cả lô; chế độ thường thì enricher tự nạp lại và báo lỗi theo file.
+        mapping_index, mapping_hash, mapping_err = None, None, None
+        if mapping_dir:
+            try:
+                mapping_index = load_mapping_dir(mapping_dir)
+                mapping_hash = hash_value(mapping_index.rows) if in_memory else None
+            except Exception as e:
+                mapping_err = f"Không nạp được mapping {mapping_dir!r}: {e}"
+                print(f"[RUN] {mapping_err}")
+        finished = _FileDone(file_cb, pending)
         for i, docx in enumerate(docxs, 1):
             per = out_dir / docx.stem
+            mark = finished.mark()
             _safe_progress(progress_cb, i - 1, total, f"START DOCX {docx}")
-            uploaded_json, xml_out, err = _process_one_docx(docx, per, uploader, mapping_dir)
+            if in_memory and mapping_err:
+                print(f"[DOCX] FAIL {docx} :: {mapping_err}")
+                uploaded_json, xml_out, err = None, None, mapping_err
+            elif in_memory:
+                uploaded_json, xml_out, err = _process_one_docx_in_memory(
+                    docx, per, uploader, mapping_index, export_options, json_writer, pending, json_format, resume,
+                    mapping_hash,
+                )
+            else:
+                uploaded_json, xml_out, err = _process_one_docx(
+                    docx, per, uploader, mapping_dir, export_options, mapping_index, json_format, resume
+                )
             if err:
                 _safe_progress(progress_cb, i, total, f"FAIL  DOCX {docx} :: {err}")
             else:
                 _safe_progress(progress_cb, i, total, f"OK    DOCX {docx} -> {uploaded_json} | XML: {xml_out}")
+                finished.done(docx, [per], mark)
+        finished.flush(wait=True)
         _safe_progress(progress_cb, total, total, f"SUMMARY DOCX :: TOTAL={total}")
         return total
 
@@ -229,13 +526,19 @@ def run_pipeline(
 
     total = len(jsons)
     print(f"[RUN] JSON mode | {total} file(s) | input={in_dir} -> output={out_dir}")
+    finished = _FileDone(file_cb, pending)
     for i, jp in enumerate(jsons, 1):
         _safe_progress(progress_cb, i - 1, total, f"START JSON {jp}")
-        out_json, out_xml, err = _process_one_json(jp, out_dir, in_dir, uploader)
+        mark = finished.mark()
+        out_json, out_xml, err = _process_one_json(
+            jp, out_dir, in_dir, uploader, export_options, in_memory, json_writer, pending, json_format, resume
+        )
         if err:
             _safe_progress(progress_cb, i, total, f"FAIL  JSON {jp} :: {err}")
         else:
             _safe_progress(progress_cb, i, total, f"OK    JSON {jp} -> {out_json} | XML: {out_xml}")
+            finished.done(jp, [p for p in (out_json, out_xml) if p is not None], mark)
+    finished.flush(wait=True)
 
     _safe_progress(progress_cb, total, total, f"SUMMARY JSON :: TOTAL={total}")
     return total
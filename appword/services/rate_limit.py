@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+Giới hạn tốc độ upload theo (provider, API key), dùng chung cả process:
+  - TokenBucket: tối đa `rate` request/giây, cho phép dồn `burst` request; Retry-After → tạm khoá bucket
+  - AIMDLimiter: số request đồng thời tự điều chỉnh — +1 sau mỗi "cửa sổ" thành công,
+    ×0.5 khi gặp 429/503 (tăng cộng, giảm nhân như TCP)
+Trạng thái giữ bằng threading.Lock (không gắn với event loop) → dùng được từ nhiều event loop
+(mỗi phiên Streamlit / mỗi lần run_pipeline) lẫn code đồng bộ.
+
+Cấu hình qua biến môi trường (PROVIDER = IMGBB / CATBOX…):
+  APPWORD_<PROVIDER>_RATE   request/giây (mặc định 2)
+  APPWORD_<PROVIDER>_BURST  số request dồn tối đa (mặc định 4)
+  APPWORD_UPLOAD_MAX_CONCURRENCY  trần số request đồng thời (mặc định 2 × APPWORD_UPLOAD_WORKERS)
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import math
+import os
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+
+THROTTLE_STATUSES = (429, 503)
+_POLL_SECONDS = 0.05
+_MAX_RETRY_AFTER = 120.0
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, ""))
+    except ValueError:
+        return default
+
+
+def parse_retry_after(value) -> Optional[float]:
+    """Retry-After: số giây hoặc HTTP-date → số giây phải chờ (None nếu không có/không hợp lệ)."""
+    if not value:
+        return None
+    value = str(value).strip()
+    try:
+        secs = float(value)
+    except ValueError:
+        try:
+            secs = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError, IndexError, OverflowError):
+            return None
+    return min(max(0.0, secs), _MAX_RETRY_AFTER)
+
+
+class TokenBucket:
+    """Bucket an toàn đa luồng; reserve() đặt trước 1 token và trả số giây cần chờ."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = max(0.01, float(rate))
+        self.burst = max(1.0, float(burst))
+        self._tokens = self.burst
+        self._stamp = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            self._tokens -= 1.0
+            return max(0.0, -self._tokens / self.rate, self._blocked_until - now)
+
+    def delay(self) -> float:
+        """Số giây phải chờ nếu lấy token lúc này (chỉ xem, không đặt trước)."""
+        with self._lock:
+            now = time.monotonic()
+            tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+            return max(0.0, (1.0 - tokens) / self.rate, self._blocked_until - now)
+
+    def block_for(self, seconds: float) -> None:
+        """Server bảo chờ (Retry-After): mọi request sau thời điểm này đều phải chờ hết hạn."""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    async def acquire(self) -> None:
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def acquire_blocking(self) -> None:
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+
+class AIMDLimiter:
+    """Cửa sổ đồng thời thích nghi: limit ∈ [minimum, maximum]."""
+
+    def __init__(self, initial: int, minimum: int = 1, maximum: int = 16, decrease: float = 0.5):
+        self.minimum = max(1, int(minimum))
+        self.maximum = max(self.minimum, int(maximum))
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.decrease = decrease
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    @property
+    def window(self) -> int:
+        return max(self.minimum, int(self.limit))
+
+    def try_enter(self) -> bool:
+        with self._lock:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            return False
+
+    async def acquire(self) -> None:
+        while not self.try_enter():
+            await asyncio.sleep(_POLL_SECONDS)
+
+    def acquire_blocking(self) -> None:
+        while not self.try_enter():
+            time.sleep(_POLL_SECONDS)
+
+    def release(self, outcome: str = "ok") -> None:
+        """outcome: "ok" (tăng dần) | "throttled" (giảm nửa) | "error" (giữ nguyên)."""
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+            if outcome == "ok":
+                # +1 sau mỗi `limit` request thành công
+                self.limit = min(float(self.maximum), self.limit + 1.0 / self.limit)
+            elif outcome == "throttled":
+                self.limit = max(float(self.minimum), math.floor(self.limit * self.decrease))
+
+
+class ProviderLimiter:
+    """Bucket + AIMD cho một (provider, key)."""
+
+    def __init__(self, bucket: TokenBucket, aimd: AIMDLimiter):
+        self.bucket = bucket
+        self.aimd = aimd
+
+    def throttled(self, retry_after: Optional[float]) -> None:
+        if retry_after:
+            self.bucket.block_for(retry_after)
+
+
+_limiters: Dict[Tuple[str, str], ProviderLimiter] = {}
+_lock = threading.Lock()
+
+
+def _upload_workers() -> int:
+    try:
+        return max(1, int(os.getenv("APPWORD_UPLOAD_WORKERS", "")))
+    except ValueError:
+        return 4
+
+
+def limiter_for(provider: str, api_key: Optional[str] = None) -> ProviderLimiter:
+    """Limiter dùng chung theo (provider, key) — key chỉ giữ dạng băm."""
+    provider = (provider or "").lower()
+    kid = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+    lim = _limiters.get((provider, kid))
+    if lim is None:
+        with _lock:
+            lim = _limiters.get((provider, kid))
+            if lim is None:
+                env = provider.upper()
+                workers = _upload_workers()
+                lim = _limiters[(provider, kid)] = ProviderLimiter(
+                    TokenBucket(_env_float(f"APPWORD_{env}_RATE", 2.0), _env_float(f"APPWORD_{env}_BURST", 4.0)),
+                    AIMDLimiter(
+                        initial=workers,
+                        maximum=int(_env_float("APPWORD_UPLOAD_MAX_CONCURRENCY", workers * 2)),
+                    ),
+                )
+    return lim
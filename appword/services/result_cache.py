@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+Cache kết quả theo nội dung, từng file .docx: cùng file Word + cùng mapping Excel + cùng tuỳ chọn
+xuất → dùng lại thư mục output đã có (moodle.xml, *.uploaded.json…) thay vì parse/upload/xuất lại.
+- key = hash(bytes .docx, nội dung các file mapping .xlsx/.xls, tuỳ chọn, EXPORTER_VERSION) → đổi tên
+  file vẫn trúng; sửa 1 file trong bộ chỉ file đó chạy lại; đổi cách render XML → entry cũ không trúng.
+- Mỗi entry: <root>/<key>/out/… + meta.json {size, last_used}. Ghi vào thư mục tạm rồi rename
+  (nhiều process ghi cùng key an toàn). Vượt dung lượng → xoá entry dùng lâu nhất trước (LRU).
+- Chỉ cache file đã xuất xong (checkpoint "exported") và XML không trỏ ảnh local (file://).
+
+Cấu hình qua biến môi trường:
+  APPWORD_RESULT_CACHE     thư mục cache (mặc định <tempdir>/appword_results; "0" → tắt)
+  APPWORD_RESULT_CACHE_MB  dung lượng tối đa, MB (mặc định 2048)
+"""
+from __future__ import annotations
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Optional
+
+from appword.core.serialization import dumps, read_file
+from appword.core.exporter import EXPORTER_VERSION
+from appword.services.checkpoints import CHECKPOINT_FILE, fingerprint_mapping_dir, hash_file, hash_value
+
+CACHE_VERSION = 1
+META_FILE = "meta.json"
+
+
+def _dir_size(path: Path) -> int:
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+def _ignore_hidden(_dir, names):
+    return [n for n in names if n.startswith(".")]
+
+
+def _exported(per_out: Path) -> bool:
+    try:
+        if not read_file(per_out / CHECKPOINT_FILE).get("stages", {}).get("exported"):
+            return False
+    except Exception:
+        return False
+    return not any(b"file://" in p.read_bytes() for p in per_out.rglob("*.xml"))
+
+
+class ResultCache:
+    def __init__(self, root, max_bytes: int = 2048 << 20):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # ---------- key ----------
+    def keys_for(self, in_dir: Path, mapping_dir: Optional[str], options: Optional[dict]) -> Dict[Path, str]:
+        """{file .docx: key} cho mọi .docx trong in_dir (bỏ file tạm ~$)."""
+        common = [CACHE_VERSION, EXPORTER_VERSION, fingerprint_mapping_dir(mapping_dir), hash_value(options or {})]
+        return {
+            p: hash_value([hash_file(p), *common])
+            for p in sorted(in_dir.rglob("*.docx")) if not p.name.startswith("~$")
+        }
+
+    # ---------- đọc / ghi ----------
+    def get(self, key: str, dest: Path) -> bool:
+        """Chép output đã cache vào dest; False nếu chưa có (hoặc vừa bị xoá bởi process khác)."""
+        entry = self.root / key
+        try:
+            shutil.copytree(entry / "out", dest, dirs_exist_ok=True)
+            meta = read_file(entry / META_FILE)
+            meta["last_used"] = round(time.time(), 3)
+            self._write_meta(entry, meta)
+        except Exception:
+            with self._lock:
+                self.misses += 1
+            return False
+        with self._lock:
+            self.hits += 1
+        return True
+
+    def put(self, key: str, per_out: Path) -> bool:
+        """Lưu output của 1 file (chỉ khi đã xuất xong, ảnh đều đã upload); rồi dọn theo dung lượng."""
+        entry = self.root / key
+        if entry.exists() or not _exported(per_out):
+            return False
+        tmp = self.root / f".{key}.{uuid.uuid4().hex}"
+        try:
+            shutil.copytree(per_out, tmp / "out", ignore=_ignore_hidden)
+            self._write_meta(tmp, {"size": _dir_size(tmp / "out"), "last_used": round(time.time(), 3)})
+            os.rename(tmp, entry)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)  # process khác vừa ghi cùng key
+            return False
+        self.evict()
+        return True
+
+    @staticmethod
+    def _write_meta(entry: Path, meta: dict) -> None:
+        tmp = entry / f"{META_FILE}.{uuid.uuid4().hex}.part"
+        tmp.write_bytes(dumps(meta, "json-compact"))
+        os.replace(tmp, entry / META_FILE)
+
+    # ---------- dọn dẹp ----------
+    def evict(self) -> int:
+        """Xoá entry ít dùng gần đây nhất cho tới khi tổng dung lượng ≤ max_bytes. Trả số entry đã xoá."""
+        entries = []
+        for entry in self.root.iterdir():
+            if entry.name.startswith("."):
+                continue
+            try:
+                meta = read_file(entry / META_FILE)
+                entries.append((meta.get("last_used") or 0, int(meta.get("size") or 0), entry))
+            except Exception:
+                continue
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, entry in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            removed += 1
+        return removed
+
+
+_shared: Optional[ResultCache] = None
+_shared_lock = threading.Lock()
+
+
+def shared_cache() -> Optional[ResultCache]:
+    """ResultCache dùng chung trong process theo biến môi trường (None nếu tắt)."""
+    global _shared
+    raw = (os.getenv("APPWORD_RESULT_CACHE") or "").strip()
+    if raw.lower() in ("0", "false", "no", "off"):
+        return None
+    if _shared is None:
+        with _shared_lock:
+            if _shared is None:
+                try:
+                    mb = int(os.getenv("APPWORD_RESULT_CACHE_MB", "2048"))
+                except ValueError:
+                    mb = 2048
+                _shared = ResultCache(raw or Path(tempfile.gettempdir()) / "appword_results", mb << 20)
+    return _shared
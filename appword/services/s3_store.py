@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+Provider upload S3-compatible (AWS S3 / MinIO / …) cho ImageUploader (provider="s3").
+- Key theo nội dung: <prefix>/<sha256[:2]>/<sha256>.<ext> → cùng ảnh = cùng key; key đã có thì
+  bỏ qua PUT (HEAD một lần, nhớ trong process).
+- Một boto3 client dùng chung (pool kết nối = APPWORD_S3_POOL, mặc định 16; retry "adaptive"),
+  an toàn đa luồng → engine async PUT song song qua executor của nó.
+- Ảnh đã nén (~100KB) nên PUT một phát; multipart chỉ có ích với object lớn hơn nhiều.
+- URL trả về: APPWORD_S3_PUBLIC_URL/<key> (CDN / bucket public), mặc định <endpoint>/<bucket>/<key>.
+
+Cấu hình qua biến môi trường:
+  APPWORD_S3_BUCKET (bắt buộc), APPWORD_S3_ENDPOINT (MinIO: http://127.0.0.1:9000),
+  APPWORD_S3_PREFIX (mặc định "appword"), APPWORD_S3_PUBLIC_URL, APPWORD_S3_REGION,
+  AWS_ACCESS_KEY_ID / AWS_SECRET_ACCESS_KEY (như boto3).
+Cần `pip install boto3`. Test: truyền client giả lập (moto) vào S3Store(client=...).
+"""
+from __future__ import annotations
+
+import hashlib
+import mimetypes
+import os
+import threading
+from typing import Optional, Set
+
+try:
+    import boto3  # type: ignore
+    from botocore.config import Config  # type: ignore
+    from botocore.exceptions import ClientError  # type: ignore
+except Exception:
+    boto3 = None
+    Config = None
+    ClientError = Exception
+
+_MISSING = ("404", "NoSuchKey", "NotFound")
+_CACHE_CONTROL = "public, max-age=31536000, immutable"  # key theo nội dung → không bao giờ đổi
+
+
+class S3Store:
+    def __init__(
+        self,
+        bucket: str,
+        endpoint_url: Optional[str] = None,
+        prefix: str = "appword",
+        public_base_url: Optional[str] = None,
+        region: Optional[str] = None,
+        client=None,
+        pool_size: int = 16,
+    ):
+        if client is None:
+            if boto3 is None:
+                raise RuntimeError("Missing 'boto3' (pip install boto3)")
+            client = boto3.client(
+                "s3",
+                endpoint_url=endpoint_url or None,
+                region_name=region or None,
+                config=Config(
+                    max_pool_connections=pool_size,
+                    retries={"max_attempts": 5, "mode": "adaptive"},
+                    s3={"addressing_style": "path"} if endpoint_url else None,
+                ),
+            )
+        self.client = client
+        self.bucket = bucket
+        self.prefix = (prefix or "").strip("/")
+        base = public_base_url or (f"{endpoint_url.rstrip('/')}/{bucket}" if endpoint_url else f"https://{bucket}.s3.amazonaws.com")
+        self.public_base_url = base.rstrip("/")
+        self._known: Set[str] = set()
+        self._lock = threading.Lock()
+        self.skipped = 0
+        self.uploaded = 0
+
+    @classmethod
+    def from_env(cls, client=None) -> "S3Store":
+        bucket = os.getenv("APPWORD_S3_BUCKET")
+        if not bucket:
+            raise RuntimeError("Missing APPWORD_S3_BUCKET")
+        try:
+            pool = int(os.getenv("APPWORD_S3_POOL", "16"))
+        except ValueError:
+            pool = 16
+        return cls(
+            bucket,
+            endpoint_url=os.getenv("APPWORD_S3_ENDPOINT"),
+            prefix=os.getenv("APPWORD_S3_PREFIX", "appword"),
+            public_base_url=os.getenv("APPWORD_S3_PUBLIC_URL"),
+            region=os.getenv("APPWORD_S3_REGION"),
+            client=client,
+            pool_size=pool,
+        )
+
+    # ---------- key / url ----------
+    def key_for(self, data_bytes: bytes, filename: str = "", mime: str = "") -> str:
+        digest = hashlib.sha256(data_bytes).hexdigest()
+        ext = os.path.splitext(filename)[1].lower() or mimetypes.guess_extension(mime or "") or ".bin"
+        key = f"{digest[:2]}/{digest}{ext}"
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def url_for(self, key: str) -> str:
+        return f"{self.public_base_url}/{key}"
+
+    # ---------- I/O ----------
+    def exists(self, key: str) -> bool:
+        if key in self._known:
+            return True
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            code = str(getattr(e, "response", {}).get("Error", {}).get("Code", ""))
+            if code in _MISSING:
+                return False
+            raise
+        with self._lock:
+            self._known.add(key)
+        return True
+
+    def put(self, data_bytes: bytes, filename: str, mime: str) -> str:
+        """PUT nếu chưa có; trả URL public. Gọi song song từ nhiều luồng được."""
+        key = self.key_for(data_bytes, filename, mime)
+        if self.exists(key):
+            with self._lock:
+                self.skipped += 1
+            return self.url_for(key)
+        self.client.put_object(
+            Bucket=self.bucket, Key=key, Body=data_bytes,
+            ContentType=mime or "application/octet-stream", CacheControl=_CACHE_CONTROL,
+        )
+        with self._lock:
+            self._known.add(key)
+            self.uploaded += 1
+        return self.url_for(key)
+
+
+_shared: Optional[S3Store] = None
+_shared_lock = threading.Lock()
+
+
+def shared_store() -> S3Store:
+    """S3Store dùng chung trong process (cấu hình từ biến môi trường)."""
+    global _shared
+    if _shared is None:
+        with _shared_lock:
+            if _shared is None:
+                _shared = S3Store.from_env()
+    return _shared
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Nhật ký upload chỉ-ghi-thêm (JSON Lines): mỗi ảnh upload xong ghi NGAY 1 dòng
+{key, path, provider, url, ts} → app bị tắt / phiên Streamlit hết hạn giữa chừng thì lần chạy lại
+đọc nhật ký (replay) và chỉ upload các ảnh còn thiếu.
+- key = hash nội dung file + tham số nén (max_side/min_side/target) → cùng ảnh ở đường dẫn khác
+  (thư mục tạm mới mỗi lần chạy) vẫn khớp; đổi tham số nén → upload lại.
+- Chỉ ghi kết quả upload thật (URL http/https), không ghi bản lưu local.
+- Dòng cuối dở dang (ghi bị cắt khi crash) được bỏ qua khi đọc.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from appword.core.serialization import dumps, loads
+
+
+class UploadJournal:
+    def __init__(self, path):
+        self.path = Path(path)
+        self._records: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._fh = None
+        self.replayed = 0
+        self.recorded = 0
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def _load(self) -> None:
+        try:
+            raw = self.path.read_bytes()
+        except OSError:
+            return
+        for line in raw.splitlines():
+            try:
+                rec = loads(line)
+                self._records[rec["key"]] = rec
+            except Exception:
+                continue  # dòng hỏng / bị cắt
+
+    def lookup(self, key: str, providers: Optional[Iterable[str]] = None) -> Optional[str]:
+        """URL đã upload cho key (providers: chỉ nhận bản ghi của các provider này)."""
+        rec = self._records.get(key)
+        if rec is None or (providers is not None and rec.get("provider") not in providers):
+            return None
+        with self._lock:
+            self.replayed += 1
+        return rec.get("url")
+
+    def record(self, key: str, path: str, provider: str, url: str) -> None:
+        if not key or not url or not str(url).lower().startswith(("http://", "https://")):
+            return
+        rec = {"key": key, "path": str(path), "provider": provider, "url": url, "ts": round(time.time(), 3)}
+        line = dumps(rec, "json-compact") + b"\n"
+        with self._lock:
+            if self._fh is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._fh = open(self.path, "ab")
+                if self._fh.tell() and not self._ends_with_newline():
+                    self._fh.write(b"\n")  # tách khỏi dòng dở dang của lần crash trước
+            self._fh.write(line)
+            self._fh.flush()  # mỗi ảnh một lần: crash/đóng app vẫn giữ các upload đã xong
+            self._records[key] = rec
+            self.recorded += 1
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.path, "rb") as f:
+            f.seek(-1, 2)
+            return f.read(1) == b"\n"
+
+    def close(self) -> None:
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
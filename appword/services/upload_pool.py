@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+Upload nhiều ảnh song song theo 2 tầng:
+  - NÉN (CPU: PIL resize/quantize/JPEG optimize) trên ProcessPoolExecutor — dùng hết các lõi
+  - UPLOAD (mạng: ImgBB/Catbox) trên engine asyncio (async_upload) — token bucket + AIMD theo key
+Hai tầng nối bằng một hàng đợi có giới hạn: uploader chậm → hàng đợi đầy → ngừng gửi thêm
+việc nén (không dồn cả lô ảnh đã nén trong RAM).
+
+Cấu hình qua biến môi trường:
+  APPWORD_ENCODE_WORKERS  số process nén (mặc định: số lõi - 1, tối thiểu 1; 0 = nén ngay trên luồng upload)
+  APPWORD_UPLOAD_WORKERS  số request upload đồng thời ban đầu (mặc định 4; AIMD tự tăng/giảm, xem rate_limit)
+  APPWORD_SHARED_ENCODE_POOL=1  process pool nén dùng chung cả process, close() không tắt nó
+                          (process chạy lâu như worker job của web app: lô sau không phải chờ khởi động lại)
+"""
+from __future__ import annotations
+
+import os
+import queue
+import threading
+from multiprocessing import util as mp_util
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Dict, Iterable, Optional, Tuple
+
+from appword.services.async_upload import run_engine
+from appword.services.uploader import ImageUploader, UploadResult
+
+_SENTINEL = None
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, ""))
+    except ValueError:
+        return default
+
+
+def default_encode_workers() -> int:
+    return max(0, _env_int("APPWORD_ENCODE_WORKERS", max(1, (os.cpu_count() or 2) - 1)))
+
+
+def default_upload_workers() -> int:
+    return max(1, _env_int("APPWORD_UPLOAD_WORKERS", 4))
+
+
+def shared_encode_enabled() -> bool:
+    return (os.getenv("APPWORD_SHARED_ENCODE_POOL") or "").strip().lower() in ("1", "true", "yes", "on")
+
+
+_shared_procs: Dict[int, ProcessPoolExecutor] = {}
+_shared_procs_lock = threading.Lock()
+
+
+def _shutdown_shared() -> None:
+    with _shared_procs_lock:
+        pools = list(_shared_procs.values())
+        _shared_procs.clear()
+    for procs in pools:
+        procs.shutdown(wait=True)
+
+
+def shared_encode_pool(workers: int) -> ProcessPoolExecutor:
+    """Process pool nén dùng chung trong process (theo số worker), sống tới khi process thoát."""
+    with _shared_procs_lock:
+        if not _shared_procs:
+            # lúc thoát: tắt pool TRƯỚC khi multiprocessing đóng hàng đợi (priority 10) và chờ process con
+            # (process này có thể là worker của pool khác, VD worker job của web app)
+            mp_util.Finalize(None, _shutdown_shared, exitpriority=20)
+        procs = _shared_procs.get(workers)
+        if procs is None or getattr(procs, "_broken", False):  # worker nén chết → tạo pool mới
+            procs = _shared_procs[workers] = ProcessPoolExecutor(max_workers=workers)
+        return procs
+
+
+# ========= Tầng nén (chạy trong process con → phải là hàm top-level, tham số pickle được) =========
+def _encode_job(path: str, max_side: int, min_side: int, target_bytes: int) -> Tuple[bytes, str, str, dict]:
+    enc = ImageUploader(api_key="-", verbose=False, max_side=max_side, min_side=min_side, target_bytes=target_bytes)
+    return enc.encode_file(path)
+
+
+class UploadPool:
+    """
+    Pool dùng lại được cho nhiều lô (process pool khởi tạo lười, giữ tới khi close(); shared → pool chung của process).
+    upload_many(paths) -> {path: UploadResult}; lỗi nén một ảnh → thử lại đường tuần tự cũ (upload_path).
+    """
+
+    def __init__(
+        self,
+        uploader: ImageUploader,
+        encode_workers: Optional[int] = None,
+        upload_workers: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        shared: Optional[bool] = None,
+    ):
+        self.uploader = uploader
+        self.encode_workers = default_encode_workers() if encode_workers is None else max(0, int(encode_workers))
+        self.upload_workers = default_upload_workers() if upload_workers is None else max(1, int(upload_workers))
+        self.queue_size = int(queue_size or self.upload_workers * 2)
+        self.shared = shared_encode_enabled() if shared is None else shared
+        self._procs: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    # ---------- vòng đời ----------
+    def _process_pool(self) -> Optional[ProcessPoolExecutor]:
+        if self.encode_workers <= 0:
+            return None
+        with self._lock:
+            if self._procs is None:
+                try:
+                    if self.shared:
+                        self._procs = shared_encode_pool(self.encode_workers)
+                    else:
+                        self._procs = ProcessPoolExecutor(max_workers=self.encode_workers)
+                except (OSError, NotImplementedError) as e:
+                    # môi trường không tạo được process (sandbox, một số bản đóng gói) → nén trên luồng upload
+                    self.uploader._v("Không tạo được process pool → nén trên luồng upload:", e)
+                    self.encode_workers = 0
+            return self._procs
+
+    def close(self) -> None:
+        with self._lock:
+            if self._procs is not None and not self.shared:
+                self._procs.shutdown(wait=True)
+            self._procs = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---------- API ----------
+    def upload_many(self, paths: Iterable[str]) -> Dict[str, UploadResult]:
+        up = self.uploader
+        results: Dict[str, UploadResult] = {}
+        todo = []
+        for p in dict.fromkeys(p for p in paths if p):  # bỏ trùng, giữ thứ tự
+            if str(p).lower().startswith(("http://", "https://", "file://")):
+                results[p] = UploadResult(ok=True, url=p, provider="passthrough")
+            elif not os.path.exists(os.path.abspath(p)):
+                results[p] = up.upload_url_or_path(p)  # → UploadResult lỗi "File not found" như cũ
+            else:
+                todo.append(p)
+        todo, jkeys = self._replay_journal(todo, results)
+        todo, sigs, aliases = self._dedupe_perceptual(todo, results)
+        if len(todo) == 1:
+            results[todo[0]] = up.upload_url_or_path(todo[0])
+        elif todo:
+            self._run_stages(todo, results, sigs, jkeys)
+        # ảnh gần giống trong cùng lô → dùng chung kết quả của ảnh đại diện
+        for p, rep in aliases.items():
+            results[p] = results[rep]
+        # ảnh lấy URL qua pHash cũng vào nhật ký (ảnh upload thật đã ghi ngay khi xong)
+        for p, key in jkeys.items():
+            if p in aliases or results[p].provider == "phash":
+                up._journal_record(key, p, results[p])
+        return results
+
+    def _replay_journal(self, todo, results: Dict[str, UploadResult]):
+        """Nhật ký upload (nếu có): ảnh đã upload ở lần chạy bị ngắt trước → lấy URL, không làm lại."""
+        up = self.uploader
+        if up.journal is None:
+            return todo, {}
+        rest, jkeys = [], {}
+        for p in todo:
+            key, url = up._journal_lookup(os.path.abspath(p))
+            if url:
+                results[p] = UploadResult(ok=True, url=url, provider="journal")
+                continue
+            if key:
+                jkeys[p] = key
+            rest.append(p)
+        if len(todo) != len(rest):
+            up._v(f"Nhật ký upload: {len(todo) - len(rest)}/{len(todo)} ảnh đã upload từ lần chạy trước")
+        return rest, jkeys
+
+    def _dedupe_perceptual(self, todo, results: Dict[str, UploadResult]):
+        """
+        Chỉ mục pHash (nếu bật): ảnh gần giống ảnh đã upload → lấy URL cũ ngay (bỏ nén/upload);
+        ảnh gần giống nhau trong cùng lô → chỉ upload 1 ảnh đại diện.
+        Trả (todo còn lại, {path: chữ ký pHash}, {path: path đại diện}).
+        """
+        up = self.uploader
+        if up.phash is None:
+            return todo, {}, {}
+        from appword.services.phash_index import PerceptualIndex
+        batch = PerceptualIndex(None, up.phash.max_distance)
+        rest, sigs, aliases = [], {}, {}
+        for p in todo:
+            sig, url = up._phash_lookup(os.path.abspath(p))
+            if url:
+                results[p] = UploadResult(ok=True, url=url, provider="phash")
+                continue
+            rep = batch.lookup(*sig) if sig else None
+            if rep:
+                aliases[p] = rep
+                continue
+            if sig:
+                sigs[p] = sig
+                batch.insert(*sig, p)
+            rest.append(p)
+        if len(todo) != len(rest):
+            up._v(f"pHash: {len(todo) - len(rest)}/{len(todo)} ảnh dùng lại URL / ảnh đại diện")
+        return rest, sigs, aliases
+
+    def _run_stages(
+        self, todo, results: Dict[str, UploadResult], sigs: Dict[str, tuple], jkeys: Dict[str, str],
+    ) -> None:
+        up = self.uploader
+        q: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+        lock = threading.Lock()
+
+        def store(path: str, res: UploadResult):
+            with lock:
+                results[path] = res
+            up._phash_remember(sigs.get(path), res)
+            up._journal_record(jkeys.get(path), path, res)  # ghi ngay khi từng ảnh xong
+
+        # tầng upload: 1 luồng chạy event loop của engine async, tiêu thụ q tới _SENTINEL
+        consumer = threading.Thread(target=run_engine, args=(up, q, store, _SENTINEL), daemon=True)
+        consumer.start()
+        try:
+            procs = self._process_pool()
+            if procs is None:
+                for p in todo:
+                    q.put((p, None))
+            else:
+                self._feed(procs, todo, q)
+        finally:
+            q.put(_SENTINEL)
+            consumer.join()
+
+    def _feed(self, procs: ProcessPoolExecutor, todo, q: "queue.Queue") -> None:
+        """Gửi việc nén theo cửa sổ; q.put() chặn khi tầng upload chưa kịp → tự điều tiết."""
+        up = self.uploader
+        window = max(2, self.encode_workers * 2)
+        pending: Dict[Future, str] = {}
+        it = iter(todo)
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < window:
+                try:
+                    p = next(it)
+                except StopIteration:
+                    exhausted = True
+                    break
+                fut = procs.submit(_encode_job, os.path.abspath(p), up.max_side, up.min_side, up.target_bytes)
+                pending[fut] = p
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                p = pending.pop(fut)
+                try:
+                    encoded = fut.result()
+                except BaseException as e:  # BrokenProcessPool, lỗi PIL…
+                    encoded = e
+                q.put((p, encoded))
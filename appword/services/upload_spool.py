@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+Vùng đệm đĩa cho file người dùng upload lên web app (mỗi phiên một thư mục).
+- add(): chép file upload xuống đĩa theo từng khúc (1 MB) vừa chép vừa hash → không tạo thêm bản
+  sao trong RAM; UI đổi key widget upload ngay sau đó để Streamlit bỏ bộ đệm của nó.
+  writer(): ghi dần từ luồng đang nhận (API HTTP đọc body multipart theo khúc, http_api).
+- Dedupe theo nội dung: blob lưu theo sha256 (<phiên>/blobs/<sha>.<đuôi>); cùng file upload lại
+  hay trùng nội dung dưới tên khác → một blob.
+- Pipeline đọc tại chỗ: job nhận đường dẫn blob và hard-link vào thư mục input (jobs._save_input),
+  không chép lại.
+- Dọn: clear() khi người dùng xoá / đăng xuất; phiên không còn hoạt động quá TTL (tính từ lần
+  touch cuối) → cleanup_spools() xoá cả thư mục. Tab còn mở sau đó vẫn ghi được: thư mục phiên /
+  blobs được tạo lại khi ghi.
+
+Cấu hình qua biến môi trường:
+  APPWORD_SPOOL_DIR  thư mục gốc (mặc định <tempdir>/appword_spool)
+  APPWORD_SPOOL_TTL  giây không hoạt động trước khi xoá phiên (mặc định 7200)
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+from appword.core.serialization import dumps, read_file
+
+MANIFEST_FILE = "manifest.json"
+_CHUNK = 1 << 20
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, ""))
+    except ValueError:
+        return default
+
+
+def default_root() -> Path:
+    return Path(os.getenv("APPWORD_SPOOL_DIR") or Path(tempfile.gettempdir()) / "appword_spool")
+
+
+def cleanup_spools(root: Optional[Path] = None, ttl: Optional[int] = None) -> int:
+    """Xoá thư mục phiên không hoạt động quá ttl giây. Trả số phiên đã xoá."""
+    root = Path(root or default_root())
+    ttl = _env_int("APPWORD_SPOOL_TTL", 7200) if ttl is None else ttl
+    if not root.is_dir():
+        return 0
+    now, removed = time.time(), 0
+    for d in root.iterdir():
+        if not d.is_dir():
+            continue
+        try:
+            idle = now - (d / MANIFEST_FILE).stat().st_mtime
+        except OSError:
+            idle = now - d.stat().st_mtime
+        if idle > ttl:
+            shutil.rmtree(d, ignore_errors=True)
+            removed += 1
+    return removed
+
+
+class UploadSpool:
+    def __init__(self, session_id: Optional[str] = None, root: Optional[str] = None):
+        self.session_id = session_id or uuid.uuid4().hex
+        if not self.session_id.isalnum():
+            raise ValueError(f"Session ID không hợp lệ: {self.session_id!r}")
+        self.dir = Path(root or default_root()) / self.session_id
+        (self.dir / "blobs").mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        try:
+            self._files: Dict[str, str] = read_file(self.dir / MANIFEST_FILE).get("files") or {}
+        except Exception:
+            self._files = {}
+        self.touch()
+
+    # ---------- ghi ----------
+    def add(self, name: str, src: BinaryIO) -> Path:
+        """Chép src (file-like) xuống đĩa theo khúc; trả đường dẫn blob (đã có cùng nội dung → dùng lại)."""
+        if hasattr(src, "seek"):
+            src.seek(0)
+        w = self.writer(name)
+        try:
+            for chunk in iter(lambda: src.read(_CHUNK), b""):
+                w.write(chunk)
+        except BaseException:
+            w.abort()
+            raise
+        return w.close()
+
+    def writer(self, name: str) -> "SpoolWriter":
+        """Ghi dần (VD từ body multipart đang nhận): w.write(bytes)…; w.close() → đường dẫn blob."""
+        return SpoolWriter(self, os.path.basename(name))
+
+    def _commit(self, name: str, tmp: Path, digest: str) -> Path:
+        blob = self.dir / "blobs" / f"{digest}{Path(name).suffix.lower()}"
+        blob.parent.mkdir(parents=True, exist_ok=True)  # cleanup_spools() có thể đã xoá phiên
+        if blob.exists():
+            tmp.unlink()
+        else:
+            os.replace(tmp, blob)
+        with self._lock:
+            self._files[name] = blob.name
+            self._save()
+        return blob
+
+    def remove(self, name: str) -> None:
+        with self._lock:
+            blob = self._files.pop(name, None)
+            if blob and blob not in self._files.values():
+                (self.dir / "blobs" / blob).unlink(missing_ok=True)
+            self._save()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._files = {}
+            shutil.rmtree(self.dir / "blobs", ignore_errors=True)
+            (self.dir / "blobs").mkdir(parents=True, exist_ok=True)
+            self._save()
+
+    def destroy(self) -> None:
+        """Xoá hẳn vùng đệm của phiên (đăng xuất)."""
+        with self._lock:
+            self._files = {}
+            shutil.rmtree(self.dir, ignore_errors=True)
+
+    def _save(self) -> None:
+        self.dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.dir / f"{MANIFEST_FILE}.part"
+        tmp.write_bytes(dumps({"files": self._files}, "json-compact"))
+        os.replace(tmp, self.dir / MANIFEST_FILE)
+
+    def touch(self) -> None:
+        """Đánh dấu phiên còn hoạt động (TTL tính từ lần touch cuối)."""
+        with self._lock:
+            self._save()
+
+    # ---------- đọc ----------
+    def files(self) -> List[Tuple[str, Path, int]]:
+        """[(tên gốc, đường dẫn blob, số byte)] theo tên."""
+        out = []
+        with self._lock:
+            items = sorted(self._files.items())
+        for name, blob in items:
+            p = self.dir / "blobs" / blob
+            if p.is_file():
+                out.append((name, p, p.stat().st_size))
+        return out
+
+    def total_bytes(self) -> int:
+        """Dung lượng trên đĩa (blob trùng nội dung chỉ tính một lần)."""
+        return sum({p: size for _, p, size in self.files()}.values())
+
+
+class SpoolWriter:
+    """Một file đang được ghi vào UploadSpool: hash sha256 trong lúc ghi, close() mới đưa vào manifest."""
+
+    def __init__(self, spool: UploadSpool, name: str):
+        self.spool = spool
+        self.name = name
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._tmp = spool.dir / f".{uuid.uuid4().hex}.part"
+        # phiên để lâu quá TTL → cleanup_spools() (phiên khác gọi) đã xoá thư mục: tạo lại
+        spool.dir.mkdir(parents=True, exist_ok=True)
+        self._fh = open(self._tmp, "wb")
+
+    def write(self, data: bytes) -> None:
+        self._hash.update(data)
+        self._fh.write(data)
+        self.size += len(data)
+
+    def close(self) -> Path:
+        self._fh.close()
+        return self.spool._commit(self.name, self._tmp, self._hash.hexdigest())
+
+    def abort(self) -> None:
+        self._fh.close()
+        self._tmp.unlink(missing_ok=True)
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
-import io, os, sys, json, time, tempfile, math
+import io, os, sys, json, time, tempfile, math, hashlib, random, threading
+from collections import OrderedDict
 from dataclasses import dataclass
 from typing import Optional, Tuple
 from pathlib import Path
@@ -13,6 +14,16 @@ try:
     import requests
 except Exception:
     requests = None
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+from appword.services.key_pool import key_pool_for, parse_keys
+from appword.services.rate_limit import THROTTLE_STATUSES, limiter_for, parse_retry_after
+
+IMGBB_URL = "https://api.imgbb.com/1/upload"
+CATBOX_URL = "https://catbox.moe/user/api.php"
 
 # ================= HELPER: ĐỌC CONFIG =================
 def get_app_path():
@@ -21,21 +32,183 @@ def get_app_path():
         return os.path.dirname(sys.executable)
     return os.path.dirname(os.path.abspath(__file__))
 
-def get_config_api_key():
-    """Đọc API Key từ file settings.json nằm cạnh file .exe"""
+def get_config_api_keys():
+    """Đọc danh sách API Key từ settings.json: "api_keys" (list) → "api_key" → "last_api_key" (mỗi mục có thể nhiều key)."""
     try:
         # File nằm ở: <Folder chứa App>/configs/settings.json
         config_path = os.path.join(get_app_path(), "configs", "settings.json")
         if os.path.exists(config_path):
             with open(config_path, "r", encoding="utf-8") as f:
                 data = json.load(f)
-                key = data.get("api_key", "").strip()
-                if key: return key
-                # Fallback: có thể lưu ở last_api_key (tùy code main_ui lưu tên gì)
-                return data.get("last_api_key", "").strip()
+                for field in ("api_keys", "api_key", "last_api_key"):
+                    keys = parse_keys(data.get(field))
+                    if keys: return keys
     except Exception:
         pass
-    return ""
+    return []
+
+def get_config_api_key():
+    """Đọc API Key từ file settings.json nằm cạnh file .exe"""
+    keys = get_config_api_keys()
+    return keys[0] if keys else ""
+# ======================================================
+
+# ================= HELPER: NÉN ẢNH =================
+_JPEG_Q_MAX = 80
+_JPEG_Q_MIN = 30
+_Q_GALLOP = 8                  # bước dò xuống
+_Q_STEP = 2                    # độ mịn khi chia đôi
+_PROBE_PIXELS = 1000 * 1000    # ảnh lớn hơn (APPWORD_MAX_SIDE cao): ước lượng từ bản thu nhỏ cỡ này
+_Q_MIN_RATIO = 0.5             # dung lượng ở q thấp nhất thường < 1/2 ở q cao nhất
+_SHRINK_MARGIN = 0.97          # thu nhỏ hơn dự đoán một chút để lần sau chắc chắn đạt
+_MAX_SHRINK_ROUNDS = 4
+
+def _jpeg_bytes(img, quality: int, final: bool = False) -> bytes:
+    """final=False: bản nén thử (baseline, không optimize) — nhanh, luôn >= bản cuối."""
+    b = io.BytesIO()
+    if final:
+        img.save(b, format="JPEG", quality=quality, optimize=True, progressive=True, subsampling="4:2:0")
+    else:
+        img.save(b, format="JPEG", quality=quality, subsampling="4:2:0")
+    return b.getvalue()
+
+def _png_bytes(img) -> bytes:
+    b = io.BytesIO()
+    img.save(b, format="PNG", optimize=True)
+    return b.getvalue()
+
+def _estimate_jpeg_bytes(img, quality: int, ratio: float = 1.0) -> int:
+    """Dung lượng JPEG dự đoán ở kích thước gốc, đo trên bản thu nhỏ (~_PROBE_PIXELS điểm ảnh)."""
+    w, h = img.size
+    if w * h <= _PROBE_PIXELS:
+        return int(len(_jpeg_bytes(img, quality)) * ratio)
+    f = math.sqrt(_PROBE_PIXELS / float(w * h))
+    probe = img.resize((max(1, int(w * f)), max(1, int(h * f))), Image.BILINEAR)
+    return int(len(_jpeg_bytes(probe, quality)) * ratio * (w * h) / float(probe.width * probe.height))
+
+def _search_jpeg_quality(img, target_bytes: int, q_fail: int = _JPEG_Q_MAX + 1, ratio: float = 1.0):
+    """
+    q lớn nhất (độ mịn _Q_STEP) có bản nén thử * ratio <= target; q_fail: chất lượng đã biết là KHÔNG đạt.
+    ratio: tỉ lệ dung lượng bản cuối (optimize/progressive) / bản thử, đo một lần trên chính ảnh này.
+    Dò xuống theo bước _Q_GALLOP (như thang cũ 80→30) rồi chia đôi trong khoảng vừa kẹp được.
+    Trả (q | None, dung lượng (đã nhân ratio) ở q thấp nhất đã thử).
+    """
+    q = _JPEG_Q_MAX if q_fail > _JPEG_Q_MAX else max(_JPEG_Q_MIN, q_fail - _Q_GALLOP)
+    min_size = None
+    while True:
+        size = int(len(_jpeg_bytes(img, q)) * ratio)
+        if size <= target_bytes:
+            break
+        q_fail, min_size = q, size
+        if q <= _JPEG_Q_MIN:
+            return None, min_size
+        q = max(_JPEG_Q_MIN, q - _Q_GALLOP)
+
+    lo = q
+    while q_fail - lo > _Q_STEP:
+        mid = (lo + q_fail) // 2
+        if len(_jpeg_bytes(img, mid)) * ratio <= target_bytes:
+            lo = mid
+        else:
+            q_fail = mid
+    return lo, min_size
+
+# ================= HELPER: PHÂN LOẠI ẢNH (line-art / ảnh chụp) =================
+# Ngưỡng (chỉnh theo số liệu thật: xem UploadResult.encode)
+_CLASSIFY_DOWNSCALE = 8        # phân loại trên ảnh thu nhỏ 1/8 mỗi chiều
+_LINE_ART_MAX_COLORS = 260     # ít màu hơn → line-art
+_LINE_ART_WHITE_SHARE = 0.5    # hoặc > 50% số MÀU là trắng-ish (kênh lớn nhất > _WHITE_LEVEL)
+_WHITE_LEVEL = 240
+_CLASSIFY_CACHE_SIZE = 4096
+
+_classify_cache: "OrderedDict[str, dict]" = OrderedDict()
+_classify_lock = threading.Lock()
+
+def file_content_key(path: str) -> str:
+    """Hash nội dung file ảnh — cùng ảnh ở đường dẫn khác vẫn trùng khoá."""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _pixels_key(im) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{im.mode}:{im.size[0]}x{im.size[1]}:".encode("ascii"))
+    h.update(im.tobytes())
+    return h.hexdigest()
+
+def _downscale_for_classify(im):
+    # Giữ đúng cách thu nhỏ cũ (RGB + BILINEAR): đổi bộ lọc (VD reduce) làm đổi số màu → một số
+    # ảnh đổi loại, PNG ↔ JPEG. Phần tăng tốc nằm ở histogram vectorized + cache theo nội dung.
+    w, h = im.size
+    return im.convert("RGB").resize(
+        (max(1, w // _CLASSIFY_DOWNSCALE), max(1, h // _CLASSIFY_DOWNSCALE)), Image.BILINEAR
+    )
+
+def _histogram_stats(small) -> dict:
+    """Một lượt vectorized: đóng gói RGB thành uint32, np.unique(return_counts) = histogram màu."""
+    arr = np.asarray(small, dtype=np.uint8).reshape(-1, 3)
+    packed = (arr[:, 0].astype(np.uint32) << 16) | (arr[:, 1].astype(np.uint32) << 8) | arr[:, 2]
+    colors, counts = np.unique(packed, return_counts=True)
+    if colors.size > 65536:  # như getcolors(maxcolors=65536) trả None → ảnh chụp
+        return {"colors": 999999, "white_colors": 0, "white_pixels": 0.0}
+    cmax = np.maximum(np.maximum(colors >> 16, (colors >> 8) & 0xFF), colors & 0xFF)
+    white = cmax > _WHITE_LEVEL
+    return {
+        "colors": int(colors.size),
+        "white_colors": int(white.sum()),
+        "white_pixels": float(counts[white].sum()) / float(max(1, packed.size)),
+    }
+
+def _getcolors_stats(small) -> dict:
+    """Dự phòng khi không có NumPy (cách cũ)."""
+    colors = small.getcolors(maxcolors=65536)
+    if not colors:
+        return {"colors": 999999, "white_colors": 0, "white_pixels": 0.0}
+    white = [c for c in colors if max(c[1]) > _WHITE_LEVEL]
+    total = sum(c[0] for c in colors)
+    return {
+        "colors": len(colors),
+        "white_colors": len(white),
+        "white_pixels": float(sum(c[0] for c in white)) / float(max(1, total)),
+    }
+
+def classify_image(im, content_key: Optional[str] = None) -> dict:
+    """
+    Line-art hay ảnh chụp. Trả dict:
+      {"line_art", "colors", "white_colors", "white_pixels", "cached", "ms"}
+    Kết quả được cache theo hash nội dung: content_key (VD file_content_key của file nguồn → trúng
+    cache thì không phải đụng tới điểm ảnh), không có thì hash ảnh đã thu nhỏ.
+    """
+    small = None
+    if content_key is None:
+        small = _downscale_for_classify(im)
+        content_key = "px:" + _pixels_key(small)
+    with _classify_lock:
+        hit = _classify_cache.get(content_key)
+        if hit is not None:
+            _classify_cache.move_to_end(content_key)
+            return {**hit, "cached": True}
+
+    t0 = time.perf_counter()
+    try:
+        if small is None:
+            small = _downscale_for_classify(im)
+        stats = _histogram_stats(small) if np is not None else _getcolors_stats(small)
+        stats["line_art"] = (
+            stats["colors"] < _LINE_ART_MAX_COLORS
+            or stats["white_colors"] > _LINE_ART_WHITE_SHARE * max(1, stats["colors"])
+        )
+    except Exception:
+        stats = {"colors": 0, "white_colors": 0, "white_pixels": 0.0, "line_art": False}
+    stats["ms"] = round((time.perf_counter() - t0) * 1000, 2)
+
+    with _classify_lock:
+        _classify_cache[content_key] = stats
+        if len(_classify_cache) > _CLASSIFY_CACHE_SIZE:
+            _classify_cache.popitem(last=False)
+    return {**stats, "cached": False}
 # ======================================================
 
 @dataclass
@@ -45,12 +218,14 @@ class UploadResult:
     error: Optional[str] = None
     provider: str = "imgbb"
     status_code: Optional[int] = None
+    # số liệu nén: phân loại ảnh (line_art/colors/white_*), mime, bytes, kích thước, thời gian
+    encode: Optional[dict] = None
 
 class ImageUploader:
     def __init__(
         self,
         api_key: Optional[str] = None,
-        provider: str = "imgbb",
+        provider: Optional[str] = None,
         timeout: int = 60,
         max_retries: int = 4,
         backoff_factor: float = 1.8,
@@ -59,14 +234,32 @@ class ImageUploader:
         max_side: Optional[int] = None,
         min_side: Optional[int] = None,
         target_bytes: Optional[int] = None,
+        # requests.Session riêng; mặc định: session dùng chung của process (http_session)
+        session=None,
+        # provider="s3": S3Store riêng; mặc định: store dùng chung cấu hình từ APPWORD_S3_* (s3_store)
+        s3_store=None,
+        # PerceptualIndex (dùng lại URL của ảnh gần giống); mặc định theo APPWORD_PHASH_INDEX (phash_index)
+        phash_index=None,
+        # UploadJournal: upload xong ghi ngay; chạy lại thì dùng lại (upload_journal)
+        journal=None,
     ):
-        self.provider = provider.lower().strip()
+        # "imgbb" (ImgBB → Catbox → local) | "s3" (S3-compatible → ImgBB → Catbox → local)
+        self.provider = (provider or os.getenv("APPWORD_UPLOAD_PROVIDER") or "imgbb").lower().strip()
+        self._s3 = s3_store
+        self._phash = phash_index
+        self._phash_loaded = phash_index is not None
+        self.journal = journal
         
         # --- LOGIC LẤY KEY MỚI ---
         # Ưu tiên 1: Key truyền trực tiếp vào hàm
         # Ưu tiên 2: Key trong file settings.json (Người dùng nhập)
-        # Ưu tiên 3: Key trong biến môi trường (Cho Dev)
-        self.api_key = api_key or get_config_api_key() or os.getenv("IMGBB_API_KEY") or ""
+        # Ưu tiên 3: Key trong biến môi trường (Cho Dev): IMGBB_API_KEYS / IMGBB_API_KEY
+        # Mỗi nguồn có thể chứa NHIỀU key (list hoặc "k1,k2") → upload xoay vòng qua pool key
+        self.api_keys = (
+            parse_keys(api_key) or get_config_api_keys()
+            or parse_keys(os.getenv("IMGBB_API_KEYS")) or parse_keys(os.getenv("IMGBB_API_KEY"))
+        )
+        self.api_key = self.api_keys[0] if self.api_keys else ""
         # -------------------------
 
         self.timeout = timeout
@@ -83,6 +276,76 @@ class ImageUploader:
         self.min_side = int(min_side or (int(env_min_side) if env_min_side else 600))
         self.target_bytes = int(target_bytes or ((int(env_target_kb) if env_target_kb else 120) * 1024))
 
+        self._pool = None  # UploadPool (nén đa process + upload đa luồng), tạo khi cần
+        self._session = session
+
+    @property
+    def key_pool(self):
+        """Pool key ImgBB dùng chung trong process (least-loaded, tự loại key lỗi xác thực/hết quota)."""
+        return key_pool_for("imgbb", self.api_keys)
+
+    @property
+    def s3(self):
+        """S3Store khi provider="s3" (None nếu không dùng S3)."""
+        if self.provider != "s3":
+            return None
+        if self._s3 is None:
+            from appword.services.s3_store import shared_store
+            self._s3 = shared_store()
+        return self._s3
+
+    @property
+    def phash(self):
+        """Chỉ mục hash cảm quan dùng chung (None nếu không bật) — nạp khi cần."""
+        if not self._phash_loaded:
+            from appword.services.phash_index import index_from_env
+            self._phash = index_from_env()
+            self._phash_loaded = True
+        return self._phash
+
+    def _phash_lookup(self, image_path: str):
+        """(chữ ký (hash, w, h) | None, URL dùng lại được | None)."""
+        if self.phash is None:
+            return None, None
+        try:
+            from appword.services.phash_index import dhash_file
+            sig = dhash_file(image_path)
+        except Exception as e:
+            self._v("pHash failed:", e)
+            return None, None
+        return sig, self.phash.lookup(*sig, providers=self._reuse_providers())
+
+    def _phash_remember(self, sig, res: UploadResult) -> None:
+        if sig is not None and res.ok and self.phash is not None:
+            self.phash.add(*sig, res.url, res.provider)
+
+    def _reuse_providers(self):
+        """Provider có URL được dùng lại (nhật ký, pHash): S3 → chỉ URL trên S3; còn lại: mọi URL."""
+        return ("s3",) if self.provider == "s3" else None
+
+    def _journal_lookup(self, image_path: str):
+        """(khoá nhật ký | None, URL đã upload ở lần chạy trước | None)."""
+        if self.journal is None:
+            return None, None
+        try:
+            key = f"{file_content_key(image_path)}:{self.max_side}:{self.min_side}:{self.target_bytes}"
+        except OSError:
+            return None, None
+        return key, self.journal.lookup(key, self._reuse_providers())
+
+    def _journal_record(self, key, image_path: str, res: UploadResult) -> None:
+        if key and res.ok and self.journal is not None:
+            self.journal.record(key, image_path, res.provider, res.url)
+
+    @property
+    def session(self):
+        """Session HTTP keep-alive (pool = số luồng upload, retry có jitter) — dùng chung giữa các uploader."""
+        if self._session is None:
+            from appword.services.http_session import shared_session
+            pool_size = self._pool.upload_workers if self._pool is not None else None
+            self._session = shared_session(pool_size, self.max_retries, self.backoff_factor)
+        return self._session
+
     # ---------- utils ----------
     def _v(self, *args):
         if self.verbose: print("[uploader]", *args)
@@ -98,10 +361,26 @@ class ImageUploader:
         return self.upload_path(p)
 
     def upload_path(self, image_path: str, suggested_name: Optional[str] = None) -> UploadResult:
+        # đã upload ở lần chạy trước (nhật ký) → dùng lại URL
+        jkey, url = self._journal_lookup(image_path)
+        if url:
+            return UploadResult(ok=True, url=url, provider="journal")
+        # ảnh gần giống ảnh đã upload (chỉ mục pHash) → dùng lại URL, không nén/upload
+        sig, url = self._phash_lookup(image_path)
+        if url:
+            self._v(f"pHash hit {os.path.basename(image_path)} → {url}")
+            res = UploadResult(ok=True, url=url, provider="phash")
+        else:
+            res = self._upload_path(image_path, suggested_name)
+            self._phash_remember(sig, res)
+        self._journal_record(jkey, image_path, res)
+        return res
+
+    def _upload_path(self, image_path: str, suggested_name: Optional[str] = None) -> UploadResult:
         try:
             pil = self._open_as_pil(image_path)
             name = suggested_name or os.path.basename(image_path) or "image.png"
-            return self._upload_or_local(pil, name)
+            return self._upload_or_local(pil, name, self._source_key(image_path))
         except Exception as e:
             self._v("Open image failed:", e)
             if Image is not None:
@@ -113,6 +392,41 @@ class ImageUploader:
                     return UploadResult(ok=False, url=None, error=f"{e} | {e2}", provider="local")
             return UploadResult(ok=False, url=None, error=str(e), provider="local")
 
+    def upload_many(self, paths) -> dict:
+        """
+        Upload cả lô ảnh: nén song song trên process pool, upload trên luồng I/O (xem upload_pool).
+        Trả {path: UploadResult}. Gọi close() khi xong lượt chạy để giải phóng process pool.
+        """
+        if self._pool is None:
+            from appword.services.upload_pool import UploadPool
+            self._pool = UploadPool(self)
+        return self._pool.upload_many(paths)
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+        if self._phash is not None:
+            self._phash.save()
+        if self.journal is not None:
+            self.journal.close()
+
+    def encode_file(self, image_path: str, suggested_name: Optional[str] = None) -> Tuple[bytes, str, str, dict]:
+        """Như encode_path nhưng kèm số liệu nén (info) — dùng cho tầng nén của UploadPool."""
+        pil = self._prepare_for_web(self._open_as_pil(image_path))
+        name = suggested_name or os.path.basename(image_path) or "image.png"
+        info: dict = {}
+        data, mime, out_name = self._encode_until_target(
+            pil, name, self.target_bytes, info, content_key=self._source_key(image_path)
+        )
+        return data, mime, out_name, info
+
+    def encode_path(self, image_path: str, suggested_name: Optional[str] = None) -> Tuple[bytes, str, str]:
+        """Chỉ nén ảnh như khi upload (KHÔNG gửi mạng). Trả (bytes, mime, tên file)."""
+        pil = self._prepare_for_web(self._open_as_pil(image_path))
+        name = suggested_name or os.path.basename(image_path) or "image.png"
+        return self._encode_until_target(pil, name, self.target_bytes, content_key=self._source_key(image_path))
+
     def upload_pil(self, pil_img, suggested_name: str = "image.png") -> UploadResult:
         try:
             return self._upload_or_local(pil_img, suggested_name)
@@ -124,15 +438,41 @@ class ImageUploader:
                 return UploadResult(ok=False, url=None, error=f"{e} | {e2}", provider="local")
 
     # ---------- core ----------
-    def _upload_or_local(self, pil_img, suggested_name: str) -> UploadResult:
+    def _source_key(self, image_path: str) -> Optional[str]:
+        """Khoá cache phân loại theo file nguồn (+ max_side vì phân loại chạy trên ảnh đã co)."""
+        try:
+            return f"file:{file_content_key(image_path)}:{self.max_side}"
+        except OSError:
+            return None
+
+    def _upload_or_local(self, pil_img, suggested_name: str, content_key: Optional[str] = None) -> UploadResult:
         pil_img = self._prepare_for_web(pil_img)
-        data_bytes, mime, out_name = self._encode_until_target(pil_img, suggested_name, self.target_bytes)
+        info: dict = {}
+        data_bytes, mime, out_name = self._encode_until_target(
+            pil_img, suggested_name, self.target_bytes, info, content_key=content_key
+        )
+        return self.upload_encoded(data_bytes, out_name, mime, info, pil_img=pil_img, suggested_name=suggested_name)
+
+    def upload_encoded(
+        self, data_bytes: bytes, out_name: str, mime: str, info: Optional[dict] = None,
+        pil_img=None, suggested_name: Optional[str] = None,
+    ) -> UploadResult:
+        """Upload bytes đã nén: (S3) → ImgBB → Catbox → lưu local (không nén lại)."""
+        info = info or {}
+        self._log_encode(data_bytes, out_name, mime, info)
+
+        # S3-compatible (nếu chọn): key theo nội dung, đã có thì không PUT lại
+        if self.provider == "s3":
+            try:
+                return UploadResult(ok=True, url=self.s3.put(data_bytes, out_name, mime), provider="s3", encode=info)
+            except Exception as e:
+                self._v("S3 upload failed → fallback ImgBB/Catbox:", e)
 
         # Imgbb trước
         if self.api_key and requests:
             try:
                 url, status = self._upload_imgbb_bytes(data_bytes, out_name, mime)
-                return UploadResult(ok=True, url=url, provider="imgbb", status_code=status)
+                return UploadResult(ok=True, url=url, provider="imgbb", status_code=status, encode=info)
             except Exception as e:
                 self._v("ImgBB upload failed → fallback Catbox:", e)
 
@@ -140,16 +480,32 @@ class ImageUploader:
         if requests:
             try:
                 url = self._upload_catbox_bytes(data_bytes, out_name, mime)
-                return UploadResult(ok=True, url=url, provider="catbox", status_code=200)
+                return UploadResult(ok=True, url=url, provider="catbox", status_code=200, encode=info)
             except Exception as e:
                 self._v("Catbox upload failed → save local:", e)
 
         # Local cuối cùng
+        return self._local_result(data_bytes, out_name, info, pil_img, suggested_name)
+
+    def _log_encode(self, data_bytes: bytes, out_name: str, mime: str, info: dict) -> None:
+        self._v(
+            f"encode {out_name}: {'line-art' if info.get('line_art') else 'photo'} "
+            f"(colors={info.get('colors')} white={info.get('white_colors')} "
+            f"white_px={info.get('white_pixels', 0):.2f}{' cached' if info.get('cached') else ''}) "
+            f"→ {mime} {len(data_bytes)//1024}KB {info.get('size')} in {info.get('encode_ms')}ms"
+        )
+
+    def _local_result(
+        self, data_bytes: bytes, out_name: str, info: dict, pil_img=None, suggested_name: Optional[str] = None,
+    ) -> UploadResult:
         try:
-            url = self._save_local_temp(pil_img, suggested_name)
-            return UploadResult(ok=False, url=url, provider="local", error="Upload failed → saved locally")
+            if pil_img is not None:
+                url = self._save_local_temp(pil_img, suggested_name or out_name)
+            else:
+                url = self._save_local_bytes(data_bytes, out_name)
+            return UploadResult(ok=False, url=url, provider="local", error="Upload failed → saved locally", encode=info)
         except Exception as e:
-            return UploadResult(ok=False, url=None, provider="local", error=str(e))
+            return UploadResult(ok=False, url=None, provider="local", error=str(e), encode=info)
 
     # ---------- prepare & encode ----------
     def _open_as_pil(self, path: str):
@@ -179,21 +535,40 @@ class ImageUploader:
         return im.resize((nw, nh), Image.LANCZOS)
 
     def _is_line_art(self, im) -> bool:
-        try:
-            sm = im.convert("RGB").resize((max(1, im.width//8), max(1, im.height//8)), Image.BILINEAR)
-            colors = sm.getcolors(maxcolors=65536)
-            uniq = len(colors) if colors else 999999
-            # ít màu + nhiều nền trắng → coi như line-art
-            whiteish = sum(1 for c in (colors or []) if max(c[1]) > 240)
-            return (uniq < 260) or (whiteish > (0.5 * (len(colors) if colors else 1)))
-        except Exception:
-            return False
+        # ít màu + nhiều nền trắng → coi như line-art (xem classify_image)
+        return classify_image(im)["line_art"]
+
+    def _encode_until_target(
+        self, im, suggested_name: str, target_bytes: int, info: Optional[dict] = None,
+        content_key: Optional[str] = None,
+    ) -> Tuple[bytes, str, str]:
+        """
+        info: dict (tuỳ chọn) nhận số liệu phân loại + kết quả nén để đo đạc.
+        content_key: khoá cache phân loại (hash file nguồn), xem classify_image.
+        """
+        t0 = time.perf_counter()
+        cls = classify_image(im, content_key)
+        data, mime, name = self._encode_for_class(im, suggested_name, target_bytes, cls["line_art"])
+        if info is not None:
+            info.update(cls)
+            info.update(mime=mime, bytes=len(data), encode_ms=round((time.perf_counter() - t0) * 1000, 1))
+            try:
+                info["size"] = Image.open(io.BytesIO(data)).size
+            except Exception:
+                info["size"] = None
+        return data, mime, name
 
-    def _encode_until_target(self, im, suggested_name: str, target_bytes: int) -> Tuple[bytes, str, str]:
-        """Nén lặp: nếu chưa đạt target thì tiếp tục giảm chất lượng/kích thước (tối thiểu min_side)."""
+    def _encode_for_class(self, im, suggested_name: str, target_bytes: int, line_art: bool) -> Tuple[bytes, str, str]:
+        """
+        Nén tới khi <= target_bytes (tối thiểu min_side):
+          - line-art: PNG palette (thử 128 → 16 màu), không đạt thì grayscale JPEG
+          - JPEG: đạt ngay ở q cao nhất thì xong; không thì dò + chia đôi chất lượng [_JPEG_Q_MIN.._JPEG_Q_MAX]
+            bằng bản nén thử (không optimize),
+            nếu q thấp nhất vẫn lớn → ước lượng tỉ lệ thu nhỏ rồi resize MỘT bước (không lặp 0.9x)
+          - chỉ bản cuối cùng mới nén optimize/progressive
+        """
         if Image is None: raise RuntimeError("Missing 'Pillow'")
         has_alpha = ("A" in im.getbands())
-        line_art = self._is_line_art(im)
 
         # bộ mã hoá
         def to_rgb_white(img):
@@ -205,84 +580,151 @@ class ImageUploader:
         # thử PNG palette mạnh cho line-art
         if line_art:
             base = (im.convert("RGBA") if has_alpha else im.convert("RGB"))
+            # (mỗi bản palette đạt là dùng luôn → nén optimize ngay, không có bản nén thử)
             for colors in (128, 64, 32, 16):
                 pal = base.convert("P", palette=Image.MEDIANCUT, colors=colors, dither=Image.FLOYDSTEINBERG)
-                b = io.BytesIO()
-                pal.save(b, format="PNG", optimize=True)
-                data = b.getvalue()
+                data = _png_bytes(pal)
                 if len(data) <= target_bytes:
                     return data, "image/png", self._force_ext(suggested_name, ".png")
-            # nếu chưa đạt: chuyển về grayscale JPEG và đi tiếp vòng lặp ở dưới
+            # nếu chưa đạt: chuyển về grayscale JPEG và đi tiếp ở dưới
             im = ImageOps.grayscale(to_rgb_white(im))
 
-        # JPEG lặp chất lượng + nếu cần giảm kích thước
-        q = 80
-        best = None
         cur = to_rgb_white(im) if im.mode not in ("L", "RGB") else im
-        while True:
-            # encode với một dải chất lượng
-            qq = q
-            while qq >= 30:
-                b = io.BytesIO()
-                cur.save(b, format="JPEG", quality=qq, optimize=True, progressive=True, subsampling="4:2:0")
-                data = b.getvalue()
-                best = (data, "image/jpeg", self._force_ext(suggested_name, ".jpg"))
-                if len(data) <= target_bytes:
-                    return best
-                qq -= 8
-            # nếu vẫn lớn → giảm kích thước 10%
+        jpg_name = self._force_ext(suggested_name, ".jpg")
+
+        # đa số ảnh đạt ngay ở q cao nhất → 1 lần nén như trước
+        data = _jpeg_bytes(cur, _JPEG_Q_MAX, final=True)
+        if len(data) <= target_bytes:
+            return data, "image/jpeg", jpg_name
+
+        # vượt xa target: ước lượng từ bản thu nhỏ xem q thấp nhất có đạt không,
+        # không đạt → thu nhỏ ngay một bước tới kích thước dự đoán
+        q_fail = _JPEG_Q_MAX
+        ratio = len(data) / float(len(_jpeg_bytes(cur, _JPEG_Q_MAX)))
+        if len(data) * _Q_MIN_RATIO > target_bytes:
+            est = _estimate_jpeg_bytes(cur, _JPEG_Q_MIN, ratio)
+            if est > target_bytes:
+                cur = self._shrink_for(cur, est, target_bytes)
+                q_fail = _JPEG_Q_MAX + 1
+
+        for _ in range(_MAX_SHRINK_ROUNDS):
+            q, trial_size = _search_jpeg_quality(cur, target_bytes, q_fail, ratio)
+            if q is not None:
+                # bản cuối: optimize + progressive (thường nhỏ hơn bản thử); hiếm khi vượt → hạ dần q
+                while True:
+                    data = _jpeg_bytes(cur, q, final=True)
+                    if len(data) <= target_bytes or q <= _JPEG_Q_MIN:
+                        return data, "image/jpeg", jpg_name
+                    q -= 1
+            # q thấp nhất vẫn lớn → thu nhỏ theo kích thước thật vừa đo
             if max(cur.size) <= self.min_side:
-                # hết cỡ giảm rồi, trả best hiện có
-                return best
-            cur = self._resize_by_factor(cur, 0.90)
+                break
+            cur = self._shrink_for(cur, trial_size, target_bytes)
+            q_fail = _JPEG_Q_MAX + 1
+
+        # hết cỡ giảm rồi, trả bản nhỏ nhất có được
+        return _jpeg_bytes(cur, _JPEG_Q_MIN, final=True), "image/jpeg", jpg_name
+
+    def _shrink_for(self, im, size: int, target_bytes: int):
+        """Dung lượng JPEG ~ tỉ lệ số pixel → cạnh nhân sqrt(target/size) (kèm biên an toàn), không nhỏ hơn min_side."""
+        factor = math.sqrt(target_bytes / float(size)) * _SHRINK_MARGIN
+        floor = min(1.0, self.min_side / float(max(im.size)))
+        return self._resize_by_factor(im, max(factor, floor))
 
     def _force_ext(self, name: str, ext: str) -> str:
         base, _ = os.path.splitext(os.path.basename(name) or "image")
         return f"{base}{ext}"
 
     # ---------- uploaders ----------
-    def _upload_imgbb_bytes(self, data_bytes: bytes, filename: str, mime: str):
+    # form/parse tách riêng để engine async (async_upload) dùng lại đúng cùng giao thức
+    def _imgbb_form(self, data_bytes: bytes, filename: str, mime: str, key: Optional[str] = None):
+        if not requests: raise RuntimeError("Missing 'requests'")
+        key = key or self.api_key
+        if not key: raise RuntimeError("Missing IMGBB_API_KEY")
+        return {"key": key}, {"image": (filename, data_bytes, mime)}
+
+    def _catbox_form(self, data_bytes: bytes, filename: str, mime: str):
         if not requests: raise RuntimeError("Missing 'requests'")
-        if not self.api_key: raise RuntimeError("Missing IMGBB_API_KEY")
-        url = "https://api.imgbb.com/1/upload"
-        files = {"image": (filename, data_bytes, mime)}
-        data = {"key": self.api_key}
-        last_err = None
-        for attempt in range(1, self.max_retries + 1):
+        return {"reqtype": "fileupload"}, {"fileToUpload": (filename, data_bytes, mime)}
+
+    def _upload_imgbb_bytes(self, data_bytes: bytes, filename: str, mime: str):
+        # key ít tải nhất trong pool; key lỗi xác thực/hết quota bị loại → thử key kế tiếp
+        pool, tried, last_err = self.key_pool, [], None
+        while True:
+            key = pool.pick(exclude=tried)
+            if key is None:
+                raise RuntimeError(last_err or "Missing IMGBB_API_KEY")
+            tried.append(key)
+            data, files = self._imgbb_form(data_bytes, filename, mime, key)
             try:
-                r = requests.post(url, data=data, files=files, timeout=self.timeout)
-                status = r.status_code
-                try:
-                    js = r.json()
-                except Exception:
-                    js = {}
-                if status == 200 and js.get("success"):
-                    direct = js.get("data", {}).get("image", {}).get("url") or js.get("data", {}).get("url")
-                    if not direct:
-                        raise RuntimeError("No direct image url in response.")
-                    return direct, status
-                self._v(f"ImgBB HTTP {status}: {js or r.text}")
-                if status in (408, 429, 500, 502, 503, 504):
-                    last_err = f"HTTP {status}"
-                    time.sleep(self.backoff_factor * attempt); continue
-                raise RuntimeError(f"Upload failed (status {status}): {js or r.text}")
+                r = self._post(limiter_for("imgbb", key), IMGBB_URL, data, files)
             except Exception as e:
-                last_err = str(e)
-                self._v(f"Attempt {attempt} error:", last_err)
-                time.sleep(self.backoff_factor * attempt)
-        raise RuntimeError(f"ImgBB upload failed after retries: {last_err}")
+                pool.report(key, None, str(e))
+                raise RuntimeError(f"ImgBB upload failed after retries: {e}")
+            if pool.report(key, r.status_code, r.text, parse_retry_after(r.headers.get("Retry-After"))) in ("auth", "quota"):
+                last_err = f"ImgBB key rejected (status {r.status_code}): {r.text[:200]}"
+                continue
+            return self._imgbb_result(r)
+
+    def _imgbb_result(self, r):
+        status = r.status_code
+        try:
+            js = r.json()
+        except Exception:
+            js = {}
+        if status == 200 and js.get("success"):
+            direct = js.get("data", {}).get("image", {}).get("url") or js.get("data", {}).get("url")
+            if not direct:
+                raise RuntimeError("No direct image url in response.")
+            return direct, status
+        self._v(f"ImgBB HTTP {status}: {js or r.text}")
+        raise RuntimeError(f"Upload failed (status {status}): {js or r.text}")
 
     def _upload_catbox_bytes(self, data_bytes: bytes, filename: str, mime: str) -> str:
-        if not requests: raise RuntimeError("Missing 'requests'")
-        url = "https://catbox.moe/user/api.php"
-        files = {"fileToUpload": (filename, data_bytes, mime)}
-        data = {"reqtype": "fileupload"}
-        resp = requests.post(url, data=data, files=files, timeout=self.timeout)
+        data, files = self._catbox_form(data_bytes, filename, mime)
+        return self._catbox_result(self._post(limiter_for("catbox"), CATBOX_URL, data, files))
+
+    def _post(self, limiter, url: str, data: dict, files: dict):
+        """
+        POST đồng bộ qua limiter của (provider, key) — cùng bucket + AIMD với engine async.
+        Chỉ thử lại 429/503 (chờ Retry-After hoặc backoff jitter); lỗi kết nối do adapter của session
+        thử lại. Timeout đọc / 5xx khác KHÔNG thử lại: server có thể đã lưu ảnh → upload trùng.
+        """
+        attempts = max(1, self.max_retries)
+        for attempt in range(1, attempts + 1):
+            limiter.bucket.acquire_blocking()
+            limiter.aimd.acquire_blocking()
+            outcome = "error"
+            try:
+                r = self.session.post(url, data=data, files=files, timeout=self.timeout)
+                if r.status_code not in THROTTLE_STATUSES or attempt == attempts:
+                    outcome = "ok" if r.status_code < 400 else "error"
+                    return r
+                outcome = "throttled"
+                wait = parse_retry_after(r.headers.get("Retry-After"))
+                limiter.throttled(wait)
+                self._v(f"HTTP {r.status_code} → thử lại (lần {attempt}, cửa sổ {limiter.aimd.window})")
+            finally:
+                limiter.aimd.release(outcome)
+            # Retry-After đã khoá bucket; không có thì backoff lũy thừa + full jitter
+            if wait is None:
+                time.sleep(random.uniform(0, self.backoff_factor * 2 ** (attempt - 1)))
+
+    def _catbox_result(self, resp) -> str:
         if resp.status_code == 200 and resp.text.startswith("http"):
             return resp.text.strip()
         raise RuntimeError(f"Catbox error {resp.status_code}: {resp.text}")
 
     # ---------- local fallback ----------
+    def _save_local_bytes(self, data_bytes: bytes, name: str) -> str:
+        tmp = os.path.join(tempfile.gettempdir(), "appword_images")
+        os.makedirs(tmp, exist_ok=True)
+        base, ext = os.path.splitext(os.path.basename(name) or "image.jpg")
+        out = os.path.join(tmp, f"{base}_{int(time.time()*1000)}{ext or '.jpg'}")
+        with open(out, "wb") as f:
+            f.write(data_bytes)
+        return "file://" + out
+
     def _save_local_temp(self, pil_img, suggested_name: str) -> str:
         if Image is None: raise RuntimeError("Missing 'Pillow'")
         tmp = os.path.join(tempfile.gettempdir(), "appword_images")
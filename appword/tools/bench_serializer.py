@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark serializer câu hỏi Moodle.
+
+So sánh trên ngân hàng N câu (mặc định 10k, trộn MCQ / KPrime / SA):
+  - "legacy": serializer trước khi có write_xml (chép nguyên vào đây làm mốc): mỗi câu dựng list
+              dòng rồi "\\n".join, cả quiz join thành một chuỗi rồi ghi một lần
+  - "join":   to_xml() mới (write_xml vào list) nhưng vẫn join cả quiz rồi ghi một lần
+  - "stream": MoodleQuizWriter — q.write_xml(f.write) thẳng vào file có buffer
+In thời gian và đỉnh bộ nhớ cấp phát (tracemalloc) của từng cách.
+
+    python -m appword.tools.bench_serializer --n 10000
+"""
+from __future__ import annotations
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from appword.moodle_questions import (
+    ChoiceTFQuestion, MoodleQuizWriter, MultiChoiceQuestion, ShortAnswerQuestion,
+)
+from appword.moodle_questions.utils import xml_escape
+
+
+def make_bank(n: int) -> list:
+    body = "Cho hàm số <b>y = x^2</b>. " * 8
+    qs = []
+    for i in range(n):
+        name = f"TO12.04.1.F{i:05d} Câu {i}"
+        if i % 3 == 0:
+            answers = [(f"Phương án {c} {body[:40]}", 100 if c == "A" else 0) for c in "ABCD"]
+            qs.append(MultiChoiceQuestion(name, body, answers, "Lời giải " + body))
+        elif i % 3 == 1:
+            pairs = [(f"Mệnh đề {c} {body[:40]}", c in "ac") for c in "abcd"]
+            qs.append(ChoiceTFQuestion(name, body, pairs, general_feedback_html="Lời giải " + body))
+        else:
+            qs.append(ShortAnswerQuestion(name, body, ["1,5", "1.5"], "Lời giải " + body))
+    return qs
+
+
+# ========= Mốc: to_xml() của các lớp câu hỏi trước khi có write_xml (giữ nguyên logic) =========
+def _legacy_multichoice(q) -> str:
+    lines = []
+    lines.append('<question type="multichoice">')
+    lines.append(f'  <name><text>{xml_escape(q.name)}</text></name>')
+    lines.append('  <questiontext format="html">')
+    lines.append(f'    <text><![CDATA[{q.questiontext_html}]]></text>')
+    lines.append('  </questiontext>')
+    lines.append('  <generalfeedback format="html">')
+    lines.append(f'    <text><![CDATA[{q.generalfeedback_html}]]></text>')
+    lines.append('  </generalfeedback>')
+    lines.append(f'  <shuffleanswers>{"true" if q.shuffleanswers else "false"}</shuffleanswers>')
+    lines.append(f'  <single>{"true" if q.single else "false"}</single>')
+    lines.append(f'  <answernumbering>{xml_escape(q.answernumbering)}</answernumbering>')
+    lines.append(f'  <defaultgrade>{q.defaultgrade:g}</defaultgrade>')
+    lines.append(f'  <penalty>{q.penalty}</penalty>')
+    lines.append(f'  <hidden>{q.hidden}</hidden>')
+    for ans in q.answers:
+        text_html = str(ans[0]) if len(ans) >= 1 else ""
+        frac = float(ans[1]) if len(ans) >= 2 else 0.0
+        fraction = int(frac*100) if 0.0 <= frac <= 1.0 else int(frac)
+        feedback_html = str(ans[2]) if len(ans) >= 3 else ""
+        lines.append(f'  <answer fraction="{int(fraction)}">')
+        lines.append(f'    <text><![CDATA[{text_html}]]></text>')
+        if feedback_html:
+            lines.append('    <feedback format="html">')
+            lines.append(f'      <text><![CDATA[{feedback_html}]]></text>')
+            lines.append('    </feedback>')
+        lines.append('  </answer>')
+    lines.append('</question>')
+    return "\n".join(lines)
+
+
+def _legacy_kprime(q) -> str:
+    out = []
+    out.append('<question type="kprime">')
+    out.append(f'  <name><text>{xml_escape(q.name)}</text></name>')
+    out.append('  <questiontext format="html">')
+    out.append(f'    <text><![CDATA[{q.text_html}]]></text>')
+    out.append('  </questiontext>')
+    if q.general_feedback_html:
+        out.append('  <generalfeedback format="html">')
+        out.append(f'    <text><![CDATA[{q.general_feedback_html}]]></text>')
+        out.append('  </generalfeedback>')
+    out.append('  <defaultgrade>1</defaultgrade>')
+    out.append('  <penalty>0.3333333</penalty>')
+    out.append(f'  <hidden>{q.hidden}</hidden>')
+    out.append(f'  <scoringmethod>{xml_escape(q.scoringmethod)}</scoringmethod>')
+    out.append(f'  <shuffleanswers>{"true" if q.shuffleanswers else "false"}</shuffleanswers>')
+    out.append(f'  <numberofrows>{len(q.pairs)}</numberofrows>')
+    out.append('  <numberofcolumns>2</numberofcolumns>')
+    for i, (stmt_html, _) in enumerate(q.pairs, start=1):
+        out.append(f'  <row number="{i}">')
+        out.append('    <optiontext format="html">')
+        out.append(f'      <text><![CDATA[{stmt_html}]]></text>')
+        out.append('    </optiontext>')
+        out.append('    <feedbacktext format="html"><text></text></feedbacktext>')
+        out.append('  </row>')
+    out.append('  <column number="1">')
+    out.append('    <responsetext>True</responsetext>')
+    out.append('  </column>')
+    out.append('  <column number="2">')
+    out.append('    <responsetext>False</responsetext>')
+    out.append('  </column>')
+    for i, (_, is_true) in enumerate(q.pairs, start=1):
+        if is_true:
+            out.append(f'  <weight rownumber="{i}" columnnumber="1"><value>1.000</value></weight>')
+            out.append(f'  <weight rownumber="{i}" columnnumber="2"><value>0.000</value></weight>')
+        else:
+            out.append(f'  <weight rownumber="{i}" columnnumber="1"><value>0.000</value></weight>')
+            out.append(f'  <weight rownumber="{i}" columnnumber="2"><value>1.000</value></weight>')
+    out.append('</question>')
+    return "\n".join(out)
+
+
+def _legacy_shortanswer(q) -> str:
+    lines = []
+    lines.append('<question type="shortanswer">')
+    lines.append(f'  <name><text>{xml_escape(q.name)}</text></name>')
+    lines.append('  <questiontext format="html">')
+    lines.append(f'    <text><![CDATA[{q.questiontext_html}]]></text>')
+    lines.append('  </questiontext>')
+    lines.append('  <generalfeedback format="html">')
+    lines.append(f'    <text><![CDATA[{q.generalfeedback_html}]]></text>')
+    lines.append('  </generalfeedback>')
+    lines.append(f'  <defaultgrade>{q.defaultgrade:g}</defaultgrade>')
+    lines.append(f'  <penalty>{q.penalty}</penalty>')
+    lines.append(f'  <hidden>{q.hidden}</hidden>')
+    lines.append(f'  <usecase>{q.usecase}</usecase>')
+    for ans in q.answers:
+        if isinstance(ans, (tuple, list)):
+            text_val = str(ans[0]) if len(ans) >= 1 else ""
+            frac = float(ans[1]) if len(ans) >= 2 else 100.0
+            fraction = int(frac*100) if 0.0 <= frac <= 1.0 else int(frac)
+            feedback_html = str(ans[2]) if len(ans) >= 3 else ""
+        else:
+            text_val = str(ans)
+            fraction = 100
+            feedback_html = ""
+        lines.append(f'  <answer fraction="{int(fraction)}">')
+        lines.append(f'    <text><![CDATA[{text_val}]]></text>')
+        if feedback_html:
+            lines.append('    <feedback format="html">')
+            lines.append(f'      <text><![CDATA[{feedback_html}]]></text>')
+            lines.append('    </feedback>')
+        lines.append('  </answer>')
+    lines.append('</question>')
+    return "\n".join(lines)
+
+
+_LEGACY = {
+    MultiChoiceQuestion: _legacy_multichoice,
+    ChoiceTFQuestion: _legacy_kprime,
+    ShortAnswerQuestion: _legacy_shortanswer,
+}
+
+
+def _legacy(qs, path):
+    xml = "\n".join(_LEGACY[type(q)](q) for q in qs)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" ?>\n<quiz>\n' + xml + "\n</quiz>")
+
+
+def _join(qs, path):
+    xml = "\n".join(q.to_xml() for q in qs)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" ?>\n<quiz>\n' + xml + "\n</quiz>")
+
+
+def _stream(qs, path):
+    with MoodleQuizWriter(path) as quiz:
+        for q in qs:
+            quiz.add_question(q)
+
+
+def _measure(fn, qs, path):
+    # đo thời gian KHÔNG bật tracemalloc (tracemalloc làm chậm mọi cấp phát)
+    t0 = time.perf_counter()
+    fn(qs, path)
+    dt = time.perf_counter() - t0
+    tracemalloc.start()
+    fn(qs, path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return dt, peak, os.path.getsize(path)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--n", type=int, default=10000)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args(argv)
+
+    qs = make_bank(args.n)
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, fn in (("legacy", _legacy), ("join", _join), ("stream", _stream)):
+            runs = [_measure(fn, qs, os.path.join(tmp, f"{label}.xml")) for _ in range(args.repeat)]
+            dt = min(r[0] for r in runs)
+            peak = min(r[1] for r in runs)
+            size = runs[0][2]
+            print(f"{label:>6}: {dt*1000:8.1f} ms | peak alloc {peak/1024/1024:7.2f} MiB | {size/1024/1024:.2f} MiB XML")
+        with open(os.path.join(tmp, "legacy.xml"), "rb") as f:
+            base = f.read()
+        for label in ("join", "stream"):
+            with open(os.path.join(tmp, f"{label}.xml"), "rb") as f:
+                same = f.read() == base
+            print(f"{label:>6}: XML {'giống hệt' if same else 'KHÁC'} legacy")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-from typing import Any, Dict
+from typing import Any, Dict, List
 from appword.services.uploader import ImageUploader
 
 def _is_str(s): 
@@ -11,44 +11,63 @@ def _is_url(s: str) -> bool:
     ss = s.strip().lower()
     return ss.startswith(("http://","https://","file://"))
 
-def _upload_and_get_url(uploader: ImageUploader, path_or_url: str, what: str) -> str:
+def _upload_and_get_url(uploader: ImageUploader, path_or_url: str, what: str, results=None) -> str:
     if not _is_str(path_or_url):
         return ""
     if _is_url(path_or_url):
         return path_or_url
-    res = uploader.upload_url_or_path(path_or_url)
+    res = (results or {}).get(path_or_url) or uploader.upload_url_or_path(path_or_url)
     url = res.url or ""
     if not url or not _is_url(url):
         print(f"[WARN] Cannot upload image for {what}: {path_or_url} | provider={res.provider} ok={res.ok} err={res.error}")
         return ""
     return url
 
-def attach_image_links_in_question(q: Dict[str, Any], uploader: ImageUploader) -> Dict[str, Any]:
+def _local_images(q: Dict[str, Any], skip) -> List[str]:
+    """Các ảnh local của 1 câu sẽ phải upload (theo đúng thứ tự/điều kiện của attach_image_links_in_question)."""
+    out = []
+    qi = q.get("question_image")
+    if _is_str(qi) and not skip(qi):
+        out.append(qi)
+    for opt in q.get("options", []):
+        if isinstance(opt, dict) and _is_str(opt.get("option_image")) and not skip(opt["option_image"]):
+            out.append(opt["option_image"])
+    exp = q.get("explanation")
+    if isinstance(exp, dict) and _is_str(exp.get("image")) and not skip(exp["image"]):
+        out.append(exp["image"])
+    return [p for p in out if not _is_url(p)]
+
+def attach_image_links_in_question(q: Dict[str, Any], uploader: ImageUploader, skip=None, results=None) -> Dict[str, Any]:
+    """
+    skip(path) -> True: bỏ qua upload (ảnh sẽ được nhúng thẳng vào XML).
+    results: {path: UploadResult} đã upload sẵn theo lô (uploader.upload_many).
+    """
+    skip = skip or (lambda _p: False)
     found = ok = 0
 
     # Question image
     qi = q.get("question_image")
-    if _is_str(qi):
+    if _is_str(qi) and not skip(qi):
         found += 1
-        url = _upload_and_get_url(uploader, qi, "question_image")
+        url = _upload_and_get_url(uploader, qi, "question_image", results)
         if url:
             q["question_image_url"] = url
             ok += 1
 
     # Options
     for idx, opt in enumerate(q.get("options", [])):
-        if isinstance(opt, dict) and _is_str(opt.get("option_image")):
+        if isinstance(opt, dict) and _is_str(opt.get("option_image")) and not skip(opt["option_image"]):
             found += 1
-            url = _upload_and_get_url(uploader, opt["option_image"], f"option_image[{idx}]")
+            url = _upload_and_get_url(uploader, opt["option_image"], f"option_image[{idx}]", results)
             if url:
                 opt["option_image_url"] = url
                 ok += 1
 
     # Explanation
     exp = q.get("explanation")
-    if isinstance(exp, dict) and _is_str(exp.get("image")):
+    if isinstance(exp, dict) and _is_str(exp.get("image")) and not skip(exp["image"]):
         found += 1
-        url = _upload_and_get_url(uploader, exp["image"], "explanation.image")
+        url = _upload_and_get_url(uploader, exp["image"], "explanation.image", results)
         if url:
             exp["image_url"] = url
             ok += 1
@@ -57,16 +76,20 @@ def attach_image_links_in_question(q: Dict[str, Any], uploader: ImageUploader) -
         print(f"[attach_image_links] images_found={found} images_with_url={ok}")
     return q
 
-def attach_image_links(data, uploader: ImageUploader):
+def attach_image_links(data, uploader: ImageUploader, skip=None):
     if isinstance(data, dict):
-        return attach_image_links_in_question(data, uploader)
+        return attach_image_links_in_question(data, uploader, skip)
     if isinstance(data, list):
+        # nén (process pool) + upload (luồng I/O) cả lô một lượt, rồi gắn URL theo từng câu
+        skip_fn = skip or (lambda _p: False)
+        paths = [p for item in data if isinstance(item, dict) for p in _local_images(item, skip_fn)]
+        results = uploader.upload_many(paths) if len(set(paths)) > 1 else None
         cnt_found = cnt_ok = 0
         out = []
         for idx, item in enumerate(data):
             if isinstance(item, dict):
                 before = (cnt_found, cnt_ok)
-                item = attach_image_links_in_question(item, uploader)
+                item = attach_image_links_in_question(item, uploader, skip, results)
                 # thô: do attach_image_links_in_question đã in, không cần tăng thêm
             out.append(item)
         return out
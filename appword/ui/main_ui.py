@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 import os
 import sys
+import multiprocessing
 import re
 import json
 import uuid
@@ -22,6 +23,7 @@ except ModuleNotFoundError:
     if ROOT not in sys.path:
         sys.path.insert(0, ROOT)
     from appword.services.pipeline import run_pipeline
+from appword.core.serialization import read_file
 
 APP_NAME = "Moodle Questions"
 APP_VERSION = "1.2.0"
@@ -137,7 +139,7 @@ def _count_images_in_question(q: dict) -> Tuple[int, int]:
 
 def _stats_from_uploaded_json(json_path: Path) -> Dict[str, int]:
     try:
-        data = json.loads(json_path.read_text(encoding="utf-8"))
+        data = read_file(json_path)  # JSON / MessagePack (tự nhận diện)
     except Exception:
         return dict(questions=0, multichoice=0, kprime=0, shortanswer=0,
                     images_online=0, images_total=0)
@@ -922,6 +924,8 @@ class MainUI(QtWidgets.QWidget):
         return parts[-1] if parts else ""
 
 if __name__ == "__main__":
+    # exe đóng gói (PyInstaller): process con của pool nén ảnh dừng ở đây, không mở lại GUI
+    multiprocessing.freeze_support()
     QtWidgets.QApplication.setAttribute(QtCore.Qt.AA_EnableHighDpiScaling, True)
     app = QtWidgets.QApplication(sys.argv)
     win = MainUI()
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""Cache XML từng câu: câu có ảnh upload lỗi (fallback file://) không được cache."""
+from __future__ import annotations
+
+from pathlib import Path
+
+from appword.core.exporter import build_quiz_from_questions
+from appword.services.uploader import UploadResult
+
+
+class _Uploader:
+    """Uploader giả: trả lần lượt các URL cho trước, đếm số lần upload."""
+
+    def __init__(self, urls):
+        self.urls = list(urls)
+        self.calls = 0
+
+    def upload_url_or_path(self, path):
+        self.calls += 1
+        return UploadResult(ok=True, url=self.urls.pop(0))
+
+    def upload_many(self, paths):
+        return {p: self.upload_url_or_path(p) for p in dict.fromkeys(paths)}
+
+    def close(self):
+        pass
+
+
+def _export(tmp_path: Path, image: Path, uploader) -> str:
+    data = [{
+        "question_type": "multichoice",
+        "question_name": "Q1",
+        "question_content": "Câu 1",
+        "question_image": str(image),
+        "options": [{"letter": "A", "option_text": "a"}, {"letter": "B", "option_text": "b"}],
+        "correct_answer": ["A"],
+    }]
+    out = tmp_path / "moodle.xml"
+    build_quiz_from_questions(data, xml_out=str(out), fragment_cache=True, uploader=uploader)
+    return out.read_text(encoding="utf-8")
+
+
+def test_failed_upload_is_not_cached(tmp_path):
+    image = tmp_path / "hinh.png"
+    image.write_bytes(b"\x89PNG not really")
+
+    failed = _Uploader([f"file://{tmp_path}/appword_images/hinh.jpg"])
+    assert "file://" in _export(tmp_path, image, failed)
+
+    # lần sau phải upload lại, không ghép XML file:// từ cache
+    ok = _Uploader(["https://img.example/hinh.jpg"])
+    xml = _export(tmp_path, image, ok)
+    assert ok.calls == 1
+    assert "file://" not in xml and "https://img.example/hinh.jpg" in xml
+
+    # đã upload được → lần thứ ba lấy từ cache, không upload
+    again = _Uploader([])
+    assert "https://img.example/hinh.jpg" in _export(tmp_path, image, again)
+    assert again.calls == 0
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""Chỉ mục pHash: hình vẽ chỉ khác nhãn không được dùng lại URL của nhau."""
+from __future__ import annotations
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+from PIL import ImageDraw, ImageFont  # noqa: E402
+
+from appword.services.phash_index import PerceptualIndex, dhash_file  # noqa: E402
+
+
+def _triangle(path, labels, altitude=False, size=600):
+    im = Image.new("RGB", (size, size), "white")
+    d = ImageDraw.Draw(im)
+    a, b, c = (300, 60), (60, 510), (540, 510)
+    d.polygon([a, b, c], outline="black", width=3)
+    try:
+        font = ImageFont.truetype("DejaVuSans.ttf", 30)
+    except OSError:
+        font = ImageFont.load_default()
+    for (x, y), text, (dx, dy) in zip((a, b, c), labels, ((-8, -40), (-35, 5), (10, 5))):
+        d.text((x + dx, y + dy), text, fill="black", font=font)
+    if altitude:
+        d.line([a, (300, 510)], fill="black", width=3)
+    im.save(path)
+    return im
+
+
+def test_labels_only_difference_is_not_reused(tmp_path):
+    _triangle(tmp_path / "abc.png", "ABC")
+    _triangle(tmp_path / "xyz.png", "XYZ")
+    idx = PerceptualIndex()
+    idx.add(*dhash_file(str(tmp_path / "abc.png")), "https://img.example/abc.png")
+    assert idx.lookup(*dhash_file(str(tmp_path / "xyz.png"))) is None
+
+
+def test_extra_line_is_not_reused(tmp_path):
+    _triangle(tmp_path / "plain.png", "ABC")
+    _triangle(tmp_path / "altitude.png", "ABC", altitude=True)
+    idx = PerceptualIndex(max_distance=7)
+    idx.add(*dhash_file(str(tmp_path / "plain.png")), "https://img.example/plain.png")
+    assert idx.lookup(*dhash_file(str(tmp_path / "altitude.png"))) is None
+
+
+def test_resaved_copy_is_reused(tmp_path):
+    im = _triangle(tmp_path / "abc.png", "ABC")
+    im.resize((480, 480), Image.LANCZOS).save(tmp_path / "abc.jpg", quality=60)
+    idx = PerceptualIndex()
+    idx.add(*dhash_file(str(tmp_path / "abc.png")), "https://img.example/abc.png")
+    assert idx.lookup(*dhash_file(str(tmp_path / "abc.jpg"))) == "https://img.example/abc.png"
+
+
+def test_index_round_trip(tmp_path):
+    _triangle(tmp_path / "abc.png", "ABC")
+    sig = dhash_file(str(tmp_path / "abc.png"))
+    idx = PerceptualIndex(str(tmp_path / "index.json"))
+    idx.add(*sig, "https://img.example/abc.png")
+    idx.save()
+    assert PerceptualIndex(str(tmp_path / "index.json")).lookup(*sig) == "https://img.example/abc.png"
+
+
+def test_lookup_filters_on_provider(tmp_path):
+    _triangle(tmp_path / "abc.png", "ABC")
+    sig = dhash_file(str(tmp_path / "abc.png"))
+    idx = PerceptualIndex(str(tmp_path / "index.json"))
+    idx.add(*sig, "https://i.ibb.co/abc.png", "imgbb")
+    idx.save()
+    idx = PerceptualIndex(str(tmp_path / "index.json"))
+    assert idx.lookup(*sig, providers=("s3",)) is None
+    assert idx.lookup(*sig) == "https://i.ibb.co/abc.png"
+    idx.add(*sig, "https://bucket.example/abc.png", "s3")
+    assert idx.lookup(*sig, providers=("s3",)) == "https://bucket.example/abc.png"
@@ -1,22 +1,41 @@
 import streamlit as st
 import os
-import shutil
 import tempfile
-import zipfile
+import hashlib
 import time
-from pathlib import Path
 import extra_streamlit_components as stx
 import sys
+from pathlib import Path
 
 # --- CẤU HÌNH HỆ THỐNG ---
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 try:
-    from appword.services.pipeline import run_pipeline
+    from appword.services.jobs import job_manager
+    from appword.services.upload_spool import UploadSpool, cleanup_spools
 except ImportError as e:
     st.error(f"Lỗi: {e}"); st.stop()
 
 st.set_page_config(page_title="Word to Moodle", page_icon="📝", layout="wide", initial_sidebar_state="expanded")
 
+@st.cache_resource
+def _shared_jobs():
+    """Dùng chung cả process (mọi phiên, mọi lần rerun): hàng đợi job + worker đã khởi động sẵn
+    (import python-docx/PIL/pandas, nạp sẵn mapping ID/*.xlsx)."""
+    jobs = job_manager()
+    jobs.warm(os.path.join(os.getcwd(), "ID"))
+    # API HTTP cho script tự động chạy cùng process → chung pool worker và cache với giao diện.
+    # Luôn cần APPWORD_API_TOKEN: thiếu token thì chỉ báo lỗi, giao diện vẫn chạy.
+    if os.getenv("APPWORD_API_PORT"):
+        from appword.services.http_api import start_background
+        try:
+            start_background(
+                jobs, os.getenv("APPWORD_API_HOST", "127.0.0.1"), int(os.getenv("APPWORD_API_PORT")),
+                require_token=True,
+            )
+        except (RuntimeError, ValueError, OSError) as e:
+            print(f"[API] Không khởi động API: {e}")
+    return jobs
+
 # --- CSS SIÊU GỌN ---
 st.markdown("""
 <style>
@@ -80,6 +99,8 @@ with st.sidebar:
     c_user.caption(f"👤 {st.session_state.get('user_email', 'User')}")
     if c_out.button("🚪", help="Đăng xuất"):
         cookie_manager.delete("user_email")
+        if "spool_id" in st.session_state:
+            UploadSpool(st.session_state["spool_id"]).destroy()
         st.session_state.clear()
         st.rerun()
     
@@ -132,78 +153,104 @@ with st.sidebar:
 # ================= MAIN SCREEN =================
 st.title("📝 Chuyển đổi Word ➡️ Moodle")
 
+# Vùng đệm đĩa của phiên: file upload được ghi xuống đĩa theo khúc rồi widget được làm mới
+# (đổi key) → Streamlit bỏ bản trong RAM, không giữ suốt phiên
+if "spool_id" not in st.session_state:
+    cleanup_spools()  # phiên cũ quá TTL
+    st.session_state["spool_id"] = UploadSpool().session_id
+spool = UploadSpool(st.session_state["spool_id"])
+
 # Upload (Container to rõ)
 with st.container():
-    uploaded_files = st.file_uploader("Kéo thả file .docx vào đây", type=['docx'], accept_multiple_files=True)
+    gen = st.session_state.get("uploader_gen", 0)
+    new_files = st.file_uploader("Kéo thả file .docx vào đây", type=['docx'], accept_multiple_files=True, key=f"docx_{gen}")
+if new_files:
+    for uf in new_files:
+        spool.add(uf.name, uf)
+    st.session_state["uploader_gen"] = gen + 1
+    st.rerun()
+
+uploaded_files = spool.files()
+if uploaded_files:
+    c_files, c_clear = st.columns([5, 1])
+    c_files.caption(f"📎 {len(uploaded_files)} file ({spool.total_bytes() / 1e6:.1f} MB): " + ", ".join(n for n, _, _ in uploaded_files))
+    if c_clear.button("🗑️ Xoá file", use_container_width=True):
+        spool.clear()
+        st.rerun()
+
+# Nhiều key: nhập "k1,k2" hoặc khai báo list imgbb_keys trong secrets → upload xoay vòng qua các key
+run_key = api_key
+if not run_key:
+    try: run_key = st.secrets["general"].get("imgbb_keys") or st.secrets["general"]["default_imgbb_key"]
+    except: pass
+
+# Job chạy nền theo người dùng: refresh / rerun / người khác bấm XỬ LÝ không làm mất việc đang chạy
+user_tag = hashlib.sha1(st.session_state.get("user_email", "").encode("utf-8")).hexdigest()[:12]
+jobs = _shared_jobs()
 
 if uploaded_files:
     # Nút bấm to màu xanh
     if st.button(f"🚀 XỬ LÝ {len(uploaded_files)} FILE NGAY", type="primary", use_container_width=True):
-        
-        # Check config
-        run_key = api_key
-        if not run_key:
-            try: run_key = st.secrets["general"]["default_imgbb_key"]
-            except: pass
-            
         if not final_map:
             st.warning("⚠️ Vui lòng chọn File ID Mapping ở thanh bên trái trước!")
             st.stop()
-        
-        # Process
-        with tempfile.TemporaryDirectory() as tmp:
-            base = Path(tmp)
-            i_dir, o_dir, m_dir = base/"in", base/"out", base/"map"
-            for d in [i_dir, o_dir, m_dir]: d.mkdir()
-            
-            # Save inputs
-            map_arg = None
-            if isinstance(final_map, str): # Là đường dẫn file có sẵn
-                shutil.copy(final_map, m_dir / os.path.basename(final_map))
-            else: # Là file upload
-                with open(m_dir / final_map.name, "wb") as f:
-                    f.write(final_map.getbuffer())
-            map_arg = str(m_dir)
-            
-            for uf in uploaded_files:
-                with open(i_dir / uf.name, "wb") as f:
-                    f.write(uf.getbuffer())
-            
-            # Run
-            status = st.status("Đang chạy...", expanded=True)
-            prog = status.progress(0)
-            
-            try:
-                # Hàm cập nhật tiến trình
-                def on_prog(c, t, m):
-                    percent = min(int((c / t) * 100), 99)
-                    prog.progress(percent)
-                    status.write(f"⚙️ {m}")
-
-                run_pipeline(str(i_dir), str(o_dir), run_key, on_prog, map_arg)
-                
-                status.update(label="✅ Xong!", state="complete", expanded=False)
-                
-                # Zip
-                z_path = base/"ket_qua.zip"
-                with zipfile.ZipFile(z_path, 'w', zipfile.ZIP_DEFLATED) as z:
-                    for r, _, fs in os.walk(o_dir):
-                        for f in fs:
-                            z.write(os.path.join(r, f), os.path.relpath(os.path.join(r, f), str(o_dir)))
-                
-                # Download
-                with open(z_path, "rb") as f:
-                    st.download_button(
-                        label="📥 TẢI KẾT QUẢ",
-                        data=f,
-                        file_name="ket_qua_moodle.zip",
-                        mime="application/zip",
-                        type="primary",
-                        use_container_width=True
-                    )
-                    
-            except Exception as e:
-                status.update(label="❌ Lỗi", state="error")
-                st.error(f"Chi tiết lỗi: {str(e)}")
+
+        # Save inputs vào thư mục job (mapping: đường dẫn file có sẵn hoặc file upload)
+        mapping = [final_map] if isinstance(final_map, str) else [(final_map.name, final_map.getvalue())]
+        # Nhật ký upload theo người dùng, nằm ngoài thư mục job → phiên bị ngắt thì lần chạy lại
+        # chỉ upload các ảnh còn thiếu
+        journal = os.path.join(tempfile.gettempdir(), "appword_journal", f"{user_tag}.jsonl")
+        job_id = jobs.submit(
+            user_tag, [(name, path) for name, path, _ in uploaded_files], mapping, run_key, journal,
+        )
+        st.session_state.setdefault("jobs", {})[job_id] = jobs.status(job_id)
+        st.toast("Đã xếp hàng xử lý!")
 else:
     st.info("👈 Cài đặt ở thanh bên trái, sau đó upload file để bắt đầu.")
+
+# ================= JOBS =================
+my_jobs = jobs.jobs_for(user_tag)[:5]
+if my_jobs:
+    st.markdown("**🗂️ Công việc của bạn**")
+LABELS = {"queued": "⏳ Đang chờ", "running": "⚙️ Đang chạy", "done": "✅ Xong",
+          "error": "❌ Lỗi", "interrupted": "⚠️ Bị ngắt"}
+for job in my_jobs:
+    jid, js = job["id"], job["status"]
+    st.session_state.setdefault("jobs", {})[jid] = js  # tiến trình mới nhất (polling)
+    state = js.get("state")
+    when = time.strftime("%H:%M", time.localtime(job.get("created") or 0))
+    with st.container(border=True):
+        cached = f" · ⚡ {js['cached']} file từ cache" if js.get("cached") else ""
+        st.caption(f"{LABELS.get(state, state)} · {when} · {len(job.get('files') or [])} file: {', '.join(job.get('files') or [])}{cached}")
+        if state in ("queued", "running"):
+            total = js.get("total") or 1
+            st.progress(min(int((js.get("done", 0) / total) * 100), 99), text=f"⚙️ {js.get('message', '')}")
+            # File đã xong → tải sớm từng file, không cần chờ cả lô.
+            # data là hàm: chỉ đọc zip khi bấm tải, không đọc lại mỗi lần rerun (1 giây/lần)
+            for name in js.get("ready") or []:
+                f_path = jobs.file_result_path(jid, name)
+                if f_path:
+                    st.download_button(f"📄 {name}.zip", data=Path(f_path).read_bytes, file_name=f"{name}.zip", mime="application/zip", key=f"dl_{jid}_{name}")
+        elif state == "done":
+            z_path = jobs.result_path(jid)
+            if z_path:
+                left = max(0, int((js.get("expires", 0) - time.time()) / 60))
+                st.download_button(
+                    label=f"📥 TẢI KẾT QUẢ (còn {left} phút)",
+                    data=Path(z_path).read_bytes,
+                    file_name="ket_qua_moodle.zip",
+                    mime="application/zip",
+                    type="primary",
+                    use_container_width=True,
+                    key=f"dl_{jid}",
+                )
+        else:
+            st.error(f"Chi tiết lỗi: {js.get('error')}")
+            if st.button("🔁 Chạy tiếp", key=f"retry_{jid}"):
+                jobs.retry(jid, run_key)
+                st.rerun()
+
+# Còn job đang chạy → đọc lại trạng thái sau 1 giây
+if any(j["status"].get("state") in ("queued", "running") for j in my_jobs):
+    time.sleep(1)
+    st.rerun()